@@ -0,0 +1,196 @@
+"""
+bench_tick.py — tick.py 热路径基准测试
+
+运行: python3 bench_tick.py [--repeat 5] [--days 7] [--latency 20] [--json]
+零依赖, 仅使用标准库; 每项取 N 次中的最优值, 结果可跨提交直接对比
+"""
+import argparse, contextlib, io, json, os, sys, tempfile, time
+
+# ══════════════════════════════════════════════════
+#  导入前设置环境变量 (tick.py 模块级需要)
+# ══════════════════════════════════════════════════
+
+os.environ.setdefault("GITHUB_WORKFLOW", "tick-a")
+os.environ.setdefault("GITHUB_REPOSITORY", "bench/repo")
+os.environ.setdefault("GITHUB_RUN_ID", "1")
+os.environ["DISPATCH"] = ""
+os.environ["API_MODE"] = "http"
+
+import tick
+from tick import CronEntry, CronIndex, SecEntry, Scheduler, match_cron, parse_dispatch, scan_round
+
+BASE = 1771027200  # 2026-02-14 00:00:00 UTC
+
+# 有代表性的表达式组合: 步进 / 枚举 / 范围 / 日周组合 / 永不匹配
+CRON_MIX = ["*/5 * * * *", "0 * * * *", "0 8 * * *", "15,45 9-17 * * 1-5", "*/15 * * * *",
+            "30 2 1 * *", "0 9 * * 1", "0 0 31 2 *", "*/2 */3 * * *", "0 12 1-7 * 0"]
+
+def make_entries(n, sec_every=10):
+    """n 个任务: 每 sec_every 个中 1 个秒级, 其余 cron, 分散在 n//10 个仓库"""
+    cron, sec = [], []
+    for i in range(n):
+        repo = f"o/r{i % max(1, n // 10)}"
+        if i % sec_every == sec_every - 1:
+            sec.append(SecEntry((5, 10, 30, 60, 300)[i % 5], repo, f"s{i}.yml"))
+        else:
+            cron.append(CronEntry(CRON_MIX[i % len(CRON_MIX)], repo, f"c{i}.yml"))
+    return cron, sec
+
+def make_dispatch(n):
+    """n 行 DISPATCH 文本, 含注释与空行"""
+    lines = ["# bench", ""]
+    for i in range(n):
+        if i % 10 == 9:
+            lines.append(f"@{(5, 10, 30, 60, 300)[i % 5]}s  o/r{i % 100}  s{i}.yml")
+        else:
+            lines.append(f"{CRON_MIX[i % len(CRON_MIX)]}  o/r{i % 100}  c{i}.yml")
+    return "\n".join(lines)
+
+def best_of(fn, repeat):
+    """执行 repeat 次, 返回最短耗时 (秒) 与最后一次的返回值"""
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t)
+    return best, out
+
+# ══════════════════════════════════════════════════
+#  纯逻辑 — 解析 / 匹配 / 模拟
+# ══════════════════════════════════════════════════
+
+def bench_parse(sizes, repeat):
+    """parse_dispatch: 逐行编译位掩码"""
+    for n in sizes:
+        os.environ["DISPATCH"] = make_dispatch(n)
+        sec, _ = best_of(parse_dispatch, repeat)
+        yield "parse_dispatch", n, sec, n
+    os.environ["DISPATCH"] = ""
+
+def bench_match(sizes, repeat, minutes=60):
+    """match_cron 单次匹配 + scan_round 每分钟一轮 (不含 I/O)"""
+    for n in sizes:
+        exprs = [CRON_MIX[i % len(CRON_MIX)].split() for i in range(n)]
+        stamps = [time.gmtime(BASE + m * 60) for m in range(0, minutes, 6)]
+        sec, _ = best_of(lambda: [match_cron(e, t) for t in stamps for e in exprs], repeat)
+        yield "match_cron", n, sec, n * len(stamps)
+
+        cron, secs = make_entries(n)
+        index = CronIndex(cron)
+        def rounds():
+            state, count = (None, {}), [0]
+            hit = lambda *_: count.__setitem__(0, count[0] + 1)
+            for m in range(minutes):
+                state = scan_round(BASE + m * 60, *state, cron, secs, hit, index)
+            return count[0]
+        sec, _ = best_of(rounds, repeat)
+        yield "scan_round", n, sec, minutes
+
+def bench_simulate(days, repeat, n=100):
+    """多天快进: scan_round 逐秒轮询 vs Scheduler 直接跳到 next_due"""
+    cron, sec = make_entries(n)
+    end = BASE + days * 86400
+
+    def heap():
+        sched, fires = Scheduler(cron, sec, BASE), 0
+        while sched.next_due() < end:
+            fires += len(sched.pop_due(sched.next_due()))
+        return fires
+    t, fires = best_of(heap, repeat)
+    yield f"simulate_heap_{days}d", n, t, fires
+
+    # 逐秒轮询代价高, 只跑 1 天, 一次即可
+    def scan():
+        state, count, index = (None, {}), [0], CronIndex(cron)
+        hit = lambda *_: count.__setitem__(0, count[0] + 1)
+        for epoch in range(BASE, BASE + 86400):
+            state = scan_round(epoch, *state, cron, sec, hit, index)
+        return count[0]
+    t, fires = best_of(scan, 1)
+    yield "simulate_scan_1d", n, t, fires
+
+# ══════════════════════════════════════════════════
+#  I/O 轮次 — 伪造 HTTP 层 + 注入延迟
+# ══════════════════════════════════════════════════
+
+def fake_request(latency):
+    """替换 GitHubClient.request: 每次请求睡 latency 秒, 竞锁全胜, 触发全部 204"""
+    headers = {"x-ratelimit-limit": "5000", "x-ratelimit-remaining": "4999",
+               "x-ratelimit-reset": str(int(time.time()) + 3600)}
+
+    def request(method, path, body=None, token=None, extra=None):
+        time.sleep(latency)
+        if path == "graphql":
+            count = body["query"].count("createRef")
+            return 200, {"data": {f"l{i}": {"ref": {"id": i}} for i in range(count)}}, headers
+        if method == "POST":
+            return 204, "", headers
+        return 200, {"default_branch": "main", "node_id": "R_bench"}, headers
+    return request
+
+def bench_round(sizes, repeat, latency):
+    """dispatch_round 全流程墙钟: 批量竞锁 + 按仓库并发触发"""
+    original = tick.CLIENT.request
+    tick.CLIENT.request = fake_request(latency)
+    tick.SHA, tick.REPO_ID = "0" * 40, "R_bench"
+    try:
+        for n in sizes:
+            cron = [CronEntry("* * * * *", f"o/r{i % max(1, n // 4)}", f"c{i}.yml") for i in range(n)]
+            def one():
+                sched = Scheduler(cron, [], BASE)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    return tick.dispatch_round(sched, sched.pop_due(BASE), BASE)
+            sec, _ = best_of(one, repeat)
+            yield f"dispatch_round_{latency * 1000:g}ms", n, sec, n
+
+            # 租约模式: 主链不竞锁, 省去整轮的 GraphQL 往返
+            tick.LEADER = tick.Lease("bench#1")
+            tick.LEADER.held, tick.LEADER.expires = True, float("inf")
+            sec, _ = best_of(one, repeat)
+            tick.LEADER = None
+            yield f"dispatch_lease_{latency * 1000:g}ms", n, sec, n
+    finally:
+        tick.CLIENT.request = original
+        tick.LEADER = None
+        tick.OWNED.clear()
+
+def bench_sqlite(sizes, repeat):
+    """SqliteLocks 一轮竞锁: 本机文件, 无网络往返 (每次换新槽, 全部获锁)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        locks, rounds = tick.SqliteLocks(f"{tmp}/locks.db"), iter(range(10 ** 9))
+        for n in sizes:
+            one = lambda: locks.acquire([(f"s5x{i}", str(next(rounds))) for i in range(n)], 0)
+            sec, _ = best_of(one, repeat)
+            yield "sqlite_locks", n, sec, n
+
+# ══════════════════════════════════════════════════
+#  入口
+# ══════════════════════════════════════════════════
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="tick.py 热路径基准测试")
+    parser.add_argument("--repeat",  type=int,   default=5,  help="每项重复次数, 取最优 (默认 5)")
+    parser.add_argument("--days",    type=int,   default=7,  help="堆调度快进天数 (默认 7)")
+    parser.add_argument("--latency", type=float, default=20, help="伪造 HTTP 每次请求延迟, 毫秒 (默认 20)")
+    parser.add_argument("--json",    action="store_true",     help="输出 JSON lines 便于对比")
+    args = parser.parse_args()
+
+    sizes = [100, 1000, 10000]
+    suites = [bench_parse(sizes, args.repeat),
+              bench_match(sizes, args.repeat),
+              bench_simulate(args.days, args.repeat),
+              bench_round([10, 50, 200], args.repeat, args.latency / 1000),
+              bench_sqlite([10, 50, 200], args.repeat)]
+
+    if not args.json:
+        print(f"{'基准':<24}{'规模':>8}{'最优':>12}{'单次':>14}")
+        print("─" * 58)
+    for suite in suites:
+        for name, size, sec, ops in suite:
+            per = sec / ops * 1e6 if ops else 0
+            if args.json:
+                print(json.dumps({"bench": name, "size": size, "best_ms": round(sec * 1000, 3),
+                                  "ops": ops, "per_op_us": round(per, 3)}))
+            else:
+                print(f"{name:<24}{size:>8}{sec * 1000:>10.2f}ms{per:>12.2f}µs")
+    sys.stdout.flush()
@@ -0,0 +1,398 @@
+"""
+harness_tick.py — 本地 GitHub API 替身 + 多链压测
+
+运行: python3 harness_tick.py [--chains 2] [--scale 60] [--seconds 30] [--latency 20] [--errors 0.01]
+      python3 harness_tick.py --chains 3 --shard --kill 15   # N 链分片 + 中途杀掉一条链验证接管
+      python3 harness_tick.py --lease 60 --kill 15           # 租约模式 + 中途杀掉主链验证接管
+零依赖, 仅使用标准库
+
+FakeGitHub 实现 tick.py 用到的全部端点 (锁 ref 201/422 语义、matching-refs、
+删除、GraphQL 批量 createRef、dispatches、runs 列举/删除、X-RateLimit-* 头),
+可注入延迟与错误; 压测启动多个真实 tick 进程, 共用 TIME_SCALE 倍速虚拟时钟,
+结束后统计重复触发、漏发和派发延迟
+"""
+import argparse, base64, bisect, json, os, random, re, subprocess, sys, tempfile, threading, time, zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import tick
+from tick import fire_timeline, parse_dispatch, percentiles, spread_phase
+
+# ══════════════════════════════════════════════════
+#  FakeGitHub — 进程内 API 替身
+#
+#  所有状态由一把锁保护: 同名 ref 只有一次 201, 与 GitHub 相同
+#  errors: 处理前直接返回 502 的概率
+#  lost:   处理完成后仍返回 502 的概率 (写入已生效, 客户端不知道)
+# ══════════════════════════════════════════════════
+
+SHA       = "0" * 40
+TREE      = "1" * 40
+RATE_SPAN = 3600  # 配额窗口 (秒)
+CREATE_RE = re.compile(r'(l\d+): createRef\(input: \{repositoryId: \$repo, oid: \$oid, name: ("[^"]*")\}\)')
+
+class FakeGitHub:
+    """本地 GitHub REST/GraphQL 替身, 线程安全, start() 后 url 可作为 GITHUB_API_URL"""
+
+    def __init__(self, latency=0.0, jitter=0.0, errors=0.0, lost=0.0, rate_limit=5000, seed=0):
+        self.latency, self.jitter = latency, jitter
+        self.errors, self.lost    = errors, lost
+        self.rate_limit = rate_limit
+        self.random     = random.Random(seed)
+        self.lock       = threading.Lock()
+        self.refs       = {}              # {repo: {ref: sha}}
+        self.runs       = {}              # {repo: {run_id: status}}
+        self.files      = {}              # {repo: {path: text}}, contents API
+        self.commits    = {SHA: {"message": "init", "tree": TREE, "parents": []}}  # git/commits, 全部仓库共用
+        self.dispatches = []              # [(真实时刻, repo, wf)]
+        self.rate       = {}              # {token: [remaining, reset]}
+        self.stats      = Counter()       # {"POST git/refs 201": 次数, "injected": ..., "lost": ...}
+        self.server     = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """在后台线程启动, 端口由系统分配"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # 长连接, 与 GitHubClient 连接池配合
+            def log_message(self, *args): pass
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionError:
+                    pass  # 链进程被终止 (--kill / 压测结束) 时连接被重置
+            def do_GET(self):    fake.serve(self, "GET")
+            def do_POST(self):   fake.serve(self, "POST")
+            def do_DELETE(self): fake.serve(self, "DELETE")
+            def do_PATCH(self):  fake.serve(self, "PATCH")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="fake-github", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def add_runs(self, repo, count, status="completed", first=1):
+        """预置 run, 用于观察 RunReaper 的删除行为"""
+        with self.lock:
+            runs = self.runs.setdefault(repo, {})
+            for run_id in range(first, first + count):
+                runs[run_id] = status
+
+    def set_file(self, repo, path, text):
+        """写入仓库文件, 用于观察 DISPATCH_PATH 热更新"""
+        with self.lock:
+            self.files.setdefault(repo, {})[path] = text
+
+    # ── 请求分发 ──
+
+    def serve(self, handler, method):
+        length = int(handler.headers.get("Content-Length") or 0)
+        raw    = handler.rfile.read(length) if length else b""
+        token  = (handler.headers.get("Authorization") or "").rsplit(" ", 1)[-1]
+        delay  = self.latency + self.random.uniform(0, self.jitter)
+        if delay: time.sleep(delay)
+        status, data = self.handle(method, handler.path, json.loads(raw) if raw else None, token)
+        body, etag = b"" if data is None else json.dumps(data).encode(), None
+        if method == "GET" and status == 200:
+            etag = f'"{zlib.crc32(body):08x}"'
+            if handler.headers.get("If-None-Match") == etag: status, body = 304, b""
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(body)))
+        for key, value in self.rate_headers(token, status).items():
+            handler.send_header(key, value)
+        if etag: handler.send_header("ETag", etag)
+        try:
+            handler.end_headers()
+            handler.wfile.write(body)
+        except ConnectionError:  # 压测结束时 tick 进程被终止, 连接已断开
+            handler.close_connection = True
+
+    def rate_headers(self, token, status):
+        """按 token 计费, 304 不计; 窗口到期重置"""
+        with self.lock:
+            now = int(time.time())
+            window = self.rate.setdefault(token, [self.rate_limit, now + RATE_SPAN])
+            if now >= window[1]: window[:] = [self.rate_limit, now + RATE_SPAN]
+            if status != 304: window[0] = max(0, window[0] - 1)
+            return {"X-RateLimit-Limit": str(self.rate_limit), "X-RateLimit-Remaining": str(window[0]),
+                    "X-RateLimit-Reset": str(window[1]), "X-RateLimit-Resource": "core"}
+
+    def handle(self, method, path, body, token=""):
+        """返回 (status, data); 在 serve 之外也可直接调用 (单元测试)"""
+        url   = urlsplit(path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        with self.lock:
+            window = self.rate.get(token)
+            if window and window[0] <= 0 and time.time() < window[1]:
+                return 403, {"message": "API rate limit exceeded"}
+            if self.random.random() < self.errors:
+                self.stats["injected"] += 1
+                return 502, {"message": "injected"}
+            status, data = self.route(method, url.path, body or {}, query)
+            self.stats[f"{method} {self.kind(url.path)} {status}"] += 1
+            if status < 300 and method != "GET" and self.random.random() < self.lost:
+                self.stats["lost"] += 1
+                return 502, {"message": "lost"}
+        return status, data
+
+    @staticmethod
+    def kind(path):
+        """统计用的端点类别"""
+        for key in ("graphql", "git/refs", "git/matching-refs", "git/ref/", "git/commits", "dispatches", "actions/runs", "contents"):
+            if key in path: return key.rstrip("/")
+        return "repo"
+
+    def route(self, method, path, body, query):
+        if path in ("/graphql", "/api/graphql"):
+            return self.graphql(body)
+        m = re.match(r"/repos/([^/]+/[^/]+)(/.*)?$", path)
+        if not m: return 404, {"message": "Not Found"}
+        repo, rest = m.group(1), unquote(m.group(2) or "")
+        refs = self.refs.setdefault(repo, {})
+        runs = self.runs.setdefault(repo, {})
+
+        if method == "GET" and not rest:
+            return 200, {"full_name": repo, "default_branch": "main", "node_id": f"R_{repo}"}
+        if method == "GET" and rest.startswith("/git/ref/"):
+            ref = "refs/" + rest[len("/git/ref/"):]
+            sha = SHA if ref == "refs/heads/main" else refs.get(ref)
+            if sha is None: return 404, {"message": "Not Found"}
+            return 200, {"ref": ref, "object": {"sha": sha, "type": "commit"}}
+        if method == "PATCH" and rest.startswith("/git/refs/"):
+            return self.update_ref(refs, rest[len("/git/"):], body.get("sha", ""), body.get("force", False))
+        if method == "POST" and rest == "/git/commits":
+            sha = f"{zlib.crc32(json.dumps([body, len(self.commits)]).encode()):08x}" * 5
+            self.commits[sha] = {"message": body.get("message", ""), "tree": body.get("tree", ""),
+                                 "parents": list(body.get("parents") or [])}
+            return 201, {"sha": sha, "message": body.get("message", "")}
+        if method == "GET" and rest.startswith("/git/commits/"):
+            sha = rest[len("/git/commits/"):]
+            commit = self.commits.get(sha)
+            if commit is None: return 404, {"message": "Not Found"}
+            return 200, {"sha": sha, "message": commit["message"], "tree": {"sha": commit["tree"]},
+                         "parents": [{"sha": p} for p in commit["parents"]]}
+        if method == "POST" and rest == "/git/refs":
+            return self.create_ref(refs, body.get("ref", ""))
+        if method == "GET" and rest.startswith("/git/matching-refs/"):
+            prefix = "refs/" + rest[len("/git/matching-refs/"):]
+            return 200, [{"ref": ref, "object": {"sha": sha}} for ref, sha in sorted(refs.items())
+                         if ref.startswith(prefix)]
+        if method == "DELETE" and rest.startswith("/git/refs/"):
+            ref = rest[len("/git/"):]
+            if refs.pop(ref, None) is None: return 422, {"message": "Reference does not exist"}
+            return 204, None
+        if method == "GET" and rest.startswith("/contents/"):
+            text = self.files.get(repo, {}).get(rest[len("/contents/"):])
+            if text is None: return 404, {"message": "Not Found"}
+            raw = text if isinstance(text, bytes) else text.encode()  # bytes: 模拟非 UTF-8 文件
+            return 200, {"type": "file", "encoding": "base64", "sha": f"{zlib.crc32(raw):08x}",
+                         "content": base64.b64encode(raw).decode()}
+        m = re.match(r"/actions/workflows/([^/]+)/(dispatches|runs)$", rest)
+        if m and method == "POST" and m.group(2) == "dispatches":
+            self.dispatches.append((time.time(), repo, m.group(1)))
+            return 204, None
+        if m and method == "GET":
+            return 200, {"total_count": 0, "workflow_runs": []}
+        if method == "GET" and rest == "/actions/runs":
+            ids  = sorted((i for i, s in runs.items() if s == query.get("status", s)), reverse=True)
+            size = int(query.get("per_page", 30))
+            page = int(query.get("page", 1))
+            return 200, {"total_count": len(ids),
+                         "workflow_runs": [{"id": i} for i in ids[(page - 1) * size:page * size]]}
+        m = re.match(r"/actions/runs/(\d+)$", rest)
+        if m and method == "DELETE":
+            return (204, None) if runs.pop(int(m.group(1)), None) else (404, {"message": "Not Found"})
+        return 404, {"message": "Not Found"}
+
+    def create_ref(self, refs, ref):
+        """创建 ref; 锁 ref 另计 "lock 201/422" (REST 与 GraphQL 合计), 衡量竞锁流量"""
+        if not ref.startswith("refs/"): return 422, {"message": "Reference name is invalid"}
+        lock = ref.startswith("refs/tags/lock/")
+        if ref in refs:
+            if lock: self.stats["lock 422"] += 1
+            return 422, {"message": "Reference already exists"}
+        if lock: self.stats["lock 201"] += 1
+        refs[ref] = SHA
+        return 201, {"ref": ref, "object": {"sha": SHA}}
+
+    def update_ref(self, refs, ref, sha, force):
+        """PATCH ref: 非强制时只允许快进 (新提交以当前提交为祖先), 否则 422, 与 GitHub 相同"""
+        if ref not in refs: return 422, {"message": "Reference does not exist"}
+        if sha not in self.commits: return 422, {"message": "Object does not exist"}
+        if not force:
+            seen, todo = set(), [sha]
+            while todo and refs[ref] not in seen:
+                cur = todo.pop()
+                if cur in seen: continue
+                seen.add(cur)
+                todo += self.commits.get(cur, {}).get("parents", [])
+            if refs[ref] not in seen: return 422, {"message": "Update is not a fast forward"}
+        refs[ref] = sha
+        return 200, {"ref": ref, "object": {"sha": sha, "type": "commit"}}
+
+    def graphql(self, body):
+        """只支持 tick.py 的别名 createRef mutation, 每个别名独立成败"""
+        repo = (body.get("variables") or {}).get("repo", "")[2:]
+        refs = self.refs.setdefault(repo, {})
+        data, errors = {}, []
+        for alias, name in CREATE_RE.findall(body.get("query", "")):
+            status, result = self.create_ref(refs, json.loads(name))
+            data[alias] = {"ref": {"id": result["ref"]}} if status == 201 else None
+            if status != 201:
+                message = result["message"].replace("Reference", f"A ref named {name}")
+                errors.append({"path": [alias], "message": message})
+        return 200, {"data": data, **({"errors": errors} if errors else {})}
+
+# ══════════════════════════════════════════════════
+#  压测 — 多个真实 tick 进程 + 倍速虚拟时钟
+# ══════════════════════════════════════════════════
+
+REPO = "fake/tick"
+DEFAULT_DISPATCH = """
+* * * * *    o/a  every-minute.yml
+*/2 * * * *  o/a  two-minutes.yml
+0 * * * *    o/b  hourly.yml
+@30s         o/b  thirty.yml
+@60s         o/c  sixty.yml
+@120s        o/c  two-minutes.yml
+"""
+
+def run_chains(fake, dispatch, chains, scale, seconds, workdir, extra_env=None, kill=None):
+    """
+    启动 chains 个 tick 进程跑 seconds 真实秒, 返回 (origin, 结束) 真实时刻
+    kill: 第 kill 真实秒时终止第一条链 (最先启动, 租约模式下通常是主链), 模拟链失联
+    """
+    origin = time.time()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tick.py")
+    procs  = []
+    for i in range(chains):
+        env = {**os.environ, "GITHUB_WORKFLOW": f"tick-{chr(ord('a') + i)}", "GITHUB_REPOSITORY": REPO,
+               "GITHUB_RUN_ID": str(i + 1), "GITHUB_API_URL": fake.url, "API_MODE": "http",
+               "GH_TOKEN": "gh-token", "PAT": "pat-token", "DISPATCH": dispatch, "LOCK_GC": "api",
+               "TIME_SCALE": str(scale), "TIME_ORIGIN": repr(origin), "PYTHONUNBUFFERED": "1",
+               "TRACE_FILE": "", "GITHUB_STEP_SUMMARY": "", **(extra_env or {})}
+        log = open(os.path.join(workdir, f"tick-{i}.log"), "w")
+        procs.append((subprocess.Popen([sys.executable, script], env=env, cwd=workdir,
+                                       stdout=log, stderr=subprocess.STDOUT), log))
+    if kill is not None and kill < seconds:
+        time.sleep(kill)
+        procs[0][0].terminate()
+        time.sleep(seconds - kill)
+    else:
+        time.sleep(seconds)
+    stopped = time.time()
+    for proc, log in procs:
+        proc.terminate()
+        proc.wait()
+        log.close()
+    return origin, stopped
+
+def analyze(fake, dispatch, origin, stopped, scale, spread=0, warmup=1.5, tail=1.0, window=tick.MISFIRE_WINDOW,
+            coalesce=False):
+    """
+    对比期望触发与实际派发 (按 repo + wf 归到 window 内最早的未送达边界, 都已送达则归到最近边界)
+    补发 (misfire / 接管) 迟到的派发因此计入原槽, 不会被误判为下一槽的重复
+    只统计 [origin + warmup, stopped - tail] 真实时段内的边界, 避开进程启动与退出
+    spread: 与各链相同的 SPREAD, 延迟从 槽起点 + 相位 算起
+    coalesce: 各链开启 COALESCE, 同一边界指向同一 repo + wf 的多行只期望一次派发
+    """
+    virtual = lambda real: origin + (real - origin) * scale
+    cron, sec = parse_dispatch(dispatch)
+    entries   = [*cron, *sec]
+    first, last = virtual(origin + warmup), virtual(stopped - tail)
+    phases = {(e.repo, e.wf): spread_phase(e, spread) for e in entries}
+    bounds, expected = {}, Counter()
+    for at, idx in fire_timeline(cron, sec, int(origin), int(virtual(stopped)) + 1):
+        key = (entries[idx].repo, entries[idx].wf)
+        bounds.setdefault(key, []).append(at)
+        if first <= at <= last: expected[(key, at)] = 1 if coalesce else expected[(key, at)] + 1
+    delivered, late = Counter(), []
+    for real, repo, wf in sorted(fake.dispatches):
+        times = bounds.get((repo, wf), [])
+        sent  = virtual(real) - phases.get((repo, wf), 0)  # 换算到槽时间
+        i = bisect.bisect_right(times, sent) - 1
+        for k in range(bisect.bisect_left(times, sent - window), i + 1):
+            if delivered[((repo, wf), times[k])] < expected[((repo, wf), times[k])]:
+                i = k
+                break
+        if i < 0 or not first <= times[i] <= last: continue
+        delivered[((repo, wf), times[i])] += 1
+        late.append((sent - times[i]) / scale * 1000)  # 真实毫秒
+    return {
+        "expected":   sum(expected.values()),
+        "delivered":  sum(delivered.values()),
+        "duplicates": sum(max(0, n - expected[k]) for k, n in delivered.items()),
+        "missed":     sum(max(0, n - delivered[k]) for k, n in expected.items()),
+        "latency_ms": [None if v is None else round(v, 1) for v in percentiles(late)]
+                      + [round(max(late), 1) if late else None],
+        "requests":   dict(fake.stats),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地 GitHub API 替身 + 多链压测")
+    parser.add_argument("--chains",   type=int,   default=2,   help="并行 tick 进程数 (默认 2)")
+    parser.add_argument("--scale",    type=float, default=60,  help="时钟倍速 (默认 60: 真实 1 秒 = 虚拟 1 分钟)")
+    parser.add_argument("--seconds",  type=float, default=30,  help="真实运行秒数 (默认 30)")
+    parser.add_argument("--latency",  type=float, default=20,  help="每次请求延迟, 毫秒 (默认 20)")
+    parser.add_argument("--jitter",   type=float, default=10,  help="延迟随机抖动上限, 毫秒 (默认 10)")
+    parser.add_argument("--errors",   type=float, default=0,   help="请求直接返回 502 的概率")
+    parser.add_argument("--lost",     type=float, default=0,   help="写入生效但响应 502 的概率")
+    parser.add_argument("--rate-limit", type=int, default=5000, help="每 token 每小时配额 (默认 5000)")
+    parser.add_argument("--spread",   type=int,   default=0,   help="传给各链的 SPREAD 错峰窗口 (秒)")
+    parser.add_argument("--shard",    action="store_true", help="CHAINS 分片: 每个任务只由归属链竞锁")
+    parser.add_argument("--lock",     choices=("ref", "sqlite"), default="ref", help="锁后端 (默认 ref; sqlite 为各链共用本机文件)")
+    parser.add_argument("--lease",    type=int,   default=0,   help="租约模式的租约时长 (虚拟秒), 0 = 逐任务竞锁")
+    parser.add_argument("--coalesce", action="store_true", help="COALESCE: 同一轮同一 repo + wf 的触发合并派发")
+    parser.add_argument("--kill",     type=float, help="第 N 真实秒终止第一条链, 验证接管 (同时设 MISFIRE=all)")
+    parser.add_argument("--file",     help="DISPATCH 文件, 缺省使用内置任务组合")
+    parser.add_argument("--keep",     action="store_true", help="保留各链日志目录")
+    parser.add_argument("--json",     action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    dispatch = open(args.file).read() if args.file else DEFAULT_DISPATCH
+    fake = FakeGitHub(args.latency / 1000, args.jitter / 1000, args.errors, args.lost, args.rate_limit).start()
+    fake.add_runs(REPO, 250)
+    workdir = tempfile.mkdtemp(prefix="tick-harness-")
+    try:
+        env = {"SPREAD": str(args.spread)}
+        if args.shard: env["CHAINS"] = ",".join(f"tick-{chr(ord('a') + i)}" for i in range(args.chains))
+        if args.lease: env["LEASE"] = str(args.lease)
+        if args.lock == "sqlite": env.update(LOCK_BACKEND="sqlite", LOCK_DB=os.path.join(workdir, "locks.db"))
+        if args.coalesce: env["COALESCE"] = "1"
+        if args.kill is not None: env["MISFIRE"] = "all"  # 接管时补发失联期间的每个槽
+        origin, stopped = run_chains(fake, dispatch, args.chains, args.scale, args.seconds, workdir, env, args.kill)
+        report = analyze(fake, dispatch, origin, stopped, args.scale, args.spread, coalesce=args.coalesce)
+        report["runs_left"] = len(fake.runs.get(REPO, {}))
+    finally:
+        fake.stop()
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False))
+    else:
+        p50, p95, p99, worst = report["latency_ms"]
+        print(tick.BAR)
+        print(f"  {args.chains} 链{' 分片' if args.shard else ''}{f' 租约 {args.lease}s' if args.lease else ''}"
+              f"{' sqlite 锁' if args.lock == 'sqlite' else ''}{' 合并' if args.coalesce else ''} | {args.scale:g}x | 真实 {args.seconds:g}s"
+              f" ≈ 虚拟 {args.seconds * args.scale / 60:.0f} 分钟" + (f" | 第 {args.kill:g}s 终止一条链" if args.kill else ""))
+        print(tick.BAR)
+        print(f"  期望触发  {report['expected']}")
+        print(f"  实际派发  {report['delivered']}")
+        print(f"  重复      {report['duplicates']}")
+        print(f"  漏发      {report['missed']}")
+        print(f"  派发延迟  p50 {p50} / p95 {p95} / p99 {p99} / max {worst} ms")
+        print(f"  请求统计  {' · '.join(f'{k} {v}' for k, v in sorted(report['requests'].items()))}")
+        print(f"  剩余 run  {report['runs_left']}")
+        print(tick.BAR)
+    if args.keep: print(f"日志: {workdir}", file=sys.stderr)
+    sys.exit(1 if report["duplicates"] or report["missed"] else 0)
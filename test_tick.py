@@ -15,7 +15,8 @@ os.environ.setdefault("GITHUB_REPOSITORY", "test/repo")
 os.environ.setdefault("GITHUB_RUN_ID", "1")
 os.environ.setdefault("DISPATCH", "")
 
-from tick import match_field, match_cron, parse_dispatch, is_expired, sanitize_key, FIELD_MIN
+from tick import (match_field, match_cron, parse_dispatch, is_expired, sanitize_key, FIELD_MIN,
+                  compile_field, CronEntry, SecEntry)
 
 passed = 0
 failed = 0
@@ -283,18 +284,18 @@ test("空字符串 sec 为空",  len(sec),  0)
 print("▶ parse_dispatch: 标准 crontab")
 cron, sec = parse_with("*/5 * * * * owner/repo check.yml")
 test("单条 cron 数量",     len(cron), 1)
-test("cron key",           cron[0][0], "*/5 * * * *")
-test("cron fields",        cron[0][1], ["*/5", "*", "*", "*", "*"])
-test("cron repo",          cron[0][2], "owner/repo")
-test("cron wf",            cron[0][3], "check.yml")
-test("cron lock_id 不含特殊字符", cron[0][4].isalnum(), True)
+test("cron key",           cron[0].key, "*/5 * * * *")
+test("cron fields",        cron[0].fields, ["*/5", "*", "*", "*", "*"])
+test("cron repo",          cron[0].repo, "owner/repo")
+test("cron wf",            cron[0].wf, "check.yml")
+test("cron lock_id 不含特殊字符", cron[0].lock_id.isalnum(), True)
 
 print("▶ parse_dispatch: 秒级语法")
 cron, sec = parse_with("@30s owner/repo poll.yml")
 test("单条 sec 数量",     len(sec), 1)
-test("sec 间隔",          sec[0][0], 30)
-test("sec repo",          sec[0][1], "owner/repo")
-test("sec wf",            sec[0][2], "poll.yml")
+test("sec 间隔",          sec[0].n, 30)
+test("sec repo",          sec[0].repo, "owner/repo")
+test("sec wf",            sec[0].wf, "poll.yml")
 
 print("▶ parse_dispatch: 多条混合")
 dispatch = "\n".join([
@@ -306,10 +307,10 @@ dispatch = "\n".join([
 cron, sec = parse_with(dispatch)
 test("混合 cron 数量", len(cron), 2)
 test("混合 sec 数量",  len(sec),  2)
-test("cron[0] key",    cron[0][0], "*/5 * * * *")
-test("cron[1] key",    cron[1][0], "0 8 * * *")
-test("sec[0] 间隔",   sec[0][0], 30)
-test("sec[1] 间隔",   sec[1][0], 10)
+test("cron[0] key",    cron[0].key, "*/5 * * * *")
+test("cron[1] key",    cron[1].key, "0 8 * * *")
+test("sec[0] 间隔",   sec[0].n, 30)
+test("sec[1] 间隔",   sec[1].n, 10)
 
 print("▶ parse_dispatch: 空行和注释")
 dispatch = "\n".join([
@@ -343,7 +344,7 @@ dispatch = "\n".join([
     "*/5 * * * * owner/repo2 b.yml",
 ])
 cron, sec = parse_with(dispatch)
-test("相同表达式 lock_id 相同", cron[0][4], cron[1][4])
+test("相同表达式 lock_id 相同", cron[0].lock_id, cron[1].lock_id)
 # (lock_id 自身相同, 但主循环中拼接 idx 后不同 → 这是设计正确性)
 
 print("▶ parse_dispatch: 各种秒级间隔")
@@ -356,11 +357,11 @@ dispatch = "\n".join([
 ])
 cron, sec = parse_with(dispatch)
 test("sec 数量", len(sec), 5)
-test("@1s",   sec[0][0], 1)
-test("@10s",  sec[1][0], 10)
-test("@30s",  sec[2][0], 30)
-test("@60s",  sec[3][0], 60)
-test("@300s", sec[4][0], 300)
+test("@1s",   sec[0].n, 1)
+test("@10s",  sec[1].n, 10)
+test("@30s",  sec[2].n, 30)
+test("@60s",  sec[3].n, 60)
+test("@300s", sec[4].n, 300)
 
 # ══════════════════════════════════════════════════
 #  FIELD_MIN 常量验证
@@ -394,8 +395,8 @@ dispatch = "\n".join([
 ])
 cron, sec = parse_with(dispatch)
 test("两条 @30s 都被解析", len(sec), 2)
-test("sec[0] repo", sec[0][1], "owner/repo1")
-test("sec[1] repo", sec[1][1], "owner/repo2")
+test("sec[0] repo", sec[0].repo, "owner/repo1")
+test("sec[1] repo", sec[1].repo, "owner/repo2")
 # (运行时 last_slot 用 j 索引区分, 不再冲突)
 
 print("▶ 回归: 相同 cron 表达式不同目标 (曾有 bug)")
@@ -405,7 +406,7 @@ dispatch = "\n".join([
 ])
 cron, sec = parse_with(dispatch)
 test("两条都被解析", len(cron), 2)
-test("repo 不同", cron[0][2] != cron[1][2], True)
+test("repo 不同", cron[0].repo != cron[1].repo, True)
 # (运行时 lock_id 拼接 idx → lock_id0 vs lock_id1, 不再冲突)
 
 print("▶ 边界: 午夜跨天")
@@ -549,7 +550,7 @@ def simulate(cron_entries, sec_entries, duration_sec, interval=30):
     return fires
 
 print("▶ 模拟: 5分钟 (10轮) — */1 * * * * 每分钟触发")
-cron = [("*/1 * * * *", ["*/1","*","*","*","*"], "o/r", "a.yml", "xx1xxxxxxxx")]
+cron = [CronEntry("*/1 * * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 300)
 # 5分钟 = 10轮 (0s, 30s, 60s, 90s, 120s, 150s, 180s, 210s, 240s, 270s)
 # 分钟变化: :00, :00(dup), :01, :01(dup), :02, :02(dup), :03, :03(dup), :04, :04(dup)
@@ -557,53 +558,53 @@ fires = simulate(cron, [], 300)
 test("*/1 5分钟触发5次", fires.get(0, 0), 5)
 
 print("▶ 模拟: 1小时 (120轮) — */5 * * * *")
-cron = [("*/5 * * * *", ["*/5","*","*","*","*"], "o/r", "a.yml", "xx5xxxxxxxx")]
+cron = [CronEntry("*/5 * * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 3600)
 # 1小时中 */5 匹配: :00, :05, :10, :15, :20, :25, :30, :35, :40, :45, :50, :55 = 12次
 test("*/5 1小时触发12次", fires.get(0, 0), 12)
 
 print("▶ 模拟: 1小时 — */15 * * * *")
-cron = [("*/15 * * * *", ["*/15","*","*","*","*"], "o/r", "a.yml", "xx15xxxxxxxx")]
+cron = [CronEntry("*/15 * * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 3600)
 # :00, :15, :30, :45 = 4次
 test("*/15 1小时触发4次", fires.get(0, 0), 4)
 
 print("▶ 模拟: 1小时 — 0 * * * * (整点)")
-cron = [("0 * * * *", ["0","*","*","*","*"], "o/r", "a.yml", "0xxxxxxxx")]
+cron = [CronEntry("0 * * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 3600)
 # 只有 :00 匹配 = 1次
 test("整点1小时触发1次", fires.get(0, 0), 1)
 
 print("▶ 模拟: 5分钟 — @30s 每30秒")
-sec = [(30, "o/r", "a.yml")]
+sec = [SecEntry(30, "o/r", "a.yml")]
 fires = simulate([], sec, 300)
 # 10轮, 每轮 slot 变化 → 10次
 test("@30s 5分钟触发10次", fires.get(0, 0), 10)
 
 print("▶ 模拟: 5分钟 — @60s 每60秒")
-sec = [(60, "o/r", "a.yml")]
+sec = [SecEntry(60, "o/r", "a.yml")]
 fires = simulate([], sec, 300)
 # 10轮 (0s,30s,60s,90s,...270s), slot=epoch//60 每两轮变化 → 5次
 test("@60s 5分钟触发5次", fires.get(0, 0), 5)
 
 print("▶ 模拟: 5分钟 — @10s 每10秒 (interval=30s)")
-sec = [(10, "o/r", "a.yml")]
+sec = [SecEntry(10, "o/r", "a.yml")]
 fires = simulate([], sec, 300)
 # 虽然 @10s 要求每10秒, 但循环间隔30s, 每轮 slot 变化 → 10次
 test("@10s 5分钟触发10次", fires.get(0, 0), 10)
 
 print("▶ 模拟: 1小时 — 混合 cron + sec")
-cron = [("*/5 * * * *", ["*/5","*","*","*","*"], "o/r", "a.yml", "xx5xxxxxxxx")]
-sec  = [(30, "o/r", "b.yml")]
+cron = [CronEntry("*/5 * * * *", "o/r", "a.yml")]
+sec  = [SecEntry(30, "o/r", "b.yml")]
 fires = simulate(cron, sec, 3600)
 test("混合: cron */5 触发12次",  fires.get(0, 0), 12)
 test("混合: sec @30s 触发120次", fires.get(1, 0), 120)
 
 print("▶ 模拟: 1小时 — 多条 cron")
 cron = [
-    ("*/5 * * * *",  ["*/5","*","*","*","*"],  "o/r1", "a.yml", "id0"),
-    ("*/15 * * * *", ["*/15","*","*","*","*"], "o/r2", "b.yml", "id1"),
-    ("0 * * * *",    ["0","*","*","*","*"],     "o/r3", "c.yml", "id2"),
+    CronEntry("*/5 * * * *", "o/r1", "a.yml"),
+    CronEntry("*/15 * * * *", "o/r2", "b.yml"),
+    CronEntry("0 * * * *", "o/r3", "c.yml"),
 ]
 fires = simulate(cron, [], 3600)
 test("多cron: */5 触发12次",  fires.get(0, 0), 12)
@@ -612,8 +613,8 @@ test("多cron: 整点 触发1次",  fires.get(2, 0), 1)
 
 print("▶ 模拟: 1小时 — 多条 @Ns (相同间隔)")
 sec = [
-    (30, "o/r1", "a.yml"),
-    (30, "o/r2", "b.yml"),
+    SecEntry(30, "o/r1", "a.yml"),
+    SecEntry(30, "o/r2", "b.yml"),
 ]
 fires = simulate([], sec, 3600)
 test("多@30s[0] 触发120次", fires.get(0, 0), 120)
@@ -621,9 +622,9 @@ test("多@30s[1] 触发120次", fires.get(1, 0), 120)
 
 print("▶ 模拟: 1小时 — 多条 @Ns (不同间隔)")
 sec = [
-    (30,  "o/r1", "a.yml"),
-    (60,  "o/r2", "b.yml"),
-    (300, "o/r3", "c.yml"),
+    SecEntry(30, "o/r1", "a.yml"),
+    SecEntry(60, "o/r2", "b.yml"),
+    SecEntry(300, "o/r3", "c.yml"),
 ]
 fires = simulate([], sec, 3600)
 test("@30s 触发120次",  fires.get(0, 0), 120)
@@ -631,24 +632,24 @@ test("@60s 触发60次",   fires.get(1, 0), 60)
 test("@300s 触发12次",  fires.get(2, 0), 12)
 
 print("▶ 模拟: 24小时 — 0 8 * * * (每天8点)")
-cron = [("0 8 * * *", ["0","8","*","*","*"], "o/r", "a.yml", "0x8xxxxxx")]
+cron = [CronEntry("0 8 * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 86400)
 test("每天8点触发1次", fires.get(0, 0), 1)
 
 print("▶ 模拟: 24小时 — 0 */6 * * *")
-cron = [("0 */6 * * *", ["0","*/6","*","*","*"], "o/r", "a.yml", "0xx6xxxxxxxx")]
+cron = [CronEntry("0 */6 * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 86400)
 # 0:00, 6:00, 12:00, 18:00 = 4次
 test("*/6h 24小时触发4次", fires.get(0, 0), 4)
 
 print("▶ 模拟: cron 去重 — 同一分钟两轮不重复")
-cron = [("* * * * *", ["*","*","*","*","*"], "o/r", "a.yml", "xxxxxxxxx")]
+cron = [CronEntry("* * * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 120)
 # 120秒 = 4轮 (0s, 30s, 60s, 90s), 分钟 :00, :00(dup), :01, :01(dup) → 2次
 test("每分钟去重: 4轮仅触发2次", fires.get(0, 0), 2)
 
 print("▶ 模拟: sec 去重 — 同一 slot 不重复")
-sec = [(60, "o/r", "a.yml")]
+sec = [SecEntry(60, "o/r", "a.yml")]
 fires = simulate([], sec, 120)
 # 4轮, slot 每两轮变一次 → 2次
 test("@60s 去重: 4轮仅触发2次", fires.get(0, 0), 2)
@@ -822,22 +823,55 @@ print("▶ parse_dispatch: 超多字段被跳过")
 cron, sec = parse_with("*/5 * * * * * * * owner/repo check.yml")
 test("10字段跳过 cron", len(cron), 0)
 
-print("▶ parse_dispatch: @0s 被解析为0")
+print("▶ parse_dispatch: @0s 在加载时被拒绝 (否则 epoch // 0 在主循环中抛错)")
 cron, sec = parse_with("@0s owner/repo a.yml")
-test("@0s 间隔为0", len(sec), 1)
-test("@0s 值",      sec[0][0], 0)
+test("@0s 被跳过", len(sec), 0)
+
+print("▶ parse_dispatch: 非法 cron 字段在加载时被拒绝")
+cron, sec = parse_with("\n".join([
+    "abc * * * * owner/repo a.yml",
+    "60 * * * * owner/repo b.yml",
+    "* 24 * * * owner/repo c.yml",
+    "* * 0 * * owner/repo d.yml",
+    "*/0 * * * * owner/repo e.yml",
+    "5-3 * * * * owner/repo f.yml",
+    "0 8 * * * owner/repo ok.yml",
+]))
+test("仅保留合法行", len(cron), 1)
+test("合法行 wf",    cron[0].wf, "ok.yml")
 
 print("▶ parse_dispatch: 大量任务")
 lines = [f"*/5 * * * * owner/repo{i} w{i}.yml" for i in range(50)]
 cron, sec = parse_with("\n".join(lines))
 test("50条 cron 全解析", len(cron), 50)
 
+# ══════════════════════════════════════════════════
+#  compile_field / CronEntry 位掩码
+# ══════════════════════════════════════════════════
+
+print("▶ compile_field: 位掩码")
+test("* 分钟 60 位",      compile_field("*", 0, 59), (1 << 60) - 1)
+test("* 日 1-31",         compile_field("*", 1, 31), ((1 << 32) - 1) & ~1)
+test("*/15 分钟",         compile_field("*/15", 0, 59), 1 | 1 << 15 | 1 << 30 | 1 << 45)
+test("*/3 日从 1 开始",   compile_field("*/3", 1, 31) & 0b11111110, 1 << 1 | 1 << 4 | 1 << 7)
+test("1,3-5",             compile_field("1,3-5", 0, 59), 0b111010)
+test("单值 0",            compile_field("0", 0, 59), 1)
+
+print("▶ CronEntry: 加载时编译")
+entry = CronEntry("0 8 * * 1-5", "o/r", "a.yml")
+test("fields 保留原文",   entry.fields, ["0", "8", "*", "*", "1-5"])
+test("lock_id",           entry.lock_id, sanitize_key("0 8 * * 1-5"))
+test("匹配 Mon 08:00",    entry.match(make_time(0, 8, wday_py=0)), True)
+test("不匹配 Sun 08:00",  entry.match(make_time(0, 8, wday_py=6)), False)
+test("不匹配 Mon 08:01",  entry.match(make_time(1, 8, wday_py=0)), False)
+test("无 __dict__",       hasattr(entry, "__dict__"), False)
+
 # ══════════════════════════════════════════════════
 #  新增: 模拟强化
 # ══════════════════════════════════════════════════
 
 print("▶ 模拟: 30分钟 — 0,30 * * * *")
-cron = [("0,30 * * * *", ["0,30","*","*","*","*"], "o/r", "a.yml", "0x30xxxxxxxx")]
+cron = [CronEntry("0,30 * * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 3600)
 # :00 和 :30 各触发1次 = 2次/小时
 test("0,30每小时触发2次", fires.get(0, 0), 2)
@@ -845,21 +879,1233 @@ test("0,30每小时触发2次", fires.get(0, 0), 2)
 print("▶ 模拟: 7天 — 周一 0 9 * * 1")
 # base_epoch 2026-02-15 00:00:00 是周日 (wday_py=6)
 # 周一是 +1天, 只触发1次
-cron = [("0 9 * * 1", ["0","9","*","*","1"], "o/r", "a.yml", "0x9xxxxx1")]
+cron = [CronEntry("0 9 * * 1", "o/r", "a.yml")]
 fires = simulate(cron, [], 7 * 86400)
 test("周一cron 7天触发1次", fires.get(0, 0), 1)
 
 print("▶ 模拟: 48小时 — 0 8 * * * (应触发2天)")
-cron = [("0 8 * * *", ["0","8","*","*","*"], "o/r", "a.yml", "0x8xxxxxx")]
+cron = [CronEntry("0 8 * * *", "o/r", "a.yml")]
 fires = simulate(cron, [], 172800)
 test("每天8点 48小时触发2次", fires.get(0, 0), 2)
 
 print("▶ 模拟: 大间隔 sec — @3600s (每小时)")
-sec = [(3600, "o/r", "a.yml")]
+sec = [SecEntry(3600, "o/r", "a.yml")]
 fires = simulate([], sec, 86400)
 # 86400/30 = 2880轮, slot = epoch//3600, 每120轮变一次 → 24次
 test("@3600s 24小时触发24次", fires.get(0, 0), 24)
 
+# ══════════════════════════════════════════════════
+#  next_match / Scheduler — 下一触发时间 + 小顶堆
+# ══════════════════════════════════════════════════
+
+from tick import next_match, compile_cron, Scheduler
+
+BASE = 1771027200  # 2026-02-14 00:00:00 UTC (周六)
+
+def brute_next(key, epoch, limit=400 * 86400):
+    """逐分钟步进的参照实现"""
+    masks = compile_cron(key.split())
+    t = -(-epoch // 60) * 60
+    while t < epoch + limit:
+        if match_masks(masks, time.gmtime(t)): return t
+        t += 60
+    return None
+
+from tick import match_masks
+
+print("▶ next_match: 与逐分钟步进一致")
+for key in ["* * * * *", "*/5 * * * *", "0 8 * * *", "0 9 * * 1", "30 23 31 * *",
+            "0 0 1 */3 *", "15 4 * 2 0", "59 23 31 12 *", "0,30 8-10 * * 1-5"]:
+    for start in (BASE, BASE + 37, BASE + 86400 * 200 + 1234):
+        test(f"{key} @ {start}", next_match(compile_cron(key.split()), start), brute_next(key, start))
+
+print("▶ next_match: 边界")
+test("恰好在边界上返回自身",   next_match(compile_cron("* * * * *".split()), BASE), BASE)
+test("秒数向上取整到下一分钟", next_match(compile_cron("* * * * *".split()), BASE + 1), BASE + 60)
+test("2 月 31 日无解",         next_match(compile_cron("0 0 31 2 *".split()), BASE), None)
+test("闰日 2028-02-29",
+    time.strftime("%Y-%m-%d %H:%M", time.gmtime(next_match(compile_cron("0 12 29 2 *".split()), BASE))),
+    "2028-02-29 12:00")
+
+print("▶ SecEntry / CronEntry: next_fire")
+test("@30s 边界上返回自身",  SecEntry(30, "o/r", "a.yml").next_fire(BASE), BASE)
+test("@30s 向上取整",        SecEntry(30, "o/r", "a.yml").next_fire(BASE + 1), BASE + 30)
+test("cron 周一 09:00",      CronEntry("0 9 * * 1", "o/r", "a.yml").next_fire(BASE), BASE + 2 * 86400 + 9 * 3600)
+
+def simulate_heap(cron_entries, sec_entries, duration_sec):
+    """事件驱动模拟: 每次直接跳到 next_due(), 返回 ({idx: 次数}, 唤醒次数)"""
+    sched = Scheduler(cron_entries, sec_entries, BASE)
+    fires, wakeups = {}, 0
+    while sched.next_due() is not None and sched.next_due() < BASE + duration_sec:
+        wakeups += 1
+        for idx, at in sched.pop_due(sched.next_due()):
+            fires[idx] = fires.get(idx, 0) + 1
+    return fires, wakeups
+
+print("▶ Scheduler: 与 scan_round 模拟结果一致 (24小时)")
+cron = [CronEntry(k, "o/r", "a.yml") for k in
+        ["*/5 * * * *", "*/15 * * * *", "0 */6 * * *", "0 8 * * *", "0 0 31 2 *"]]
+sec  = [SecEntry(30, "o/r", "b.yml"), SecEntry(300, "o/r", "c.yml")]
+fires, _ = simulate_heap(cron, sec, 86400)
+test("堆调度 == scan_round 调度", fires, simulate(cron, sec, 86400))
+test("永不匹配的表达式不触发",    fires.get(4, 0), 0)
+
+print("▶ Scheduler: 稀疏调度只唤醒到期时刻")
+fires, wakeups = simulate_heap([CronEntry("0 8 * * *", "o/r", "a.yml")], [], 7 * 86400)
+test("7天触发7次",  fires.get(0, 0), 7)
+test("7天仅唤醒7次", wakeups, 7)
+
+print("▶ Scheduler: 同一时刻多个任务一次弹出")
+sched = Scheduler([CronEntry("0 * * * *", "o/r", "a.yml")] * 3, [SecEntry(60, "o/r", "b.yml")], BASE)
+test("整点 4 个任务同时到期", sorted(i for i, _ in sched.pop_due(BASE)), [0, 1, 2, 3])
+test("下一次到期 +60s",       sched.next_due(), BASE + 60)
+
+print("▶ Scheduler: 醒来迟了只补当前槽")
+sched = Scheduler([CronEntry("* * * * *", "o/r", "a.yml")], [SecEntry(10, "o/r", "b.yml")], BASE)
+test("迟到 125s: 各触发 1 次", sched.pop_due(BASE + 125), [(0, BASE + 120), (1, BASE + 120)])
+test("重新入堆到下一槽",       sched.next_due(), BASE + 130)
+
+print("▶ Scheduler: 锁标签 = 内容哈希锁名 + 时间槽")
+sched = Scheduler([CronEntry("*/5 * * * *", "o/r", "a.yml")], [SecEntry(30, "o/r", "b.yml")], BASE)
+test("cron 标签", sched.label(0, BASE + 300), ("xx5xxxxxxxx40ec28cd", "202602140005"))
+test("sec 标签",  sched.label(1, BASE + 30),  ("s30xa5ba632c", str((BASE + 30) // 30)))
+
+# ══════════════════════════════════════════════════
+#  GitHubClient / parse_http_dump — REST 客户端
+# ══════════════════════════════════════════════════
+
+import json, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from tick import GitHubClient, parse_http_dump
+
+print("▶ parse_http_dump: gh api -i 输出")
+status, data, headers = parse_http_dump(
+    "HTTP/2.0 201 Created\r\nEtag: \"abc\"\r\nX-Ratelimit-Remaining: 42\r\n\r\n{\"ref\": \"refs/tags/x\"}")
+test("状态码",       status, 201)
+test("响应头小写",   headers.get("x-ratelimit-remaining"), "42")
+test("JSON 响应体",  data, {"ref": "refs/tags/x"})
+test("204 空响应体", parse_http_dump("HTTP/2.0 204 No Content\nServer: x\n\n")[:2], (204, None))
+test("非 HTTP 输出", parse_http_dump("gh: command not found"), (0, None, {}))
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """回显请求: 记录连接端口以验证长连接复用"""
+    protocol_version = "HTTP/1.1"
+    ports = set()
+    def log_message(self, *args): pass
+    def do_POST(self):
+        EchoHandler.ports.add(self.client_address[1])
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.dumps({"path": self.path, "auth": self.headers.get("Authorization"),
+                           "body": json.loads(self.rfile.read(length) or "null")}).encode()
+        self.send_response(201)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+print("▶ GitHubClient: 本地服务器往返 + 长连接复用")
+server = ThreadingHTTPServer(("127.0.0.1", 0), EchoHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+client = GitHubClient(f"http://127.0.0.1:{server.server_port}/api/v3")
+for _ in range(3):
+    status, data, _ = client.request("POST", "/repos/o/r/git/refs", {"ref": "x"}, token="t0k")
+test("状态码 201",        status, 201)
+test("路径带 GHES 前缀",  data["path"], "/api/v3/repos/o/r/git/refs")
+test("Bearer token",      data["auth"], "Bearer t0k")
+test("JSON 请求体",       data["body"], {"ref": "x"})
+test("3 次请求 1 条连接", len(EchoHandler.ports), 1)
+server.shutdown()
+server.server_close()
+test("连接失败返回 status=0", GitHubClient("http://127.0.0.1:9").request("GET", "/x"), (0, None, {}))
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """第一次请求正常应答; 之后先悄悄断开空闲连接, 或延迟到客户端超时之后再应答"""
+    protocol_version = "HTTP/1.1"
+    posts, mode = 0, "ok"
+    def log_message(self, *args): pass
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        SlowHandler.posts += 1
+        if SlowHandler.mode == "slow": time.sleep(0.6)
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        if SlowHandler.mode == "drop": self.close_connection = True  # 不发 Connection: close, 客户端仍会复用
+        self.end_headers()
+
+print("▶ GitHubClient: 只重试已失效的空闲连接, 超时不重发")
+server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+threading.Thread(target=server.serve_forever, daemon=True).start()
+client = GitHubClient(f"http://127.0.0.1:{server.server_port}", timeout=0.3)
+SlowHandler.mode = "drop"
+client.request("POST", "/d", {})
+time.sleep(0.1)
+SlowHandler.mode, SlowHandler.posts = "ok", 0
+test("空闲连接被关闭后换连接重试", (client.request("POST", "/d", {})[0], SlowHandler.posts), (204, 1))
+SlowHandler.mode, SlowHandler.posts = "slow", 0
+test("复用连接读超时返回 0",  client.request("POST", "/d", {})[0], 0)
+time.sleep(0.5)
+test("超时的 POST 只发送一次", SlowHandler.posts, 1)
+server.shutdown()
+server.server_close()
+
+# ══════════════════════════════════════════════════
+#  run_round — 一轮并发扇出
+# ══════════════════════════════════════════════════
+
+from concurrent.futures import ThreadPoolExecutor
+from tick import run_round
+
+print("▶ run_round: 不同仓库并发")
+pool = ThreadPoolExecutor(max_workers=8)
+t0 = time.time()
+late = run_round([(f"o/r{i}", lambda: time.sleep(0.2)) for i in range(8)], pool, timeout=5)
+test("8 个仓库全部完成",  late, 0)
+test("并发耗时 < 串行",   time.time() - t0 < 0.8, True)
+
+print("▶ run_round: 同一仓库按顺序执行")
+order = []
+def append_later(i):
+    return lambda: (time.sleep(0.01 * (5 - i)), order.append(i))
+late = run_round([("o/same", append_later(i)) for i in range(5)], pool, timeout=5)
+test("同仓库顺序保持",    order, [0, 1, 2, 3, 4])
+
+print("▶ run_round: 整轮超时")
+late = run_round([("o/slow", lambda: time.sleep(0.5)), ("o/fast", lambda: None)], pool, timeout=0.1)
+test("超时仓库数",        late, 1)
+pool.shutdown(wait=True)
+
+print("▶ run_round: 卡住的仓库不占满线程池")
+pool, hang, order = ThreadPoolExecutor(max_workers=2), threading.Event(), []
+test("第 1 轮 A 超时",     run_round([("o/a", hang.wait)], pool, timeout=0.1), 1)
+test("第 2 轮 A 仍超时",   run_round([("o/a", lambda: order.append("a2"))], pool, timeout=0.1), 1)
+t0 = time.time()
+test("第 3 轮 B 按时完成", run_round([("o/b", lambda: None)], pool, timeout=0.5), 0)
+test("B 不等 A",           time.time() - t0 < 0.3, True)
+hang.set()
+time.sleep(0.1)
+test("A 恢复后按顺序补完", order, ["a2"])
+pool.shutdown(wait=True)
+
+# ══════════════════════════════════════════════════
+#  acquire_locks — GraphQL 批量竞锁
+# ══════════════════════════════════════════════════
+
+from tick import build_lock_mutation, parse_lock_result
+
+print("▶ build_lock_mutation: 别名与标签一一对应")
+labels = [("xx5xxxxxxxx0", "202602140805"), ("s30x0", "59034240")]
+query = build_lock_mutation(labels)
+test("变量声明",   query.startswith("mutation($repo: ID!, $oid: GitObjectID!)"), True)
+test("别名 l0",    'l0: createRef(input: {repositoryId: $repo, oid: $oid, name: "refs/tags/lock/2026021408/xx5xxxxxxxx0-202602140805"})' in query, True)
+test("别名 l1",    '"refs/tags/lock/2026021400/s30x0-59034240"' in query and "l1: createRef" in query, True)
+test("无 l2",      "l2:" in query, False)
+
+print("▶ parse_lock_result: 部分成功 = 逐个 201/422")
+body = {"data": {"l0": {"ref": {"id": "REF_1"}}, "l1": None},
+        "errors": [{"path": ["l1"], "type": "UNPROCESSABLE",
+                    "message": 'A ref named "refs/tags/lock/s30x0-59034240" already exists in the repository.'}]}
+result = parse_lock_result(labels, 200, body)
+test("l0 获锁",        result[labels[0]], (True, "ok"))
+test("l1 已存在",      result[labels[1]], (False, "exists"))
+
+print("▶ parse_lock_result: 其他错误 / 整体失败")
+body = {"data": {"l0": None, "l1": None}, "errors": [{"path": ["l0"], "message": "Resource not accessible"}]}
+result = parse_lock_result(labels, 200, body)
+test("非 already exists 错误", result[labels[0]], (False, "graphql-error"))
+test("无错误信息也不获锁",     result[labels[1]], (False, "graphql-error"))
+result = parse_lock_result(labels, 502, "Bad Gateway")
+test("HTTP 失败全部不获锁",    set(result.values()), {(False, "http-502")})
+result = parse_lock_result(labels, 0, None)
+test("网络失败全部不获锁",     set(result.values()), {(False, "http-0")})
+
+# ══════════════════════════════════════════════════
+#  小时桶锁 + 本地过期堆
+# ══════════════════════════════════════════════════
+
+import tick
+from tick import lock_ref, lock_expiry, stale_buckets, is_stale_ref, track_lock, pop_expired
+
+T0805 = BASE + 8 * 3600 + 5 * 60  # 2026-02-14 08:05:00
+
+print("▶ lock_ref: 按计划时刻分小时桶")
+test("cron 锁",       lock_ref("xx5xxxxxxxx0", "202602140805"), "refs/tags/lock/2026021408/xx5xxxxxxxx0-202602140805")
+test("sec 锁",        lock_ref("s30x1", str(T0805 // 30)), f"refs/tags/lock/2026021408/s30x1-{T0805 // 30}")
+test("sec 跨小时",    lock_ref("s7200x0", str((T0805 + 3600) // 7200)).split("/")[3], "2026021408")
+
+from tick import MISFIRE_WINDOW as W
+
+print("▶ lock_expiry: is_expired 之后再保留补发窗口")
+for name, slot in [("xx5xxxxxxxx0", "202602140805"), ("s30x0", str(T0805 // 30)), ("s10x2", str(T0805 // 10))]:
+    exp = lock_expiry(name, slot) - W
+    now_min = lambda t: time.strftime("%Y%m%d%H%M", time.gmtime(t))
+    test(f"{name} 到期前 1s 未过期", is_expired(f"{name}-{slot}", exp - 1, now_min(exp - 1)), False)
+    test(f"{name} 到期后 1s 已过期", is_expired(f"{name}-{slot}", exp + 1, now_min(exp + 1)), True)
+
+print("▶ stale_buckets: 只返回整体过期的桶")
+buckets = stale_buckets(T0805 + W, hours=3)
+test("08:05 + 窗口 → 最后过期桶是 07 点", buckets, ["2026021405", "2026021406", "2026021407"])
+test("再早 1s → 07 点尚未过期",          stale_buckets(T0805 + W - 1, hours=1), ["2026021406"])
+
+print("▶ is_stale_ref: 桶格式 + 旧平铺格式")
+stale = {"2026021406"}
+test("过期桶内",     is_stale_ref("refs/tags/lock/2026021406/s30x0-1", stale, T0805, "202602140805"), True)
+test("当前桶内",     is_stale_ref("refs/tags/lock/2026021408/s30x0-1", stale, T0805, "202602140805"), False)
+test("旧格式过期",   is_stale_ref("refs/tags/lock/id0-202602140759", stale, T0805, "202602140805"), True)
+test("旧格式未过期", is_stale_ref("refs/tags/lock/id0-202602140805", stale, T0805, "202602140805"), False)
+
+print("▶ track_lock / pop_expired: 本地过期堆")
+tick.OWNED.clear()
+track_lock("s30x0", str(T0805 // 30))
+track_lock("xx5xxxxxxxx0", "202602140805")
+test("未到期不弹出",   pop_expired(T0805 + W + 59), [])
+test("cron 锁先到期",  pop_expired(T0805 + W + 60), ["refs/tags/lock/2026021408/xx5xxxxxxxx0-202602140805"])
+test("sec 锁 300s 后", pop_expired(T0805 + W + 300), [lock_ref("s30x0", str(T0805 // 30))])
+test("堆已清空",       tick.OWNED, [])
+
+# ══════════════════════════════════════════════════
+#  push_delete — git push 批量删除锁
+# ══════════════════════════════════════════════════
+
+import subprocess, tempfile
+from tick import push_delete
+
+def git(*args, cwd):
+    return subprocess.run(["git", "-c", "user.name=t", "-c", "user.email=t", *args],
+                          cwd=cwd, capture_output=True, text=True).stdout
+
+print("▶ push_delete: 一次 push 删除多个锁 ref (含已被删除的)")
+with tempfile.TemporaryDirectory() as tmp:
+    git("init", "-q", "--bare", "remote.git", cwd=tmp)
+    git("clone", "-q", "remote.git", "work", cwd=tmp)
+    work = f"{tmp}/work"
+    git("commit", "-q", "--allow-empty", "-m", "init", cwd=work)
+    locks = [f"refs/tags/lock/2026021408/s30x{i}-1" for i in range(3)]
+    git("push", "-q", "origin", "HEAD:refs/heads/main", *[f"HEAD:{r}" for r in locks], cwd=work)
+    fallback = push_delete(locks[:2] + ["refs/tags/lock/2026021408/gone-1"], cwd=work)
+    remaining = git("ls-remote", "origin", "refs/tags/*", cwd=work)
+    test("无需退回 API",     fallback, [])
+    test("两个锁已删除",     locks[0] in remaining or locks[1] in remaining, False)
+    test("未列出的锁保留",   locks[2] in remaining, True)
+    test("远端不可用时退回", push_delete(locks[2:], remote="/nonexistent", cwd=work), locks[2:])
+
+# ══════════════════════════════════════════════════
+#  RunReaper — 后台 run 清理
+# ══════════════════════════════════════════════════
+
+from tick import RunReaper
+
+class FakeRuns:
+    """替换 tick.api: 模拟分页的 run 列表和删除"""
+    def __init__(self, ids, fail=()):
+        self.ids, self.fail, self.deletes = list(ids), set(fail), []
+    def __call__(self, method, path, body=None, token=None, headers=None, critical=False):
+        if method == "GET":
+            page = int(path.split("page=")[-1])
+            return 200, {"workflow_runs": [{"id": i} for i in self.ids[(page - 1) * 100:page * 100]]}, {}
+        run_id = int(path.rsplit("/", 1)[-1])
+        self.deletes.append(run_id)
+        if run_id in self.fail: return 500, None, {}
+        if run_id not in self.ids: return 404, None, {}
+        self.ids.remove(run_id)
+        return 204, None, {}
+
+real_api = tick.api
+print("▶ RunReaper: 分页超过 100 条, 跳过自身 run")
+tick.api = fake = FakeRuns([1] + list(range(1000, 1250)))  # GITHUB_RUN_ID=1
+reaper = RunReaper(workers=4)
+test("删除 250 条",         reaper.reap_once(), 250)
+test("自身 run 保留",       fake.ids, [1])
+test("每个 run 只删一次",   len(fake.deletes), len(set(fake.deletes)))
+
+print("▶ RunReaper: 已处理的 id 不重复下发, 失败的下次重试")
+tick.api = fake = FakeRuns([2000, 2001, 2002], fail={2001})
+reaper = RunReaper(workers=2)
+test("首次删除 2 条",       reaper.reap_once(), 2)
+fake.ids += [2000]  # 列表延迟: 已删除的 run 仍出现在列表中
+fake.fail.clear()
+test("重试失败的 1 条",     reaper.reap_once(), 1)
+test("2000 不再下发删除",   fake.deletes.count(2000), 1)
+tick.api = real_api
+
+# ══════════════════════════════════════════════════
+#  ETagCache — 条件请求缓存
+# ══════════════════════════════════════════════════
+
+from tick import ETagCache
+
+print("▶ ETagCache: 200 存入, 304 复用")
+cache = ETagCache()
+key = ("tok", "/repos/o/r/git/ref/heads/main")
+test("首次无条件头",     cache.conditional(key, None), None)
+test("200 原样返回",     cache.resolve(key, 200, {"sha": "a"}, {"etag": 'W/"1"'}), (200, {"sha": "a"}, {"etag": 'W/"1"'}))
+test("再次带 If-None-Match", cache.conditional(key, {"X": "1"}), {"X": "1", "If-None-Match": 'W/"1"'})
+test("304 返回缓存体",   cache.resolve(key, 304, None, {})[:2], (200, {"sha": "a"}))
+test("计数 1 命中 1 未命中", (cache.hits, cache.misses), (1, 1))
+test("stats",            cache.stats(), "etag 1/2 hit")
+
+print("▶ ETagCache: 不同 token 分开缓存, 错误不缓存")
+test("其他 token 无条件头", cache.conditional(("pat", key[1]), None), None)
+cache.resolve(("tok", "/x"), 404, {"message": "Not Found"}, {"etag": '"e"'})
+test("404 不缓存",       ("tok", "/x") in cache.entries, False)
+test("无缓存时 304 原样", cache.resolve(("tok", "/y"), 304, None, {})[0], 304)
+
+print("▶ api: GET 经过 ETag 缓存")
+calls = []
+def fake_send(method, path, body=None, token=None, headers=None):
+    calls.append(headers)
+    return (304, None, {}) if headers and "If-None-Match" in headers else (200, {"v": 1}, {"etag": '"v1"'})
+real_request, tick.CLIENT.request = tick.CLIENT.request, fake_send
+tick.ETAG = ETagCache()
+test("首次 200",      tick.api("GET", "/poll")[:2], (200, {"v": 1}))
+test("再次 304→缓存", tick.api("GET", "/poll")[:2], (200, {"v": 1}))
+tick.api("POST", "/poll")
+test("POST 不带条件头", calls[-1], None)
+tick.CLIENT.request = real_request
+
+# ══════════════════════════════════════════════════
+#  RateBudget — 配额预算
+# ══════════════════════════════════════════════════
+
+from tick import RateBudget
+
+def rate_headers(remaining, reset, resource="core", status="200"):
+    return {"x-ratelimit-limit": "1000", "x-ratelimit-remaining": str(remaining),
+            "x-ratelimit-reset": str(reset), "x-ratelimit-resource": resource, "status": status}
+
+print("▶ RateBudget: 无数据时不限制")
+clock = [BASE]
+budget = RateBudget(reserve=100, clock=lambda: clock[0])
+test("无数据 x1",       budget.stretch(), 1.0)
+
+print("▶ RateBudget: 预算充足 → 正常节奏")
+clock[0] = BASE + 600  # 已运行 10 分钟
+for _ in range(10): budget.observe("gh", rate_headers(900, BASE + 3600), critical=True)
+for _ in range(10): budget.observe("gh", rate_headers(880, BASE + 3600), critical=False)
+remaining, left, crit, maint = budget.forecast()
+test("剩余取最新响应头",  remaining, 880)
+test("距重置 3000s",      left, 3000)
+test("critical 预测 50",  round(crit), 50)
+test("maintenance 预测 50", round(maint), 50)
+test("充足 x1",           budget.stretch(), 1.0)
+
+print("▶ RateBudget: 运维超出余量 → 拉长")
+for _ in range(200): budget.observe("gh", rate_headers(300, BASE + 3600), critical=False)
+# headroom = 300 - 100 - 50 = 150, maintenance 预测 = 210 * 5 = 1050 → x7
+test("拉长 x7",           round(budget.stretch(), 1), 7.0)
+
+print("▶ RateBudget: 关键路径预测吃掉余量 → 跳过运维")
+for _ in range(100): budget.observe("gh", rate_headers(200, BASE + 3600), critical=True)
+test("跳过运维",          budget.stretch(), float("inf"))
+test("summary 标记跳过",  budget.summary().endswith("maint skip"), True)
+
+print("▶ RateBudget: 304 不计费, 按 resource 分窗口")
+budget = RateBudget(clock=lambda: BASE)
+budget.observe("gh", rate_headers(999, BASE + 60, status="304"), critical=False)
+budget.observe("gh", rate_headers(4000, BASE + 60, resource="graphql"), critical=True)
+test("304 不计入调用数",  budget.calls[("gh", "core", False)], 0)
+test("graphql 独立窗口",  budget.windows[("gh", "graphql")][1], 4000)
+test("summary",           budget.summary(), "gh:core 999/1000 ↻1m | gh:graphql 4000/1000 ↻1m | maint x1.0")
+
+# ══════════════════════════════════════════════════
+#  Timer — 单调时钟对齐
+# ══════════════════════════════════════════════════
+
+from tick import Timer
+
+print("▶ Timer: 锚定墙钟")
+timer = Timer()
+test("now ≈ time.time()",  abs(timer.now() - time.time()) < 0.01, True)
+
+print("▶ Timer: 对齐到下一个 1 秒边界以内的目标, 迟到 < 5ms")
+worst = 0.0
+for _ in range(5):
+    late = timer.sleep_until(timer.now() + 0.03)
+    worst = max(worst, late)
+test("不提前醒来",        worst >= 0, True)
+test("迟到 < 5ms",        worst < 0.005, True)
+test("lead 自适应有界",   0.001 <= timer.lead <= 0.05, True)
+
+print("▶ Timer: 已过去的目标立即返回")
+test("迟到量为正",        timer.sleep_until(timer.now() - 1) >= 1, True)
+
+print("▶ Timer: stop 事件提前返回")
+stop = threading.Event()
+threading.Timer(0.05, stop.set).start()
+t0 = time.time()
+test("返回 0",            timer.sleep_until(timer.now() + 10, stop), 0.0)
+test("0.05s 左右返回",    time.time() - t0 < 1, True)
+
+print("▶ Timer: 重新锚定报告漂移")
+timer.anchor -= 250_000_000  # 模拟单调时钟比墙钟慢 250ms
+test("漂移 ≈ +250ms",     round(timer.resync() * 1000), 250)
+test("锚定后 now ≈ 墙钟", abs(timer.now() - time.time()) < 0.01, True)
+
+print("▶ Scheduler: @1s 每秒一个边界")
+fires, wakeups = simulate_heap([], [SecEntry(1, "o/r", "a.yml")], 60)
+test("@1s 60 秒触发 60 次", fires.get(0, 0), 60)
+
+# ══════════════════════════════════════════════════
+#  Tracer — 触发延迟追踪
+# ══════════════════════════════════════════════════
+
+from tick import Fire, Tracer, percentiles
+
+print("▶ percentiles: 最近秩")
+test("1..100 p50/p95/p99", percentiles(list(range(1, 101))), [50, 95, 99])
+test("单个样本",           percentiles([7]), [7, 7, 7])
+test("空列表",             percentiles([]), [None, None, None])
+
+print("▶ Fire: 阶段延迟 (ms)")
+fire = Fire(0, "@10s", BASE, BASE + 0.012)
+fire.sha, fire.lock, fire.done = BASE + 0.012, BASE + 0.150, BASE + 0.400
+test("唤醒 12ms",  fire.ms("wake"), 12.0)
+test("锁 150ms",   fire.ms("lock"), 150.0)
+test("派发 400ms", fire.ms("done"), 400.0)
+test("未完成为 None", Fire(1, "x", BASE, BASE).ms("done"), None)
+
+print("▶ Tracer: JSON lines + job summary 表格")
+with tempfile.TemporaryDirectory() as tmp:
+    tracer = Tracer(path=f"{tmp}/trace.jsonl", summary=f"{tmp}/summary.md")
+    for i in range(3):
+        a = Fire(0, "*/5 * * * *", BASE, BASE + 0.01)
+        a.sha, a.lock, a.done, a.won, a.ok = BASE + 0.01, BASE + 0.1, BASE + 0.2 + i / 10, True, True
+        b = Fire(1, "@30s", BASE, BASE + 0.01)
+        b.sha, b.lock = BASE + 0.01, BASE + 0.1  # 未获锁 / 未完成
+        tracer.record([a, b])
+    lines = [json.loads(l) for l in open(f"{tmp}/trace.jsonl")]
+    test("每次触发一行",      len(lines), 6)
+    test("JSON 字段",         (lines[0]["idx"], lines[0]["done_ms"], lines[1]["done_ms"]), (0, 200.0, None))
+    test("每轮最慢",          list(tracer.rounds), [200.0, 300.0, 400.0])
+    tracer.flush(BASE)
+    table = open(f"{tmp}/summary.md").read()
+    test("表头",              "| 任务 | 次数 | 唤醒 | SHA | 锁 | 派发完成 |" in table, True)
+    test("每轮最慢行",        "| 每轮最慢 | 3 | | | | 300 / 400 / 400 |" in table, True)
+    test("任务行",            "| #1 @30s | 3 | 10 / 10 / 10 | 10 / 10 / 10 | 100 / 100 / 100 | - / - / - |" in table, True)
+    open(f"{tmp}/summary.md", "w").close()
+    tracer.flush(BASE + 1)
+    test("间隔内不重复写",    open(f"{tmp}/summary.md").read(), "")
+    tracer.flush(BASE + 1, force=True)
+    test("force 立即写",      open(f"{tmp}/summary.md").read(), tracer.table())
+
+# ══════════════════════════════════════════════════
+#  simulate — 事件驱动快进
+# ══════════════════════════════════════════════════
+
+import calendar, sys
+from tick import add_horizon, fire_timeline, count_fires
+
+print("▶ add_horizon: 秒 / 日历月")
+test("6h",             add_horizon(BASE, "6h") - BASE, 6 * 3600)
+test("2w",             add_horizon(BASE, "2w") - BASE, 14 * 86400)
+test("1y = 365 天",    add_horizon(BASE, "1y") - BASE, 365 * 86400)
+jan31 = calendar.timegm((2026, 1, 31, 0, 0, 0))
+test("1-31 +1M → 2-28", time.gmtime(add_horizon(jan31, "1M"))[:3], (2026, 2, 28))
+for bad in ["0d", "5x", "d"]:
+    try: add_horizon(BASE, bad); rejected = False
+    except ValueError: rejected = True
+    test(f"拒绝 {bad}", rejected, True)
+
+print("▶ fire_timeline: 与 Scheduler 模拟一致 (24小时)")
+cron = [CronEntry(k, "o/r", "a.yml") for k in ["*/5 * * * *", "0 */6 * * *", "0 0 31 2 *"]]
+sec  = [SecEntry(30, "o/r", "b.yml"), SecEntry(300, "o/r", "c.yml")]
+timeline = list(fire_timeline(cron, sec, BASE, BASE + 86400))
+per_idx = {}
+for _, idx in timeline: per_idx[idx] = per_idx.get(idx, 0) + 1
+test("计数 == simulate_heap", per_idx, simulate_heap(cron, sec, 86400)[0])
+test("时间有序",              [at for at, _ in timeline] == sorted(at for at, _ in timeline), True)
+test("首个触发在起点",        timeline[0], (BASE, 0))
+
+print("▶ count_fires: 与时间线一致, 秒级按槽数直接计算")
+counts = count_fires(cron, sec, BASE + 7, BASE + 86400)
+expect = {}
+for at, idx in fire_timeline(cron, sec, BASE + 7, BASE + 86400):
+    c = expect.setdefault(idx, [0, at, at]); c[0] += 1; c[2] = at
+test("cron 计数/首末",   [counts[i] for i in range(2)], [expect[0], expect[1]])
+test("秒级计数/首末",    [counts[i] for i in (3, 4)], [expect[3], expect[4]])
+test("永不匹配为 0",     counts[2], [0, None, None])
+test("窗口短于间隔",     count_fires([], [SecEntry(300, "o/r", "c.yml")], BASE + 1, BASE + 60)[0], [0, None, None])
+
+print("▶ count_fires: 一整年")
+year = count_fires([CronEntry("0 8 * * 1", "o/r", "w.yml"), CronEntry("0 0 29 2 *", "o/r", "l.yml")],
+                   [SecEntry(30, "o/r", "p.yml")], BASE, add_horizon(BASE, "1y"))
+test("每周一 52 次",       year[0][0], 52)
+test("2026-2027 无闰日",   year[1][0], 0)
+test("@30s 一年",          year[2][0], 365 * 2880)
+
+print("▶ parse_dispatch: 显式文本")
+cron, sec = parse_dispatch("# c\n*/5 * * * * o/r a.yml\n@10s o/r b.yml\nbad\n")
+test("文本解析", ([e.key for e in cron], [e.n for e in sec]), (["*/5 * * * *"], [10]))
+rejected = []
+parse_dispatch("# c\n*/5 * * * * o/r a.yml\nbad\n@0s o/r b.yml\n* * * * * o/r c.yml when=now\n", rejected)
+test("报告跳过的行", [(n, reason) for n, _, reason in rejected],
+     [(3, "1 个字段, 应为 5 个 cron 字段或 @Ns, 再加 仓库 工作流"), (4, "无效值 0"), (5, "未知选项 when")])
+
+print("▶ tick.py simulate: 无 Actions 环境变量也可运行")
+with tempfile.TemporaryDirectory() as tmp:
+    with open(f"{tmp}/dispatch", "w") as f: f.write("0 8 * * * o/r a.yml\n@3600s o/r b.yml\n")
+    run = lambda *a: subprocess.run([sys.executable, "tick.py", "simulate", "--file", f"{tmp}/dispatch",
+                                     "--start", "2026-02-14", *a], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__)),
+                                    env={"PATH": os.environ.get("PATH", "")})
+    out = run("--for", "1w").stdout.splitlines()
+    test("计数行",   [l.split()[1] for l in out[1:3]], ["7", "168"])
+    test("合计",     out[-1], "合计 175 次")
+    out = run("--for", "1d", "--timeline", "--limit", "2").stdout.splitlines()
+    test("时间线",   out[1:], ["2026-02-14 00:00:00  #1  @3600s  o/r  b.yml",
+                               "2026-02-14 01:00:00  #1  @3600s  o/r  b.yml"])
+    test("无效时长退出码 2", run("--for", "5x").returncode, 2)
+    with open(f"{tmp}/bad", "w") as f: f.write("0 9 * * 1 o/r a.yml\n0 9 * * 7 o/r b.yml\n@10s o/r\n# ok\n")
+    bad = subprocess.run([sys.executable, "tick.py", "simulate", "--file", f"{tmp}/bad", "--for", "1d"],
+                         capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                         env={"PATH": os.environ.get("PATH", "")})
+    test("跳过的行退出码 1", bad.returncode, 1)
+    test("报告行号与原因",   bad.stderr.splitlines(), ["⚠️ 第 2 行已跳过 (无效值 7): 0 9 * * 7 o/r b.yml",
+                                                      "⚠️ 第 3 行已跳过 (2 个字段, 应为 5 个 cron 字段或 @Ns, 再加 仓库 工作流): @10s o/r"])
+    test("头部注明跳过数",   bad.stdout.splitlines()[0].endswith("1 cron + 0 秒级 | 跳过 2 行"), True)
+    test("无跳过退出码 0",   run("--for", "1d").returncode, 0)
+    bad = run("--start", "2026-13-01")
+    test("无效起始时刻退出码 2", (bad.returncode, "Traceback" in bad.stderr, "无效起始时刻" in bad.stderr), (2, False, True))
+
+# ══════════════════════════════════════════════════
+#  harness — 本地 API 替身 + 倍速时钟
+# ══════════════════════════════════════════════════
+
+from harness_tick import FakeGitHub, run_chains, analyze
+
+print("▶ Timer: 倍速虚拟时钟")
+timer = Timer(scale=60, origin=time.time() - 10)
+test("origin 后 10 秒 ≈ 虚拟 600 秒", round(timer.now() - time.time()), 590)
+t0 = time.monotonic()
+timer.sleep_until(timer.now() + 3)
+test("虚拟 3 秒 ≈ 真实 50ms", time.monotonic() - t0 < 0.2, True)
+
+print("▶ FakeGitHub: 锁 ref 201 / 422 + matching-refs + 删除")
+fake = FakeGitHub().start()
+client = GitHubClient(fake.url)
+ref = "refs/tags/lock/2026021400/a0-202602140000"
+test("首次创建 201",   client.request("POST", "/repos/o/r/git/refs", {"ref": ref, "sha": "0" * 40})[0], 201)
+test("再次创建 422",   client.request("POST", "/repos/o/r/git/refs", {"ref": ref, "sha": "0" * 40})[0], 422)
+status, data, headers = client.request("GET", "/repos/o/r/git/matching-refs/tags/lock/2026021400/")
+test("matching-refs",  [r["ref"] for r in data], [ref])
+test("配额头",         headers["x-ratelimit-limit"], "5000")
+test("删除 204",       client.request("DELETE", f"/repos/o/r/git/{ref}")[0], 204)
+test("重复删除 422",   client.request("DELETE", f"/repos/o/r/git/{ref}")[0], 422)
+
+print("▶ FakeGitHub: GraphQL 批量竞锁逐个成败")
+labels = [("a0", "202602140000"), ("a1", "202602140000")]
+fake.handle("POST", "/repos/o/r/git/refs", {"ref": lock_ref(*labels[0])})
+status, body, _ = client.request("POST", "graphql", {"query": build_lock_mutation(labels),
+                                                     "variables": {"repo": "R_o/r", "oid": "0" * 40}})
+test("已存在 / 获锁",  parse_lock_result(labels, status, body),
+     {labels[0]: (False, "exists"), labels[1]: (True, "ok")})
+
+print("▶ FakeGitHub: dispatches + runs 分页删除 + ETag")
+test("dispatch 204",   client.request("POST", "/repos/o/a/actions/workflows/x.yml/dispatches", {"ref": "main"})[0], 204)
+test("记录派发",       [d[1:] for d in fake.dispatches], [("o/a", "x.yml")])
+fake.add_runs("o/r", 150)
+page2 = client.request("GET", "/repos/o/r/actions/runs?status=completed&per_page=100&page=2")[1]
+test("第 2 页 50 条",  len(page2["workflow_runs"]), 50)
+test("删除 run 204",   client.request("DELETE", "/repos/o/r/actions/runs/1")[0], 204)
+test("再删 404",       client.request("DELETE", "/repos/o/r/actions/runs/1")[0], 404)
+etag = client.request("GET", "/repos/o/r")[2]["etag"]
+test("If-None-Match 304", client.request("GET", "/repos/o/r", headers={"If-None-Match": etag})[0], 304)
+fake.stop()
+
+print("▶ FakeGitHub: 错误注入 + 配额耗尽")
+flaky = FakeGitHub(errors=1.0)
+test("注入 502",       flaky.handle("POST", "/repos/o/r/git/refs", {"ref": ref})[0], 502)
+test("未写入",         flaky.refs.get("o/r", {}), {})
+lossy = FakeGitHub(lost=1.0)
+test("响应丢失 502",   lossy.handle("POST", "/repos/o/r/git/refs", {"ref": ref})[0], 502)
+test("但已写入",       list(lossy.refs["o/r"]), [ref])
+tight = FakeGitHub(rate_limit=1)
+tight.rate_headers("t", 200)
+test("配额耗尽 403",   tight.handle("GET", "/repos/o/r", None, "t")[0], 403)
+
+print("▶ harness: 双链倍速运行, 无重复触发")
+with tempfile.TemporaryDirectory() as tmp:
+    fake = FakeGitHub(latency=0.005).start()
+    dispatch = "* * * * * o/a m.yml\n@30s o/b s.yml\n"
+    origin, stopped = run_chains(fake, dispatch, 2, 60, 4, tmp)
+    fake.stop()
+    report = analyze(fake, dispatch, origin, stopped, 60)
+    test("有期望触发",   report["expected"] > 0, True)
+    test("无重复",       report["duplicates"], 0)
+    test("全部送达",     report["missed"], 0)
+
+# ══════════════════════════════════════════════════
+#  state — 跨 run 检查点
+# ══════════════════════════════════════════════════
+
+from tick import save_state, load_state, STATE_MAX_AGE
+
+print("▶ Scheduler: 从触发记录续接, 不重复已触发的槽")
+cron = [CronEntry("*/5 * * * *", "o/r", "a.yml")]
+sec  = [SecEntry(30, "o/r", "b.yml")]
+sched = Scheduler(cron, sec, BASE)
+sched.pop_due(BASE + 30)
+test("记录最近触发",   sched.last, {0: BASE, 1: BASE + 30})
+fired = {sched.name(i): at for i, at in sched.last.items()}
+test("按锁名记录",     fired, {"xx5xxxxxxxx40ec28cd": BASE, "s30xa5ba632c": BASE + 30})
+resumed = Scheduler(cron, sec, BASE + 30, fired)
+test("同槽不再触发",   resumed.pop_due(BASE + 30), [])
+test("下一槽照常",     resumed.pop_due(BASE + 60), [(1, BASE + 60)])
+test("无记录则冷启动", Scheduler(cron, sec, BASE + 30).pop_due(BASE + 30), [(1, BASE + 30)])
+
+print("▶ save_state / load_state: 缓存 + 待清理锁 + 触发记录")
+saved = (tick.SHA, tick.REPO_ID, dict(tick.DEFAULT_BRANCH), list(tick.OWNED))
+with tempfile.TemporaryDirectory() as tmp:
+    path = f"{tmp}/state.json"
+    tick.SHA, tick.REPO_ID = "abc", "R_1"
+    tick.DEFAULT_BRANCH.update({"o/r": "trunk"})
+    tick.OWNED[:] = [(BASE + 60, "refs/tags/lock/2026021400/x-202602140000")]
+    save_state(path, sched, BASE + 30)
+    test("无临时文件残留", os.listdir(tmp), ["state.json"])
+    tick.SHA = tick.REPO_ID = None
+    tick.DEFAULT_BRANCH.clear()
+    tick.OWNED.clear()
+    test("恢复触发记录",   load_state(path, BASE + 60), fired)
+    test("恢复缓存",       (tick.SHA, tick.REPO_ID, tick.DEFAULT_BRANCH), ("abc", "R_1", {"o/r": "trunk"}))
+    test("恢复待清理锁",   pop_expired(BASE + 60), ["refs/tags/lock/2026021400/x-202602140000"])
+    test("过旧只丢触发记录", (load_state(path, BASE + 31 + STATE_MAX_AGE), tick.SHA), ({}, "abc"))
+    open(path, "w").write("{broken")
+    test("损坏文件冷启动", load_state(path, BASE), {})
+    test("缺失文件冷启动", load_state(f"{tmp}/missing.json", BASE), {})
+tick.SHA, tick.REPO_ID = saved[:2]
+tick.DEFAULT_BRANCH.clear(); tick.DEFAULT_BRANCH.update(saved[2])
+tick.OWNED[:] = saved[3]
+
+# ══════════════════════════════════════════════════
+#  misfire — 错过槽的有界补发
+# ══════════════════════════════════════════════════
+
+print("▶ Scheduler: misfire=once 错过多个只补最近一个")
+sched = Scheduler([CronEntry("* * * * *", "o/r", "a.yml")], [SecEntry(10, "o/r", "b.yml")], BASE)
+sched.pop_due(BASE)
+test("02:35 醒来: 只补 02:00 / 02:30", sched.pop_due(BASE + 155), [(0, BASE + 120), (1, BASE + 150)])
+test("下一次到期",                     sched.next_due(), BASE + 160)
+
+print("▶ Scheduler: misfire=all 逐个补发, 沿用原槽标签")
+sched = Scheduler([CronEntry("* * * * *", "o/r", "a.yml", "all")], [], BASE)
+sched.pop_due(BASE)
+fires = sched.pop_due(BASE + 150)
+test("补 01:00 与 02:00",   fires, [(0, BASE + 60), (0, BASE + 120)])
+test("原槽标签",           [sched.label(i, at)[1] for i, at in fires], ["202602140001", "202602140002"])
+
+print("▶ Scheduler: misfire=skip 只触发当前槽")
+sched = Scheduler([CronEntry("* * * * *", "o/r", "a.yml", "skip")], [SecEntry(10, "o/r", "b.yml", "skip")], BASE)
+sched.pop_due(BASE)
+test("02:30 醒来: 01:00 丢弃", sched.pop_due(BASE + 150), [(0, BASE + 120), (1, BASE + 150)])
+
+print("▶ Scheduler: 补发窗口有界")
+sched = Scheduler([CronEntry("* * * * *", "o/r", "a.yml", "all")], [], BASE, window=120)
+sched.pop_due(BASE)
+test("窗口外的槽丢弃",     sched.pop_due(BASE + 600), [(0, BASE + 480), (0, BASE + 540), (0, BASE + 600)])
+sched = Scheduler([], [SecEntry(1, "o/r", "a.yml", "all")], BASE, window=5)
+sched.pop_due(BASE)
+test("@1s 最多补 window 个", len(sched.pop_due(BASE + 3600)), 6)
+
+print("▶ Scheduler: 续期空档内错过的槽按策略补发")
+sched = Scheduler([CronEntry("*/5 * * * *", "o/r", "a.yml")], [], BASE + 420, fired={"xx5xxxxxxxx40ec28cd": BASE})
+test("补最近的 05:00",     sched.pop_due(BASE + 420), [(0, BASE + 300)])
+
+print("▶ parse_dispatch: misfire 选项")
+cron, sec = parse_dispatch("* * * * * o/r a.yml misfire=all\n@10s o/r b.yml misfire=skip\n"
+                           "* * * * * o/r c.yml\n* * * * * o/r d.yml misfire=bogus\n@5s o/r e.yml x=1\n")
+test("逐行策略",          [e.misfire for e in cron + sec], ["all", "once", "skip"])
+test("非法策略/未知选项跳过", len(cron + sec), 3)
+
+# ══════════════════════════════════════════════════
+#  CronIndex — 倒排字段索引 + 范围步进 / 英文缩写
+# ══════════════════════════════════════════════════
+
+from tick import CronIndex
+
+print("▶ compile_field: 范围步进 / 起点步进 / 英文缩写")
+test("1-30/5",            compile_field("1-30/5", 0, 59), sum(1 << v for v in (1, 6, 11, 16, 21, 26)))
+test("10/15 到上限",      compile_field("10/15", 0, 59), 1 << 10 | 1 << 25 | 1 << 40 | 1 << 55)
+test("*/20,5 组合",       compile_field("*/20,5", 0, 59), 1 | 1 << 5 | 1 << 20 | 1 << 40)
+test("MON-fri",           compile_cron(["0", "9", "*", "*", "MON-fri"])[4], 0b0111110)
+test("jan,jul-sep",       compile_cron(["0", "0", "1", "jan,jul-sep", "*"])[3], 1 << 1 | 0b111 << 7)
+test("名称不跨字段",      CronEntry("0 0 * * *", "o/r", "a.yml").masks[3] > 0, True)
+for bad in ["1-30/0", "5/", "jan", "30-1/5"]:
+    try: compile_field(bad, 0, 59); rejected = False
+    except ValueError: rejected = True
+    test(f"拒绝 {bad}", rejected, True)
+test("月份名不能用于周", parse_dispatch("0 0 * * jan o/r a.yml")[0], [])
+
+print("▶ CronIndex: 5 次 AND 与逐条匹配一致")
+exprs = ["*/5 * * * *", "0 * * * *", "0 8 * * mon-fri", "15,45 9-17 * * 1-5", "0,5,10,15,20,25,30,35,40,45,50,55 * * * *",
+         "30 2 1 * *", "0 0 31 2 *", "0-30/10 */2 * jan-jun *"]
+entries = [CronEntry(k, "o/r", f"{i}.yml") for i, k in enumerate(exprs)]
+index = CronIndex(entries)
+mismatch = [m for m in range(0, 7 * 1440, 7)
+            if index.due(time.gmtime(BASE + m * 60)) != [i for i, e in enumerate(entries) if e.match(time.gmtime(BASE + m * 60))]]
+test("一周内每 7 分钟抽样一致", mismatch, [])
+test("相同位掩码共享一位",     index.groups[0], [0, 4])
+test("不同表达式数",           len(index.groups), 7)
+test("00:00 到期",             index.due(time.gmtime(BASE)), [0, 1, 4, 7])
+
+print("▶ scan_round: 传入倒排索引, 结果与逐条匹配相同")
+fired, plain = [], []
+scan_round(BASE, None, {}, entries, [], lambda idx, show, repo, wf: fired.append((idx, show)), index)
+scan_round(BASE, None, {}, entries, [], lambda idx, show, repo, wf: plain.append((idx, show)))
+test("回调顺序与 show", fired, [(0, "*/5 * * * *"), (1, "0 * * * *"), (4, exprs[4]), (7, exprs[7])])
+test("逐条匹配一致",    plain, fired)
+swapped = list(entries)
+swapped[0] = CronEntry("30 * * * *", "o/r", "swap.yml")  # 原地替换, 无隐藏缓存
+fired = []
+scan_round(BASE + 1800, None, {}, swapped, [], lambda idx, show, repo, wf: fired.append(idx))
+test("原地替换后 :30 触发", 0 in fired, True)
+
+# ══════════════════════════════════════════════════
+#  spread — 哈希相位错峰
+# ══════════════════════════════════════════════════
+
+from tick import spread_phase
+
+print("▶ spread_phase: 稳定 + 有界")
+entries = [CronEntry("*/5 * * * *", f"o/r{i}", "a.yml") for i in range(50)] + \
+          [SecEntry(n, f"o/r{i}", "b.yml") for i, n in enumerate([10, 30, 60, 300] * 10)]
+phases = [spread_phase(e, 30) for e in entries]
+test("同一任务相位不变",   phases, [spread_phase(e, 30) for e in entries])
+test("cron 在窗口内",      all(0 <= p < 30 for p in phases[:50]), True)
+test("秒级不超过间隔",     all(p < min(30, e.n) for p, e in zip(phases[50:], entries[50:])), True)
+test("50 条 cron 分散",    len(set(phases[:50])) > 15, True)
+test("窗口 0 关闭",        spread_phase(entries[0], 0), 0)
+test("@1s 无相位",         spread_phase(SecEntry(1, "o/r", "a.yml"), 30), 0)
+
+print("▶ Scheduler: 按槽起点 + 相位触发, 锁标签不变")
+cron = CronEntry("*/5 * * * *", "o/r", "a.yml")
+sec  = SecEntry(30, "o/r", "b.yml")
+cron.phase, sec.phase = 17, 7
+sched = Scheduler([cron], [sec], BASE + 1)
+test("首个到期 = 下一槽 + 相位", sched.next_due(), BASE + 7)
+test("相位之前不触发",           sched.pop_due(BASE + 6), [])
+test("返回槽起点",               sched.pop_due(BASE + 17), [(1, BASE), (0, BASE)])
+test("cron 标签仍为整分",        sched.label(0, BASE), ("xx5xxxxxxxx40ec28cd", "202602140000"))
+test("下一次 = 槽 + 相位",       sched.next_due(), BASE + 37)
+late = Scheduler([cron], [], BASE)
+late.pop_due(BASE + 17)
+test("迟到补发按槽计算",         late.pop_due(BASE + 600 + 16), [(0, BASE + 300)])
+cron.phase = sec.phase = 0
+
+print("▶ parse_dispatch: SPREAD 关闭时相位为 0")
+test("默认无相位", [e.phase for e in sum(parse_dispatch("*/5 * * * * o/r a.yml\n@30s o/r b.yml"), [])], [0, 0])
+
+# ══════════════════════════════════════════════════
+#  reload — 配置热更新
+# ══════════════════════════════════════════════════
+
+from tick import lock_names, lock_time, fetch_dispatch, poll_dispatch, RELOAD
+
+print("▶ lock_names: 由内容决定, 与行号无关")
+a, b, c = (CronEntry("*/5 * * * *", "o/r", "a.yml"), SecEntry(30, "o/r", "b.yml"),
+           CronEntry("0 8 * * *", "o/r", "c.yml"))
+test("插入新行不影响其他锁名", lock_names([a, b])[1], lock_names([c, a, b])[2])
+test("重复行追加序号",         lock_names([a, a])[1], lock_names([a])[0] + "k1")
+test("sec 锁名可解析间隔",     lock_time(lock_names([b])[0], "2"), 60)
+
+print("▶ Scheduler.reload: 只增删有变化的任务")
+sched = Scheduler([a, c], [b], BASE)
+sched.pop_due(BASE + 30)
+d = CronEntry("*/10 * * * *", "o/r", "d.yml")
+test("+1 -1 =2",            sched.reload([d, a], [b], BASE + 40), (1, 1, 2))
+test("保留到期时刻",        sorted(sched.heap), sorted([(BASE + 60, 2), (BASE + 300, 1), (BASE + 600, 0)]))
+test("保留触发记录",        sched.last, {1: BASE, 2: BASE + 30})
+test("新增任务从当前起调度", sched.pop_due(BASE + 600), [(2, BASE + 600), (1, BASE + 600), (0, BASE + 600)])
+test("删除的任务不再触发",  [i for i, _ in sched.pop_due(BASE + 8 * 3600)].count(3), 0)
+
+import contextlib, io
+
+print("▶ fetch_dispatch / poll_dispatch: 仓库文件 + ETag")
+fake = FakeGitHub().start()
+saved_client, saved_path = tick.CLIENT, tick.DISPATCH_PATH
+tick.CLIENT, tick.DISPATCH_PATH = GitHubClient(fake.url), "config/dispatch.txt"
+fake.set_file(tick.GITHUB_REPOSITORY, "config/dispatch.txt", "*/5 * * * * o/r a.yml\n")
+test("读取文件",        fetch_dispatch(), "*/5 * * * * o/r a.yml\n")
+hits = tick.ETAG.hits
+woke = threading.Event()
+test("未变化不通知",    (poll_dispatch("*/5 * * * * o/r a.yml\n", woke), woke.is_set()), ("*/5 * * * * o/r a.yml\n", False))
+test("未变化走 304",    tick.ETAG.hits - hits, 1)
+fake.set_file(tick.GITHUB_REPOSITORY, "config/dispatch.txt", "@10s o/r b.yml\n")
+test("变化后通知",      (poll_dispatch("*/5 * * * * o/r a.yml\n", woke), woke.is_set()), ("@10s o/r b.yml\n", True))
+test("主循环收到新文本", RELOAD.get_nowait(), "@10s o/r b.yml\n")
+tick.DISPATCH_PATH = "missing.txt"
+test("文件不存在",      fetch_dispatch(), None)
+fake.set_file(tick.GITHUB_REPOSITORY, "config/dispatch.txt", b"@10s o/r \xff.yml\n")
+tick.DISPATCH_PATH = "config/dispatch.txt"
+with contextlib.redirect_stdout(io.StringIO()):
+    test("非 UTF-8 文件保留当前配置", poll_dispatch("@10s o/r b.yml\n", woke), "@10s o/r b.yml\n")
+tick.CLIENT, tick.DISPATCH_PATH = saved_client, saved_path
+fake.stop()
+
+# ══════════════════════════════════════════════════
+#  shard — N 链分片 + 心跳接管
+# ══════════════════════════════════════════════════
+
+from collections import Counter
+from tick import Owners, Heartbeat, heartbeat, take_over, BEAT_KEEP
+
+def duration(workflow, chains=""):
+    """子进程导入 tick, 读取模块级 DURATION"""
+    env = {**os.environ, "GITHUB_WORKFLOW": workflow, "CHAINS": chains}
+    out = subprocess.run([sys.executable, "-c", "import tick; print(tick.DURATION)"],
+                         env=env, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    return int(out.stdout)
+
+print("▶ DURATION: 按链序号在 5h 之后错开续期")
+test("双链 a = 5h",        duration("tick-a"), 18000)
+test("双链 b = 5.5h",      duration("tick-b"), 19800)
+test("三链 c = 5h40m",     duration("tick-c", "tick-a,tick-b,tick-c"), 20400)
+test("CHAINS 决定序号",    duration("tick-a", "tick-b,tick-a"), 19800)
+
+print("▶ Owners: rendezvous 哈希归属, 失联只移动其任务")
+chains = ["tick-a", "tick-b", "tick-c"]
+names  = [f"x{i}" for i in range(300)]
+views  = {c: Owners(chains, c, stale=180) for c in chains}
+for view in views.values():
+    view.beats = {c: BASE for c in chains}
+owner = {n: views["tick-a"].owner(n, BASE) for n in names}
+test("各链视角一致",     all(views[c].owner(n, BASE) == owner[n] for c in chains for n in names), True)
+test("恰好一条链负责",   all(sum(views[c].owns(n, BASE) for c in chains) == 1 for n in names), True)
+test("分布大致均匀",     min(Counter(owner.values()).values()) > 60, True)
+views["tick-a"].beats["tick-c"] = BASE - 200
+moved = {n: views["tick-a"].owner(n, BASE) for n in names}
+test("失联链的任务被接管", any(o == "tick-c" for o in moved.values()), False)
+test("其余任务不动",     all(moved[n] == owner[n] for n in names if owner[n] != "tick-c"), True)
+test("本链永远存活",     Owners(chains, "tick-a").alive("tick-a", BASE), True)
+
+print("▶ Owners.takeovers: 只报告由存活转为失联的链")
+view = Owners(chains, "tick-a", stale=180)
+test("启动时未见心跳不算接管", view.takeovers(BASE), {})
+view.beats = {"tick-b": BASE, "tick-c": BASE}
+test("读到心跳后存活",   (view.takeovers(BASE + 60), view.down), ({}, {}))
+view.beats["tick-b"] = BASE + 120
+test("心跳过期报告一次", view.takeovers(BASE + 200), {"tick-c": BASE})
+test("不重复报告",       view.takeovers(BASE + 260), {})
+view.beats["tick-c"] = BASE + 250
+test("恢复后移出",       (view.takeovers(BASE + 260), "tick-c" in view.down), ({}, False))
+
+print("▶ take_over: 从最后一次心跳回拨, 按 misfire 补发")
+entries = [CronEntry("* * * * *", "o/r", f"m{i}.yml", misfire="all") for i in range(12)]
+sched = Scheduler(entries, [], BASE)
+view  = Owners(["tick-a", "tick-b"], "tick-a", stale=180)
+view.beats = {"tick-b": BASE}
+view.takeovers(BASE)
+mine  = [i for i in range(12) if view.owns(sched.name(i), BASE)]
+theirs = [i for i in range(12) if i not in mine]
+sched.pop_due(BASE + 240)
+test("两条链都分到任务", (len(mine) > 0, len(theirs) > 0), (True, True))
+test("接管数",          take_over(view, sched, BASE + 240), {"tick-b": len(theirs)})
+replay = sched.pop_due(BASE + 240)
+test("补发心跳后的每个槽", sorted(replay), sorted((i, BASE + m * 60) for i in theirs for m in range(5)))
+test("本链任务不受影响", [i for i, _ in replay if i in mine], [])
+
+print("▶ heartbeat: 写入本链心跳, 读取各链最新心跳, 删除遗留")
+fake = FakeGitHub().start()
+saved = (tick.CLIENT, tick.SHA, tick.LOCK_GC, list(tick.OWNED))
+tick.CLIENT, tick.SHA, tick.LOCK_GC = GitHubClient(fake.url), "0" * 40, "api"
+refs = fake.refs.setdefault(tick.GITHUB_REPOSITORY, {})
+for ref in ("refs/tags/beat/tick-b/%d" % (BASE + 30), "refs/tags/beat/tick-b/%d" % (BASE + 90),
+            "refs/tags/beat/tick-c/%d" % (BASE - BEAT_KEEP - 10)):
+    refs[ref] = "0" * 40
+view = Owners(["tick-a", "tick-b", "tick-c"], "tick-a", stale=180)
+heartbeat(view, BASE + 100)
+test("写入本链心跳",     f"refs/tags/beat/tick-a/{BASE + 100}" in refs, True)
+test("记入待清理",       (BASE + 280, f"refs/tags/beat/tick-a/{BASE + 100}") in tick.OWNED, True)
+test("取各链最新",       view.beats, {"tick-a": BASE + 100, "tick-b": BASE + 90, "tick-c": BASE - BEAT_KEEP - 10})
+test("遗留心跳已删除",   any("tick-c" in ref for ref in refs), False)
+
+print("▶ Heartbeat.release: 计划退出后其他链立即接管")
+view.takeovers(BASE + 100)  # tick-b 心跳正常
+beat = Heartbeat(Owners(["tick-a", "tick-b"], "tick-b", stale=180))
+beat.release(BASE + 120)
+test("停止心跳线程",     beat.stopped.is_set(), True)
+test("删除本链心跳",     sorted(ref for ref in refs if "tick-b" in ref), [f"refs/tags/beat/tick-b/{BASE + 120}-exit"])
+heartbeat(view, BASE + 130)
+test("读取退出标记",     view.gone, {"tick-b": BASE + 120})
+test("未过 TAKEOVER 即失联", view.alive("tick-b", BASE + 130), False)
+test("从退出时刻接管",   view.takeovers(BASE + 130).get("tick-b"), BASE + 120)
+view.beats["tick-b"] = BASE + 200  # 续期后的新 run 写入心跳
+test("新心跳恢复存活",   view.alive("tick-b", BASE + 200), True)
+
+print("▶ Heartbeat: 意外异常不终止线程")
+calls, saved_beat = [], tick.heartbeat
+def flaky(owners, now):
+    calls.append(now)
+    if len(calls) == 1: raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "bad")
+tick.heartbeat = flaky
+with contextlib.redirect_stdout(io.StringIO()) as out:
+    beat = Heartbeat(view, interval=0.02).start()
+    time.sleep(0.2)
+    beat.stop()
+tick.heartbeat = saved_beat
+test("异常后继续心跳",   (len(calls) > 1, "⚠️ 心跳异常" in out.getvalue()), (True, True))
+tick.CLIENT, tick.SHA, tick.LOCK_GC = saved[:3]
+tick.OWNED[:] = saved[3]
+fake.stop()
+
+# ══════════════════════════════════════════════════
+#  lease — 租约单主派发
+# ══════════════════════════════════════════════════
+
+from tick import Lease, LEASE_SKEW
+
+print("▶ FakeGitHub: 非强制更新 ref 只允许快进")
+fake = FakeGitHub()
+c1 = fake.handle("POST", "/repos/o/r/git/commits", {"message": "1", "tree": "t", "parents": ["0" * 40]})[1]["sha"]
+c2 = fake.handle("POST", "/repos/o/r/git/commits", {"message": "2", "tree": "t", "parents": [c1]})[1]["sha"]
+c3 = fake.handle("POST", "/repos/o/r/git/commits", {"message": "3", "tree": "t", "parents": ["0" * 40]})[1]["sha"]
+fake.handle("POST", "/repos/o/r/git/refs", {"ref": "refs/heads/x", "sha": "0" * 40})
+test("快进 200",       fake.handle("PATCH", "/repos/o/r/git/refs/heads/x", {"sha": c2, "force": False})[0], 200)
+test("非快进 422",     fake.handle("PATCH", "/repos/o/r/git/refs/heads/x", {"sha": c3, "force": False})[0], 422)
+test("强制 200",       fake.handle("PATCH", "/repos/o/r/git/refs/heads/x", {"sha": c3, "force": True})[0], 200)
+test("读取提交",       fake.handle("GET", f"/repos/o/r/git/commits/{c2}", None)[1]["parents"], [{"sha": c1}])
+
+print("▶ Lease: CAS 抢占 + 续期 + 热备")
+fake = FakeGitHub().start()
+saved = (tick.CLIENT, tick.SHA)
+tick.CLIENT, tick.SHA = GitHubClient(fake.url), "0" * 40
+a, b = Lease("tick-a#1", ttl=60), Lease("tick-b#2", ttl=60)
+a.step(BASE)
+b.step(BASE + 1)
+test("先到者持有 #1",   (a.held, a.token, b.held, b.holder), (True, 1, False, "tick-a#1"))
+test("主链全部获锁",    a.locks([("x", "1"), ("y", "1")], BASE + 2), {("x", "1"): (True, "lease-1"), ("y", "1"): (True, "lease-1")})
+test("热备不派发",      b.locks([("x", "1")], BASE + 2), {("x", "1"): (False, "standby")})
+test("派发前核对 token", (a.fence("lease-1", BASE + 2), a.fence("lease-0", BASE + 2)), (True, False))
+test("临近到期停手",    a.valid(BASE + 60 - LEASE_SKEW), False)
+a.done = BASE + 10
+a.step(BASE + 20)
+test("续期延长到期",    (a.held, a.expires), (True, BASE + 80))
+test("旧父提交 CAS 失败", b.write(1, BASE + 200), False)
+b.step(BASE + 50)
+test("未过期不抢占",    b.held, False)
+
+print("▶ Lease: 主链失联后接管, 旧主链被隔离")
+b.step(BASE + 80 + LEASE_SKEW + 1)
+test("过期后以 #2 接管", (b.held, b.token), (True, 2))
+test("带回旧主链进度",  b.takeovers.get_nowait(), (2, BASE + 10))
+with contextlib.redirect_stdout(io.StringIO()) as out:
+    a.step(BASE + 90)
+test("旧主链续期失败降级", (a.held, a.holder, "失去租约" in out.getvalue()), (False, "tick-b#2", True))
+test("旧 token 被隔离", a.fence("lease-1", BASE + 90), False)
+
+print("▶ Lease: 退出时释放, 备链立即接管")
+b.release(BASE + 100)
+a.step(BASE + 100 + LEASE_SKEW + 1)
+test("释放后立即接管",  (a.held, a.token), (True, 3))
+tick.CLIENT, tick.SHA = saved
+fake.stop()
+
+print("▶ Scheduler.rewind: since 为触发时刻, 含相位")
+entry = CronEntry("* * * * *", "o/r", "p.yml", misfire="all")
+entry.phase = 20
+sched = Scheduler([entry], [], BASE)
+sched.pop_due(BASE + 200)
+sched.rewind([0], BASE + 81)
+test("从触发时刻之后的槽补发", sched.pop_due(BASE + 200), [(0, BASE + 120), (0, BASE + 180)])
+
+# ══════════════════════════════════════════════════
+#  locks — 可替换的锁后端
+# ══════════════════════════════════════════════════
+
+from tick import SqliteLocks, RefLocks
+
+print("▶ SqliteLocks: 先写者胜 + 过期")
+labels = [("xx5xxxxxxxxab", "202602140000"), ("s30xcd", str(BASE // 30))]
+with tempfile.TemporaryDirectory() as tmp:
+    a, b = SqliteLocks(f"{tmp}/locks.db"), SqliteLocks(f"{tmp}/locks.db")
+    test("先到者获锁",     a.acquire(labels, BASE), {labels[0]: (True, "ok"), labels[1]: (True, "ok")})
+    test("后到者已存在",   b.acquire(labels, BASE), {labels[0]: (False, "exists"), labels[1]: (False, "exists")})
+    test("同一把锁不可重入", a.acquire(labels[:1], BASE)[labels[0]], (False, "exists"))
+    expiry = lock_expiry(*labels[0])
+    test("过期前仍阻挡",   b.acquire(labels[:1], expiry - 1)[labels[0]], (False, "exists"))
+    test("过期后可再获",   b.acquire(labels[:1], expiry)[labels[0]], (True, "ok"))
+    a.clean(now=expiry)
+    test("clean 删除过期锁", a.db.execute("SELECT name FROM locks").fetchall(), [(f"{labels[1][0]}-{labels[1][1]}",)])
+
+    print("▶ SqliteLocks: 两个进程同时竞锁, 每把锁恰好一个赢家")
+    race = ("import sys, json, tick; l = tick.SqliteLocks(sys.argv[1]); "
+            "r = l.acquire([('s5x' + str(i), '1') for i in range(300)], 0); "
+            "print(json.dumps(sorted(n for (n, _), (won, _) in r.items() if won)))")
+    procs = [subprocess.Popen([sys.executable, "-c", race, f"{tmp}/race.db"], stdout=subprocess.PIPE, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))) for _ in range(2)]
+    wins = [json.loads(p.communicate()[0]) for p in procs]
+    test("无重复获锁",     set(wins[0]) & set(wins[1]), set())
+    test("无遗漏",         len(wins[0]) + len(wins[1]), 300)
+
+print("▶ SqliteLocks.clean: 同时删除 OWNED 中到期的心跳 / 租约 ref")
+fake = FakeGitHub().start()
+saved = (tick.CLIENT, tick.LOCK_GC, list(tick.OWNED))
+tick.CLIENT, tick.LOCK_GC = GitHubClient(fake.url), "api"
+refs = fake.refs.setdefault(tick.GITHUB_REPOSITORY, {})
+refs["refs/tags/beat/tick-a/1"] = "0" * 40
+tick.OWNED[:] = [(1, "refs/tags/beat/tick-a/1")]
+with tempfile.TemporaryDirectory() as tmp:
+    SqliteLocks(f"{tmp}/locks.db").clean()
+test("心跳 ref 已删除",   ("refs/tags/beat/tick-a/1" in refs, tick.OWNED), (False, []))
+tick.CLIENT, tick.LOCK_GC = saved[:2]
+tick.OWNED[:] = saved[2]
+fake.stop()
+
+print("▶ LOCKS: 默认 ref 后端")
+test("默认 ref",           isinstance(tick.LOCKS, RefLocks), True)
+
+# ══════════════════════════════════════════════════
+#  retry — 派发失败的退避重试 + 熔断
+# ══════════════════════════════════════════════════
+
+from tick import Breaker, RetryQueue, is_retryable, retry_due, RETRY_BASE, RETRY_CAP
+
+print("▶ is_retryable: 网络 / 5xx / 429 / 限流 403 重试, 404 / 422 不重试")
+for err, want in [("0 timed out", True), ("502 Bad Gateway", True), ("429 Too Many", True),
+                  ("403 API rate limit exceeded", True), ("403 Forbidden", False),
+                  ("404 Not Found", False), ("422 Unprocessable", False)]:
+    test(f"{err}", is_retryable(err), want)
+
+print("▶ retry_due: 确定性退避 + 抖动")
+label = ("s30xab", str(BASE // 30))
+test("两次计算相同",   retry_due(label, BASE, 3), retry_due(label, BASE, 3))
+test("逐次递增",       retry_due(label, BASE, 1) < retry_due(label, BASE, 2) < retry_due(label, BASE, 3), True)
+test("首次在 [0.5, 1.5) × BASE", RETRY_BASE * 0.5 <= retry_due(label, BASE, 1) - BASE < RETRY_BASE * 1.5, True)
+test("单次退避不超过上限", retry_due(label, BASE, 12) - retry_due(label, BASE, 11) < RETRY_CAP * 1.5, True)
+test("不同任务抖动不同", retry_due(label, BASE, 1) != retry_due(("s30xcd", label[1]), BASE, 1), True)
+
+print("▶ Breaker: 连续失败熔断, 冷却后半开试探")
+br = Breaker(trip=3, cool=60)
+for t in range(3): br.record("o/bad", False, BASE + t)
+test("熔断后拦截",     (br.allow("o/bad", BASE + 10), br.allow("o/ok", BASE + 10)), (False, True))
+test("open 列出",      br.open(BASE + 10), ["o/bad"])
+test("冷却后放行一次", (br.allow("o/bad", BASE + 62), br.allow("o/bad", BASE + 63)), (True, False))
+br.record("o/bad", True, BASE + 63)
+test("试探成功恢复",   (br.allow("o/bad", BASE + 64), br.open(BASE + 64)), (True, []))
+
+print("▶ guarded_trigger: 熔断中不发请求")
+saved = (tick.trigger_workflow, tick.BREAKER)
+calls = []
+tick.trigger_workflow = lambda repo, wf: calls.append(repo) or (False, "502 Bad Gateway")
+tick.BREAKER = Breaker(trip=2, cool=60)
+results = [tick.guarded_trigger("o/r", "w.yml")[1] for _ in range(4)]
+test("两次失败后熔断", (results, len(calls)), (["502 Bad Gateway"] * 2 + ["circuit-open"] * 2, 2))
+tick.trigger_workflow = lambda repo, wf: calls.append(repo) or (False, "404 Not Found")
+tick.BREAKER = Breaker(trip=1, cool=60)
+tick.guarded_trigger("o/r", "w.yml")
+test("404 不计入熔断", tick.BREAKER.allow("o/r", tick.TIMER.now()), True)
+tick.trigger_workflow, tick.BREAKER = saved
+
+print("▶ RetryQueue: 标记共享 + 认领 + 期限")
+entry = SecEntry(30, "o/r", "w.yml")
+sched = Scheduler([], [entry], BASE)
+name  = sched.names[0]
+label = (name, str(BASE // 30))
+with tempfile.TemporaryDirectory() as tmp:
+    saved = tick.LOCKS
+    tick.LOCKS = SqliteLocks(f"{tmp}/locks.db")
+    a, b = RetryQueue(deadline=120), RetryQueue(deadline=120)
+    a.index(sched); b.index(sched)
+    due = a.add(label, 1, BASE)
+    test("首次重试时刻",   due, retry_due(label, BASE, 1))
+    test("写入共享标记",   tick.LOCKS.marked(), [label])
+    test("未到期不弹出",   a.pop_due(due - 1), [])
+    test("到期弹出",       a.pop_due(due), [(label, 1)])
+    a.add(label, 2, BASE)
+    a.add(label, 3, BASE)
+    test("只保留最新一次", a.pop_due(BASE + 1000), [(label, 3)])
+    b.claim(due + 1)
+    test("另一条链认领下一次", (b.items, b.next_due()), ({label: 2}, retry_due(label, BASE, 2)))
+    last = max(a.attempts(label))
+    test("期限内的尝试",   retry_due(label, BASE, last) <= BASE + 120 < retry_due(label, BASE, last + 1), True)
+    test("超过期限放弃",   (a.add(label, last + 1, BASE), tick.LOCKS.marked()), (None, []))
+
+    print("▶ RetryQueue: 迟到补发的触发跳过已过去的尝试")
+    late = BASE + 110
+    due = a.add(label, 1, late)
+    first = min(n for n in a.attempts(label) if retry_due(label, BASE, n) >= late)
+    test("从首个未过时的尝试起", (a.items, due), ({label: first}, retry_due(label, BASE, first)))
+    test("尝试时刻不早于当前", due >= late, True)
+    test("期限内已无尝试则放弃", (a.add(label, 1, BASE + 121), label in a.items, tick.LOCKS.marked()), (None, False, []))
+
+    print("▶ RetryQueue: 成功后占住剩余尝试锁")
+    a.add(label, 1, BASE)
+    a.done(label, 1)
+    rest = [(f"{name}r{n}", label[1]) for n in a.attempts(label)]
+    test("剩余尝试锁已占", [won for won, _ in tick.LOCKS.acquire(rest[1:], BASE).values()], [False] * (len(rest) - 1))
+    test("成功删除标记",   tick.LOCKS.marked(), [])
+    tick.LOCKS.mark(label)
+    a.claim(BASE + 1)
+    test("已结束的不再认领", a.items, {})
+    c = RetryQueue(deadline=120)
+    c.index(sched)
+    c.claim(BASE + 121)
+    test("过期标记被清除", tick.LOCKS.marked(), [])
+    tick.LOCKS = saved
+
+print("▶ RefLocks: 重试标记为 refs/tags/retry/")
+fake = FakeGitHub().start()
+saved = (tick.CLIENT, tick.SHA)
+tick.CLIENT, tick.SHA = GitHubClient(fake.url), "0" * 40
+locks = RefLocks()
+locks.mark(label)
+test("列举标记",       locks.marked(), [label])
+locks.unmark(label)
+test("删除标记",       locks.marked(), [])
+tick.CLIENT, tick.SHA = saved
+fake.stop()
+
+print("▶ execute_task: 可重试失败排入重试, 404 不重试")
+saved = (tick.trigger_workflow, tick.RETRIES, tick.LOCKS, tick.BREAKER)
+tick.RETRIES, tick.BREAKER = RetryQueue(deadline=120), Breaker()
+tick.RETRIES.index(sched)
+label = (name, str(int(tick.TIMER.now()) // 30 + 1))  # 下一个槽: 重试时刻表尚未开始
+with tempfile.TemporaryDirectory() as tmp:
+    tick.LOCKS = SqliteLocks(f"{tmp}/locks.db")
+    tick.trigger_workflow = lambda repo, wf: (False, "502 Bad Gateway")
+    with contextlib.redirect_stdout(io.StringIO()) as out:
+        tick.execute_task("00:00:00", 0, label, "@30s", "o/r", "w.yml", (True, "ok"))
+    test("502 排入重试",   (tick.RETRIES.items, "🔁" in out.getvalue()), ({label: 1}, True))
+    tick.trigger_workflow = lambda repo, wf: (True, "")
+    with contextlib.redirect_stdout(io.StringIO()):
+        tick.execute_task("00:00:00", 0, label, "@30s 🔁1", "o/r", "w.yml", (True, "ok"), None, 1)
+    test("重试成功结束",   (tick.RETRIES.items, tick.LOCKS.marked()), ({}, []))
+    tick.trigger_workflow = lambda repo, wf: (False, "404 Not Found")
+    with contextlib.redirect_stdout(io.StringIO()):
+        tick.execute_task("00:00:00", 0, label, "@30s", "o/r", "w.yml", (True, "ok"))
+    test("404 不重试",     tick.RETRIES.items, {})
+tick.trigger_workflow, tick.RETRIES, tick.LOCKS, tick.BREAKER = saved
+
+# ══════════════════════════════════════════════════
+#  coalesce — 同一轮同目标的触发合并派发
+# ══════════════════════════════════════════════════
+
+print("▶ dispatch_round: COALESCE 合并同一 仓库+工作流")
+cron  = [CronEntry("* * * * *", "o/r", "w.yml"), CronEntry("* * * * *", "o/other", "w.yml")]
+secs  = [SecEntry(60, "o/r", "w.yml"), SecEntry(30, "o/r", "x.yml")]
+saved = (tick.trigger_workflow, tick.LOCKS, tick.SHA, tick.COALESCE)
+sent  = []
+NOW   = int(tick.TIMER.now()) // 60 * 60  # 锁按当前时刻判断过期, 用最近的整分钟
+tick.trigger_workflow = lambda repo, wf: sent.append((repo, wf)) or (True, "")
+tick.SHA = "0" * 40
+with tempfile.TemporaryDirectory() as tmp:
+    for coalesce, want in [(False, 4), (True, 3)]:
+        tick.LOCKS, tick.COALESCE, sent[:] = SqliteLocks(f"{tmp}/{coalesce}.db"), coalesce, []
+        sched = Scheduler(cron, secs, NOW)
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            trace, _ = tick.dispatch_round(sched, sched.pop_due(NOW), NOW)
+        test(f"COALESCE={coalesce} 派发次数", len(sent), want)
+        test(f"COALESCE={coalesce} 每个触发都有结果", [(f.won, f.ok, f.done is not None) for f in trace], [(True, True, True)] * 4)
+    test("只派发一次 o/r w.yml", sent.count(("o/r", "w.yml")), 1)
+    test("日志列出被合并的任务", "🔗 #2 @60s" in out.getvalue(), True)
+    test("各自的锁都已占用", [won for won, _ in tick.LOCKS.acquire([sched.label(i, NOW) for i in range(4)], NOW).values()], [False] * 4)
+
+    print("▶ dispatch_round: 未获锁的触发不参与合并")
+    tick.LOCKS, sent[:] = SqliteLocks(f"{tmp}/held.db"), []
+    sched = Scheduler(cron, secs, NOW)
+    tick.LOCKS.acquire([sched.label(0, NOW)], NOW)  # 另一条链已派发 #0
+    with contextlib.redirect_stdout(io.StringIO()):
+        trace, _ = tick.dispatch_round(sched, sched.pop_due(NOW), NOW)
+    test("由 #2 派发",     (sent.count(("o/r", "w.yml")), [f.won for f in trace]), (1, [False, True, True, True]))
+tick.trigger_workflow, tick.LOCKS, tick.SHA, tick.COALESCE = saved
+
 # ══════════════════════════════════════════════════
 #  结果汇总
 # ══════════════════════════════════════════════════
@@ -6,28 +6,69 @@ tick.py — 双链定时器 + Git Ref 原子锁 + crontab 调度
            ├── 原子锁竞争 ──→ 获锁者触发外部 workflow
   tick-b ──┘
 
+  CHAINS=tick-a,tick-b,tick-c 时为 N 链分片: 每个任务按哈希归属一条链,
+  只有归属链竞锁派发, 其心跳过期后由排序中的下一条链接管
+  LEASE=60 时为租约模式: 各链竞争一个租约 ref, 主链不竞锁直接派发, 其余链热备
+
 配置:
   Secret DISPATCH, 每行一条任务, 支持两种格式:
     crontab:  */5 * * * *  owner/repo  check.yml
     秒级:     @30s         owner/repo  poll.yml
 """
-import os, subprocess as sp, sys, time
+import argparse, base64, calendar, heapq, http.client, json, os, queue, sqlite3, subprocess as sp, sys, threading, time, zlib
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from urllib.parse import quote, urlsplit
 
 # ══════════════════════════════════════════════════
 #  环境变量
 # ══════════════════════════════════════════════════
 
-GITHUB_WORKFLOW   = os.environ["GITHUB_WORKFLOW"]      # 自身 workflow: tick-a | tick-b
-GITHUB_REPOSITORY = os.environ["GITHUB_REPOSITORY"]    # 当前仓库: owner/repo
-GITHUB_RUN_ID     = int(os.environ["GITHUB_RUN_ID"])   # 当前 run id, 用于新版本检测
+# 缺省值仅供本地 `tick.py simulate` 使用, Actions 中三者总是存在
+GITHUB_WORKFLOW   = os.environ.get("GITHUB_WORKFLOW", "tick-a")       # 自身 workflow: tick-a | tick-b | ...
+GITHUB_REPOSITORY = os.environ.get("GITHUB_REPOSITORY", "")           # 当前仓库: owner/repo
+GITHUB_RUN_ID     = int(os.environ.get("GITHUB_RUN_ID", "0"))         # 当前 run id, 用于新版本检测
 API  = f"/repos/{GITHUB_REPOSITORY}"                   # GitHub API 前缀
-INTERVAL   = 10                                        # 每轮间隔 (秒)
-DURATION   = 18000 + (ord(GITHUB_WORKFLOW[-1]) - ord("a")) * 1800  # 运行时长(秒): a=5h b=5.5h
+INTERVAL   = int(os.environ.get("INTERVAL", "60"))     # 运维间隔 (秒): 版本检测 + 清理
+CHAINS     = [c.strip() for c in os.environ.get("CHAINS", "").split(",") if c.strip()]  # N 链分片, 空 = 各链全量竞锁
+CHAIN_NO   = CHAINS.index(GITHUB_WORKFLOW) if GITHUB_WORKFLOW in CHAINS else ord(GITHUB_WORKFLOW[-1]) - ord("a")
+CHAIN_N    = max(2, len(CHAINS), CHAIN_NO + 1)
+DURATION   = int(os.environ.get("DURATION") or 18000 + CHAIN_NO * 3600 // CHAIN_N)  # 运行时长(秒): 5h 起错开续期, 双链 a=5h b=5.5h
 DEBUG      = os.environ.get("DEBUG", "") == "1"      # 调试模式: 显示详细错误信息
 TZ_OFFSET  = int(os.environ.get("TZ_OFFSET", "0"))   # 日志时区偏移 (小时): 8 = UTC+8
+API_URL    = os.environ.get("GITHUB_API_URL", "https://api.github.com")  # REST 根地址
+API_MODE   = os.environ.get("API_MODE", "http")      # http: 进程内长连接 | gh: gh CLI 回退
+GH_TOKEN   = os.environ.get("GH_TOKEN", "")          # 本仓库 token (github.token)
+PAT        = os.environ.get("PAT", "")               # 跨仓库触发用 token
+CONCURRENCY   = int(os.environ.get("CONCURRENCY", "8"))       # 每轮并发派发的目标仓库数
+ROUND_TIMEOUT = float(os.environ.get("ROUND_TIMEOUT", "8"))   # 每轮等待派发完成的上限 (秒)
+RATE_RESERVE  = int(os.environ.get("RATE_RESERVE", "200"))    # 为竞锁/触发保留的配额
+TRACE_FILE    = os.environ.get("TRACE_FILE", "")              # 每次触发的延迟 JSON lines, 空 = 不写
+SUMMARY_FILE  = os.environ.get("GITHUB_STEP_SUMMARY", "")     # 延迟直方图表格写入 job summary
+MISFIRE       = os.environ.get("MISFIRE", "once")             # 错过槽的默认补发策略: once | all | skip
+MISFIRE_WINDOW = int(os.environ.get("MISFIRE_WINDOW", "300"))  # 最多回补多久以前的槽 (秒)
+SPREAD        = min(60, int(os.environ.get("SPREAD", "0")))   # 错峰窗口 (秒, ≤ 60): 各任务按哈希相位分散触发, 0 = 关闭
+DISPATCH_PATH = os.environ.get("DISPATCH_PATH", "")           # 热更新来源: 仓库内文件, 空 = 只用 Secret DISPATCH
+                                                               # 须与 tick-*.yml 的 paths-ignore 一致, 否则修改即重启
+STATE_FILE    = os.environ.get("STATE_FILE", "")              # 调度检查点 (由 actions/cache 跨 run 保存), 空 = 不保存
+TIME_SCALE    = float(os.environ.get("TIME_SCALE", "1"))      # 时钟倍速, 仅本地压测 (harness_tick.py) 使用
+TIME_ORIGIN   = float(os.environ.get("TIME_ORIGIN", "0"))     # 倍速起点 (epoch 秒), 多进程共用同一虚拟时钟
+TAKEOVER      = int(os.environ.get("TAKEOVER", "180"))        # N 链分片: 心跳超过该秒数视为失联, 由下一条链接管
+LEASE         = int(os.environ.get("LEASE") or 0)             # 租约模式: 单主派发的租约时长 (秒), 0 = 逐任务竞锁
+LOCK_BACKEND  = os.environ.get("LOCK_BACKEND") or "ref"       # 锁后端: ref = GitHub git ref | sqlite = 本机文件 (同机多链)
+LOCK_DB       = os.environ.get("LOCK_DB") or "/tmp/tick-locks.db"  # sqlite 锁后端的数据库, 各链须指向同一文件
+RETRY_DEADLINE = min(MISFIRE_WINDOW, int(os.environ.get("RETRY_DEADLINE") or 120))  # 派发失败后的重试期限 (秒, ≤ MISFIRE_WINDOW), 0 = 不重试
+COALESCE      = os.environ.get("COALESCE", "") == "1"         # 同一轮内指向同一 仓库+工作流 的多次触发合并为一次派发
 
 # ══════════════════════════════════════════════════
-#  工具 — CLI 包装
+#  工具 — GitHub REST 客户端
+#
+#  默认 http: 进程内 http.client 长连接池, 省去每次 fork gh
+#             的 100+ ms 启动和重新握手 TLS
+#  回退 gh:   API_MODE=gh 时走 `gh api -i`, 返回值格式相同
+#  统一返回 (status, data, headers): data 为解码后的 JSON,
+#  headers 键为小写; 网络错误 status = 0
 # ══════════════════════════════════════════════════
 
 def gh(*args):
@@ -35,9 +76,189 @@ def gh(*args):
     r = sp.run(["gh", *args], capture_output=True, text=True)
     return r.stdout.strip(), r.stderr.strip(), r.returncode
 
-def gh_api(*args):
-    """调用 GitHub API (GET), 返回 stdout"""
-    return gh("api", *args)[0]
+def decode_body(raw):
+    """响应体 → JSON; 空体为 None, 非 JSON 原样返回文本"""
+    if not raw: return None
+    try: return json.loads(raw)
+    except ValueError: return raw.decode() if isinstance(raw, bytes) else raw
+
+# 复用空闲连接时表示其已被服务端关闭的错误 (RemoteDisconnected 为 ConnectionResetError 子类)
+STALE_ERRORS = (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError)
+
+class GitHubClient:
+    """stdlib 长连接池: 复用 TCP + TLS, 线程安全 (每个请求独占一条连接)"""
+
+    def __init__(self, base_url, size=8, timeout=15):
+        url = urlsplit(base_url)
+        self.conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        self.host     = url.netloc
+        self.prefix   = url.path.rstrip("/")  # GHES: https://host/api/v3
+        # GraphQL 端点: api.github.com/graphql | GHES host/api/graphql
+        self.graphql  = (self.prefix[:-3] if self.prefix.endswith("/v3") else self.prefix) + "/graphql"
+        self.size     = size
+        self.timeout  = timeout
+        self.idle     = queue.LifoQueue()      # 空闲连接, 后进先出以优先复用热连接
+
+    def request(self, method, path, body=None, token=None, headers=None):
+        """发送请求, 返回 (status, data, headers)"""
+        hdrs = {"Accept": "application/vnd.github+json", "User-Agent": "tick",
+                "X-GitHub-Api-Version": "2022-11-28", **(headers or {})}
+        if token: hdrs["Authorization"] = f"Bearer {token}"
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            hdrs["Content-Type"] = "application/json"
+        url = self.graphql if path == "graphql" else self.prefix + "/" + path.lstrip("/")
+        while True:
+            try: conn, reused = self.idle.get_nowait(), True
+            except queue.Empty: conn, reused = self.conn_cls(self.host, timeout=self.timeout), False
+            try:
+                conn.request(method, url, payload, hdrs)
+                r = conn.getresponse()
+            except STALE_ERRORS:
+                conn.close()
+                if reused: continue  # 空闲连接已被服务端关闭, 未收到任何响应字节 = 请求未被处理, 换一条重试
+                return 0, None, {}
+            except (OSError, http.client.HTTPException):
+                conn.close()  # 超时等: 请求可能已生效, 重发会重复派发 / 把已获的锁误判为 422, 交给调用方
+                return 0, None, {}
+            try: raw = r.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                return 0, None, {}
+            if r.will_close or self.idle.qsize() >= self.size: conn.close()
+            else: self.idle.put(conn)
+            return r.status, decode_body(raw), {k.lower(): v for k, v in r.getheaders()}
+
+def parse_http_dump(text):
+    """解析 `gh api -i` 输出: 状态行 + 响应头 + 空行 + 响应体"""
+    head, _, body = text.replace("\r\n", "\n").partition("\n\n")
+    lines = head.splitlines()
+    if not lines or not lines[0].startswith("HTTP/"): return 0, None, {}
+    headers = {}
+    for line in lines[1:]:
+        k, _, v = line.partition(":")
+        headers[k.strip().lower()] = v.strip()
+    return int(lines[0].split()[1]), decode_body(body.strip()), headers
+
+def gh_request(method, path, body=None, token=None, headers=None):
+    """API_MODE=gh 回退: 通过 `gh api -i` 发送请求, 返回值同 GitHubClient.request"""
+    args = ["gh", "api", "-i", "-X", method, path]
+    for k, v in (headers or {}).items():
+        args += ["-H", f"{k}: {v}"]
+    if body is not None: args += ["--input", "-"]
+    r = sp.run(args, input=None if body is None else json.dumps(body),
+               capture_output=True, text=True, env={**os.environ, "GH_TOKEN": token or ""})
+    return parse_http_dump(r.stdout)
+
+class ETagCache:
+    """
+    GET 条件请求缓存: 按 (token, url) 保存 ETag + 响应体
+    下次请求带 If-None-Match, 未变化时 GitHub 返回 304 (不计入主配额), 直接复用缓存体
+    """
+    def __init__(self):
+        self.entries = {}  # {(token, url): (etag, data)}
+        self.hits    = 0   # 304 命中
+        self.misses  = 0   # 200 重新下载
+        self.lock    = threading.Lock()
+
+    def conditional(self, key, headers):
+        """附加 If-None-Match 请求头"""
+        cached = self.entries.get(key)
+        return {**(headers or {}), "If-None-Match": cached[0]} if cached else headers
+
+    def resolve(self, key, status, data, headers):
+        """304 → 缓存体 (状态码按 200 返回); 200 → 更新缓存"""
+        with self.lock:
+            if status == 304 and key in self.entries:
+                self.hits += 1
+                return 200, self.entries[key][1], headers
+            if status == 200:
+                self.misses += 1
+                if headers.get("etag"): self.entries[key] = (headers["etag"], data)
+        return status, data, headers
+
+    def stats(self):
+        total = self.hits + self.misses
+        return f"etag {self.hits}/{total} hit" if total else "etag -"
+
+class RateBudget:
+    """
+    主配额预算: 由响应头 X-RateLimit-* 按 (token, resource) 更新
+    按本进程的调用速率预测到窗口重置前的消耗:
+      critical (SHA/竞锁/触发) 永远放行, 并预留 RATE_RESERVE
+      maintenance (版本检测/清理) 在预算紧张时先拉长间隔, 不够再跳过
+    """
+    def __init__(self, reserve=RATE_RESERVE, clock=time.time):
+        self.reserve = reserve
+        self.clock   = clock
+        self.started = clock()
+        self.windows = {}                 # {(who, resource): (limit, remaining, reset)}
+        self.calls   = defaultdict(int)   # {(who, resource, critical): 计费调用数}
+        self.lock    = threading.Lock()
+
+    def observe(self, who, headers, critical):
+        """记录一次响应; 304 不计费, 不计入调用数"""
+        if "x-ratelimit-remaining" not in headers: return
+        key = (who, headers.get("x-ratelimit-resource", "core"))
+        with self.lock:
+            self.windows[key] = (int(headers.get("x-ratelimit-limit", 0)),
+                                 int(headers["x-ratelimit-remaining"]),
+                                 int(headers.get("x-ratelimit-reset", 0)))
+            if headers.get("status") != "304":
+                self.calls[(*key, critical)] += 1
+
+    def forecast(self, key=("gh", "core")):
+        """(剩余, 距重置秒数, 预测 critical 消耗, 预测 maintenance 消耗); 无数据返回 None"""
+        if key not in self.windows: return None
+        _, remaining, reset = self.windows[key]
+        now  = self.clock()
+        left = max(0, reset - now)
+        rate = left / max(60, now - self.started)  # 已观测调用数 → 剩余窗口的消耗
+        return remaining, left, self.calls[(*key, True)] * rate, self.calls[(*key, False)] * rate
+
+    def stretch(self, key=("gh", "core")):
+        """运维间隔倍数: 1 = 正常, > 1 = 拉长, inf = 本窗口内跳过"""
+        f = self.forecast(key)
+        if f is None: return 1.0
+        remaining, _, critical, maintenance = f
+        headroom = remaining - self.reserve - critical
+        if headroom <= 0: return float("inf")
+        return max(1.0, maintenance / headroom)
+
+    def summary(self):
+        """每轮日志: 各窗口剩余/上限 + 重置倒计时 + 运维倍数"""
+        now   = self.clock()
+        parts = [f"{who}:{res} {rem}/{lim} ↻{max(0, reset - now) // 60:.0f}m"
+                 for (who, res), (lim, rem, reset) in sorted(self.windows.items())]
+        s = self.stretch()
+        parts.append("maint skip" if s == float("inf") else f"maint x{s:.1f}")
+        return " | ".join(parts)
+
+CLIENT = GitHubClient(API_URL, size=CONCURRENCY)
+ETAG   = ETagCache()
+BUDGET = RateBudget()
+
+def api(method, path, body=None, token=GH_TOKEN, headers=None, critical=False):
+    """
+    调用 GitHub API, 返回 (status, data, headers)
+    GET 自动走 ETag 条件请求; critical 标记竞锁/触发路径, 供 RateBudget 区分
+    """
+    send = gh_request if API_MODE == "gh" else CLIENT.request
+    who  = "pat" if token == PAT and PAT != GH_TOKEN else "gh"
+    if method != "GET":
+        status, data, headers = send(method, path, body, token, headers)
+        BUDGET.observe(who, headers, critical)
+        return status, data, headers
+    key = (token, path)
+    status, data, headers = send(method, path, body, token, ETAG.conditional(key, headers))
+    BUDGET.observe(who, {**headers, "status": str(status)}, critical)
+    return ETAG.resolve(key, status, data, headers)
+
+def gh_api(path, critical=False):
+    """调用 GitHub API (GET), 返回解码后的 JSON, 非 2xx 返回 None"""
+    status, data, _ = api("GET", path, critical=critical)
+    return data if 200 <= status < 300 else None
 
 def is_expired(lock_tag, now_epoch, now_minute):
     """
@@ -65,33 +286,211 @@ def is_expired(lock_tag, now_epoch, now_minute):
 #        GitHub 保证只有一个 201, 另一个 422
 #        201 = 获锁 → 执行调度
 #        422 = 锁已存在 → 跳过
+#
+#  路径: refs/tags/lock/{小时桶}/{name}-{slot}
+#        小时桶 = 计划时刻的 UTC 小时 (YYYYMMDDHH), 两条链计算结果相同
 # ══════════════════════════════════════════════════
 
-SHA = None  # 缓存 main 分支 SHA, 每轮刷新一次
+def lock_time(name, slot):
+    """锁标签对应的计划时刻 (epoch): cron 槽为 12 位分钟, sec 槽为 epoch//N"""
+    if len(slot) == 12:
+        return calendar.timegm(time.strptime(slot, "%Y%m%d%H%M"))
+    return int(slot) * int(name[1:].split("x")[0])
+
+def lock_expiry(name, slot):
+    """
+    锁过期时刻: is_expired 的时限 (cron 过了该分钟, sec 超过 5 分钟) 再加 MISFIRE_WINDOW
+    补发窗口内锁必须仍在, 否则迟到的一条链会再次获锁
+    """
+    at = lock_time(name, slot)
+    return (at + 60 if len(slot) == 12 else at + 300) + MISFIRE_WINDOW
+
+def lock_ref(name, slot):
+    """锁 ref 完整路径, 按计划时刻分小时桶"""
+    bucket = time.strftime("%Y%m%d%H", time.gmtime(lock_time(name, slot)))
+    return f"refs/tags/lock/{bucket}/{name}-{slot}"
+
+OWNED      = []  # 本链创建的锁: [(过期时刻, ref)] 小顶堆, 清理时只看这里
+OWNED_LOCK = threading.Lock()
+
+def track_lock(name, slot):
+    """记录本链获得的锁, 到期后由 clean_locks 删除"""
+    with OWNED_LOCK:
+        heapq.heappush(OWNED, (lock_expiry(name, slot), lock_ref(name, slot)))
+
+SHA = None  # 缓存 main 分支 SHA, 由运维线程定期刷新
 
 def refresh_sha():
     """刷新 main 分支 SHA 缓存"""
     global SHA
-    SHA = gh_api(f"{API}/git/ref/heads/main", "-q", ".object.sha")
+    data = gh_api(f"{API}/git/ref/heads/main", critical=True)
+    SHA = data["object"]["sha"] if isinstance(data, dict) else None
 
 def acquire_lock(name, slot):
     """
-    尝试创建 refs/tags/lock/{name}-{slot}
+    尝试创建 refs/tags/lock/{bucket}/{name}-{slot}
     返回 (是否获锁, 原因)
     """
     if not SHA: return False, "no-sha"
-    _, err, rc = gh("api", f"{API}/git/refs",
-                    "-f", f"ref=refs/tags/lock/{name}-{slot}",
-                    "-f", f"sha={SHA}")
-    if rc == 0:
+    status, data, _ = api("POST", f"{API}/git/refs", {"ref": lock_ref(name, slot), "sha": SHA},
+                          critical=True)
+    if status == 201:
+        track_lock(name, slot)
         return True, "ok"
-    # 注意: err 可能含仓库名, 仅 DEBUG 模式才暴露
-    return False, err if DEBUG else "exists"
+    # 注意: 错误信息可能含仓库名, 仅 DEBUG 模式才暴露
+    if DEBUG: return False, f"{status} {data}"
+    return False, "exists" if status == 422 else f"http-{status}"
+
+LOCK_BATCH = 50  # 单次 GraphQL 请求最多创建的锁数量
+REPO_ID    = None  # 本仓库 GraphQL node id, 首次批量加锁时查询
+
+def build_lock_mutation(labels):
+    """本轮所有锁 → 一个带别名的 createRef mutation: l0, l1, ... 与 labels 一一对应"""
+    fields = "\n".join(
+        f'  l{i}: createRef(input: {{repositoryId: $repo, oid: $oid, '
+        f'name: {json.dumps(lock_ref(name, slot))}}}) {{ ref {{ id }} }}'
+        for i, (name, slot) in enumerate(labels))
+    return f"mutation($repo: ID!, $oid: GitObjectID!) {{\n{fields}\n}}"
+
+def parse_lock_result(labels, status, body):
+    """
+    GraphQL 响应 → {label: (是否获锁, 原因)}
+    每个别名独立成败: 有 ref = 201 获锁, "already exists" = 422 已存在
+    """
+    body   = body if isinstance(body, dict) else {}
+    data   = body.get("data") or {}
+    errors = {e["path"][0]: e.get("message", "") for e in body.get("errors") or [] if e.get("path")}
+    result = {}
+    for i, label in enumerate(labels):
+        alias = f"l{i}"
+        if (data.get(alias) or {}).get("ref"):
+            result[label] = (True, "ok")
+        elif DEBUG:
+            result[label] = (False, f"{status} {errors.get(alias) or body}")
+        elif "already exists" in errors.get(alias, ""):
+            result[label] = (False, "exists")
+        else:
+            result[label] = (False, f"http-{status}" if status != 200 else "graphql-error")
+    return result
+
+def acquire_locks(labels):
+    """
+    批量竞锁: 每 LOCK_BATCH 个锁一次 GraphQL 请求, N 个锁从 N 次往返降到 1 次
+    返回 {label: (是否获锁, 原因)}, 单个锁的成败语义同 acquire_lock
+    """
+    global REPO_ID
+    if not SHA: return {label: (False, "no-sha") for label in labels}
+    if labels and not REPO_ID:
+        REPO_ID = (gh_api(API, critical=True) or {}).get("node_id")
+    if not REPO_ID:  # node id 查询失败, 退回逐个 REST
+        return {label: acquire_lock(*label) for label in labels}
+    result = {}
+    for i in range(0, len(labels), LOCK_BATCH):
+        batch = labels[i:i + LOCK_BATCH]
+        status, body, _ = api("POST", "graphql", {"query": build_lock_mutation(batch),
+                                                  "variables": {"repo": REPO_ID, "oid": SHA}},
+                                 critical=True)
+        result.update(parse_lock_result(batch, status, body))
+    for label, (won, _) in result.items():
+        if won: track_lock(*label)
+    return result
 
 def sanitize_key(key):
     """将 cron 表达式转为合法的 ref 名称: 非字母数字替换为 x"""
     return "".join(c if c.isalnum() else "x" for c in key)
 
+# ══════════════════════════════════════════════════
+#  锁后端 — ref (默认) | sqlite (同机多链)
+#
+#  两种后端接口相同: acquire(labels) → {label: (是否获锁, 原因)}, clean(quota),
+#  以及两条链共享的重试标记 mark / unmark / marked (见 重试)
+#  LOCK_BACKEND=sqlite: 各链跑在同一台自托管 runner 上时, 锁放在本机 LOCK_DB,
+#    同名锁 INSERT OR IGNORE 只有一个写入成功 = 先写者胜, 与 ref 的 201 / 422 相同;
+#    过期时刻同 lock_expiry, 过期的行不再阻挡竞锁, 由 clean 删除;
+#    BEGIN IMMEDIATE 跨进程串行化一轮的全部锁, 微秒级完成, 不消耗 API 配额
+# ══════════════════════════════════════════════════
+
+RETRY_PREFIX = "tags/retry/"  # 重试标记 ref 前缀 (refs/ 之后)
+
+class RefLocks:
+    """GitHub git ref 锁, 见上; 重试标记为 refs/tags/retry/{name}-{slot}"""
+
+    def acquire(self, labels):
+        return acquire_locks(labels)
+
+    def mark(self, label):
+        api("POST", f"{API}/git/refs", {"ref": f"refs/{RETRY_PREFIX}{label[0]}-{label[1]}", "sha": SHA},
+            critical=True)
+
+    def unmark(self, label):
+        delete_refs([f"refs/{RETRY_PREFIX}{label[0]}-{label[1]}"])
+
+    def marked(self):
+        refs = gh_api(f"{API}/git/matching-refs/{RETRY_PREFIX}")
+        if not isinstance(refs, list): return []
+        return [tuple(r["ref"][len("refs/" + RETRY_PREFIX):].rsplit("-", 1)) for r in refs]
+
+    def clean(self, quota=True):
+        """删除本链的过期锁 + 整桶清扫; quota=False (配额告急) 时只做 git push 删除"""
+        if quota:
+            clean_locks()
+            sweep_locks()
+        elif LOCK_GC == "git":
+            clean_locks()
+
+class SqliteLocks:
+    """本机 SQLite 锁: 多进程共享同一文件 (WAL), 进程内单连接 + 线程锁, 派发线程池共用"""
+
+    def __init__(self, path=LOCK_DB):
+        self.db   = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("CREATE TABLE IF NOT EXISTS locks "
+                            "(name TEXT PRIMARY KEY, expiry INTEGER NOT NULL, owner TEXT)")
+            self.db.execute("CREATE TABLE IF NOT EXISTS retries (name TEXT, slot TEXT, PRIMARY KEY (name, slot))")
+
+    def acquire(self, labels, now=None):
+        now    = int(TIMER.now()) if now is None else now
+        result = {}
+        with self.lock:
+            try:
+                self.db.execute("BEGIN IMMEDIATE")
+                for name, slot in labels:
+                    key = f"{name}-{slot}"
+                    self.db.execute("DELETE FROM locks WHERE name = ? AND expiry <= ?", (key, now))
+                    cur = self.db.execute("INSERT OR IGNORE INTO locks VALUES (?, ?, ?)",
+                                          (key, lock_expiry(name, slot), GITHUB_WORKFLOW))
+                    result[(name, slot)] = (True, "ok") if cur.rowcount == 1 else (False, "exists")
+                self.db.execute("COMMIT")
+            except sqlite3.Error as e:
+                if self.db.in_transaction: self.db.execute("ROLLBACK")
+                return {label: (False, f"sqlite {e}" if DEBUG else "sqlite-error") for label in labels}
+        return result
+
+    def mark(self, label):
+        with self.lock:
+            self.db.execute("INSERT OR IGNORE INTO retries VALUES (?, ?)", label)
+
+    def unmark(self, label):
+        with self.lock:
+            self.db.execute("DELETE FROM retries WHERE name = ? AND slot = ?", label)
+
+    def marked(self):
+        with self.lock:
+            return self.db.execute("SELECT name, slot FROM retries").fetchall()
+
+    def clean(self, quota=True, now=None):
+        """
+        删除全部过期锁 (不论哪条链创建), 本地操作与配额无关
+        心跳 / 租约等仍走 ref 的记录在 OWNED 中, 与 ref 后端相同地到期删除
+        """
+        with self.lock:
+            self.db.execute("DELETE FROM locks WHERE expiry <= ?", (int(TIMER.now()) if now is None else now,))
+        if quota or LOCK_GC == "git": clean_locks()
+
+LOCKS = SqliteLocks() if LOCK_BACKEND == "sqlite" else RefLocks()
+
 # ══════════════════════════════════════════════════
 #  解析 — crontab 5 字段 + 秒级语法
 #
@@ -104,6 +503,8 @@ def sanitize_key(key):
 #    3      精确匹配
 #    1,15   多个值
 #    1-5    范围
+#    1-30/5 范围内步进 (10/15 = 10 起到上限每 15)
+#    月 jan-dec, 周 sun-sat 可用英文缩写 (不区分大小写)
 #
 #  秒级语法 (@Ns + 仓库 + 工作流):
 #    @30s   每 30 秒
@@ -116,53 +517,294 @@ def sanitize_key(key):
 #    @30s          owner/repo  poll.yml      每 30 秒
 # ══════════════════════════════════════════════════
 
+#  分/时 从 0 开始, 日/月 从 1 开始, 周 从 0 开始
+FIELD_MIN = [0, 0, 1, 1, 0]
+FIELD_MAX = [59, 23, 31, 12, 6]
+MONTH_NAMES = {n: i for i, n in enumerate("jan feb mar apr may jun jul aug sep oct nov dec".split(), 1)}
+WDAY_NAMES  = {n: i for i, n in enumerate("sun mon tue wed thu fri sat".split())}
+FIELD_NAMES = [None, None, None, MONTH_NAMES, WDAY_NAMES]
+
+def compile_field(expr, field_min=0, field_max=63, names=None):
+    """
+    将单个 cron 字段编译为位掩码: 第 v 位为 1 表示值 v 匹配
+    逗号分隔的每一项: * | 值 | 起-止, 均可带 /步进; names 为该字段的英文缩写表
+    非法字段 (非数字 / 越界 / 步进为 0) 抛出 ValueError
+    """
+    names = names or {}
+    value = lambda tok: names[tok.lower()] if tok.lower() in names else int(tok)
+    mask = 0
+    for part in expr.split(","):
+        rng, slash, step = part.partition("/")
+        step = int(step) if slash else 1
+        if step <= 0: raise ValueError(expr)
+        if rng == "*":
+            lo, hi = field_min, field_max
+        else:
+            lo, dash, hi = rng.partition("-")
+            lo = value(lo)
+            hi = value(hi) if dash else (field_max if slash else lo)  # "10/15" = 10 起到上限
+        if not field_min <= lo <= hi <= field_max: raise ValueError(expr)
+        if step == 1:
+            mask |= (1 << hi + 1) - (1 << lo)
+        else:
+            mask |= sum(1 << v for v in range(lo, hi + 1, step))
+    return mask
+
 def match_field(expr, value, field_min=0):
     """单个 cron 字段是否匹配当前值"""
-    if expr == "*": return True
-    if expr.startswith("*/"): return (value - field_min) % int(expr[2:]) == 0
-    # 支持逗号和范围的组合: "1,3-5,10"
-    for part in expr.split(","):
-        if "-" in part:
-            lo, hi = part.split("-", 1)
-            if int(lo) <= value <= int(hi): return True
-        elif value == int(part): return True
-    return False
+    return bool(compile_field(expr, field_min) >> value & 1)
 
-#  分/时 从 0 开始, 日/月 从 1 开始, 周 从 0 开始
-FIELD_MIN = [0, 0, 1, 1, 0]
+def compile_cron(fields):
+    """5 字段 → 5 个位掩码 (分 60 位, 时 24 位, 日 31 位, 月 12 位, 周 7 位)"""
+    if len(fields) != 5: raise ValueError(fields)
+    return tuple(compile_field(f, lo, hi, names)
+                 for f, lo, hi, names in zip(fields, FIELD_MIN, FIELD_MAX, FIELD_NAMES))
+
+def match_masks(masks, now):
+    """已编译的 5 个位掩码是否匹配当前时间: 5 次位测试"""
+    m_min, m_hour, m_mday, m_mon, m_wday = masks
+    #                                        Python wday 0=Mon → cron 0=Sun
+    return bool(m_min >> now.tm_min & m_hour >> now.tm_hour & m_mday >> now.tm_mday
+                & m_mon >> now.tm_mon & m_wday >> (now.tm_wday + 1) % 7 & 1)
+
+def next_bit(mask, value):
+    """mask 中 >= value 的最低置位, 没有则返回 None"""
+    rest = mask >> value
+    return value + (rest & -rest).bit_length() - 1 if rest else None
+
+def next_match(masks, epoch, years=30):
+    """
+    >= epoch 的第一个匹配分钟 (epoch 秒), 逐字段跳跃而非逐分钟步进:
+    月不匹配跳到下月, 日/周不匹配跳到次日, 时/分取下一个置位
+    years 年内无解 (如 2 月 31 日) 返回 None
+    """
+    m_min, m_hour, m_mday, m_mon, m_wday = masks
+    epoch = -(-epoch // 60) * 60  # 向上取整到分钟
+    tm = time.gmtime(epoch)
+    y, mo, d, h, mi = tm.tm_year, tm.tm_mon, tm.tm_mday, tm.tm_hour, tm.tm_min
+    last_year = y + years
+    while y <= last_year:
+        if not m_mon >> mo & 1 or d > calendar.monthrange(y, mo)[1]:
+            mo, d, h, mi = mo + 1, 1, 0, 0
+            if mo > 12: y, mo = y + 1, 1
+            continue
+        if not (m_mday >> d & 1 and m_wday >> (calendar.weekday(y, mo, d) + 1) % 7 & 1):
+            d, h, mi = d + 1, 0, 0
+            continue
+        hour = next_bit(m_hour, h)
+        if hour is None:
+            d, h, mi = d + 1, 0, 0
+            continue
+        if hour != h: h, mi = hour, 0
+        minute = next_bit(m_min, mi)
+        if minute is None:
+            h, mi = h + 1, 0
+            continue
+        return calendar.timegm((y, mo, d, h, minute, 0))
+    return None
 
 def match_cron(fields, now):
     """5 字段 cron 表达式是否匹配当前时间"""
     # fields: [分, 时, 日, 月, 周]
     # now: time.struct_time (gmtime)
-    vals = [now.tm_min, now.tm_hour, now.tm_mday, now.tm_mon, (now.tm_wday + 1) % 7]
-    #                                                          ^^ Python wday 0=Mon → cron 0=Sun
-    return all(match_field(f, v, o) for f, v, o in zip(fields, vals, FIELD_MIN))
+    return match_masks(compile_cron(fields), now)
+
+MISFIRE_POLICIES = ("once", "all", "skip")
+
+def check_misfire(misfire):
+    """校验补发策略, 非法值抛出 ValueError (该行在加载时跳过)"""
+    if misfire not in MISFIRE_POLICIES: raise ValueError(misfire)
+    return misfire
+
+class CronEntry:
+    """crontab 任务: 加载时编译为位掩码, 每分钟匹配仅需位运算"""
+    __slots__ = ("key", "fields", "masks", "repo", "wf", "lock_id", "misfire", "phase")
+
+    def __init__(self, key, repo, wf, misfire=MISFIRE):
+        self.key    = key
+        self.fields = key.split()
+        self.masks  = compile_cron(self.fields)  # 非法字段在此抛出 ValueError
+        self.repo   = repo
+        self.wf     = wf
+        self.lock_id = sanitize_key(key)         # 预计算: 非字母数字统一替换为 x
+        self.misfire = check_misfire(misfire)
+        self.phase   = 0                         # 相对槽起点的触发偏移 (秒), 见 spread_phase
+
+    @property
+    def show(self): return self.key
+
+    def match(self, now):
+        return match_masks(self.masks, now)
+
+    def floor(self, epoch):
+        """epoch 所在时间槽 (分钟) 的起点"""
+        return epoch - epoch % 60
+
+    def next_fire(self, epoch):
+        """>= epoch 的下一个触发时刻, 无解返回 None"""
+        return next_match(self.masks, epoch)
+
+class CronIndex:
+    """
+    倒排字段索引 (struct-of-arrays): 每个字段值 → 匹配它的表达式位图
+    某分钟的到期集合 = 分[min] & 时[hour] & 日[mday] & 月[mon] & 周[wday]
+    5 次大整数 AND, 与任务数无关; 位掩码相同的表达式共享一位
+    """
+    __slots__ = ("tables", "groups")
+
+    def __init__(self, entries):
+        slots = {}
+        self.groups = []  # 第 k 位 → 共享该表达式的任务 idx 列表
+        for idx, entry in enumerate(entries):
+            k = slots.setdefault(entry.masks, len(slots))
+            if k == len(self.groups): self.groups.append([])
+            self.groups[k].append(idx)
+        self.tables = [[0] * (hi + 1) for hi in FIELD_MAX]
+        for masks, k in slots.items():
+            for table, mask in zip(self.tables, masks):
+                for v in range(len(table)):
+                    if mask >> v & 1: table[v] |= 1 << k
+
+    def due(self, now):
+        """now (gmtime) 这一分钟到期的任务 idx, 升序"""
+        m_min, m_hour, m_mday, m_mon, m_wday = self.tables
+        bits = (m_min[now.tm_min] & m_hour[now.tm_hour] & m_mday[now.tm_mday]
+                & m_mon[now.tm_mon] & m_wday[(now.tm_wday + 1) % 7])
+        due = []
+        while bits:
+            low = bits & -bits
+            due += self.groups[low.bit_length() - 1]
+            bits ^= low
+        return sorted(due)
+
+class SecEntry:
+    """秒级任务: 每 n 秒一个时间槽"""
+    __slots__ = ("n", "repo", "wf", "misfire", "phase")
+
+    def __init__(self, n, repo, wf, misfire=MISFIRE):
+        if n <= 0: raise ValueError(n)
+        self.n    = n
+        self.repo = repo
+        self.wf   = wf
+        self.misfire = check_misfire(misfire)
+        self.phase   = 0
 
-def parse_dispatch():
+    @property
+    def show(self): return f"@{self.n}s"
+
+    def floor(self, epoch):
+        """epoch 所在时间槽的起点"""
+        return epoch - epoch % self.n
+
+    def next_fire(self, epoch):
+        """>= epoch 的下一个槽边界"""
+        return -(-epoch // self.n) * self.n
+
+def spread_phase(entry, window):
+    """
+    错峰相位: 任务内容的 crc32 对窗口取模, 两条链算出相同结果
+    秒级任务不超过自身间隔, 触发时刻 = 槽起点 + 相位, 锁标签仍按槽起点
+    """
+    limit = min(window, entry.n) if isinstance(entry, SecEntry) else window
+    if limit <= 1: return 0
+    return zlib.crc32(f"{entry.show} {entry.repo} {entry.wf}".encode()) % limit
+
+def parse_dispatch(text=None, rejected=None):
     """
-    解析 DISPATCH, 返回两个列表:
-      cron_entries: [(key, fields, repo, wf, lock_id), ...]
-      sec_entries:  [(n, repo, wf), ...]
+    解析 DISPATCH (text 缺省取环境变量), 返回两个列表:
+      cron_entries: [CronEntry, ...]
+      sec_entries:  [SecEntry, ...]
+    行尾可带 key=value 选项, 目前支持 misfire=once|all|skip
+    SPREAD > 0 时为每个任务分配错峰相位
+    非法行 (字段数不对 / 字段无法编译 / 间隔 <= 0 / 未知选项) 在加载时跳过,
+    传入 rejected 列表时追加每个跳过的行 (行号, 原文, 原因), 供调用方报告
     """
     cron, sec = [], []
-    for line in os.environ.get("DISPATCH", "").splitlines():
+    if text is None: text = os.environ.get("DISPATCH", "")
+    for lineno, line in enumerate(text.splitlines(), 1):
         line = line.strip()
         if not line or line.startswith("#"):
             continue
         parts = line.split()
-        # @30s owner/repo workflow.yml
-        if len(parts) == 3 and parts[0].startswith("@") and parts[0].endswith("s"):
-            try: sec.append((int(parts[0][1:-1]), parts[1], parts[2]))
-            except ValueError: pass
-        # */5 * * * * owner/repo workflow.yml
-        elif len(parts) == 7:
-            key = " ".join(parts[:5])
-            # 预计算 lock_id: 非字母数字统一替换为 x
-            cron.append((key, parts[:5], parts[5], parts[6], sanitize_key(key)))
+        opts  = dict(p.split("=", 1) for p in parts if "=" in p)
+        parts = [p for p in parts if "=" not in p]
+        reason = None
+        try:
+            misfire = opts.pop("misfire", MISFIRE)
+            if opts:
+                reason = f"未知选项 {', '.join(opts)}"
+            # @30s owner/repo workflow.yml
+            elif len(parts) == 3 and parts[0].startswith("@") and parts[0].endswith("s"):
+                sec.append(SecEntry(int(parts[0][1:-1]), parts[1], parts[2], misfire))
+            # */5 * * * * owner/repo workflow.yml
+            elif len(parts) == 7:
+                cron.append(CronEntry(" ".join(parts[:5]), parts[5], parts[6], misfire))
+            else:
+                reason = f"{len(parts)} 个字段, 应为 5 个 cron 字段或 @Ns, 再加 仓库 工作流"
+        except ValueError as e:
+            reason = f"无效值 {e}"
+        if reason and rejected is not None: rejected.append((lineno, line, reason))
+    for entry in [*cron, *sec]:
+        entry.phase = spread_phase(entry, SPREAD)
     return cron, sec
 
-CRON_ENTRIES, SEC_ENTRIES = parse_dispatch()
+REJECTED = []  # 当前配置中被跳过的行 [(行号, 原文, 原因)], 启动横幅中警告
+CRON_ENTRIES, SEC_ENTRIES = parse_dispatch(rejected=REJECTED)
+
+# ══════════════════════════════════════════════════
+#  时钟 — 单调时钟对齐到任意秒级边界
+#
+#  启动时记录 墙钟 - 单调时钟 的锚点, 计时只用 monotonic_ns,
+#  不受 NTP 调整影响; 每轮重新锚定并记录两者漂移
+#  睡眠分两段: 粗睡到目标前 lead, 再让出 CPU 逼近目标,
+#  lead 按实测的 sleep 超调自适应 → 唤醒误差在毫秒级
+# ══════════════════════════════════════════════════
+
+class Timer:
+    """
+    单调时钟锚定墙钟, 对齐任意 epoch 边界并记录每次唤醒的迟到量
+    scale != 1 时为虚拟时钟: origin 之后每真实 1 秒推进 scale 秒 (本地压测)
+    """
+
+    def __init__(self, lead=0.002, scale=TIME_SCALE, origin=TIME_ORIGIN):
+        self.anchor = time.time_ns() - time.monotonic_ns()
+        self.lead   = lead   # 提前醒来的余量 (真实秒)
+        self.drift  = 0.0    # 最近一次重新锚定时墙钟相对单调时钟的漂移 (秒)
+        self.late   = 0.0    # 最近一次唤醒的迟到量 (秒)
+        self.scale  = scale
+        self.origin = origin or time.time()
+
+    def now(self):
+        """当前 epoch (秒, 浮点), 由单调时钟推算"""
+        real = (time.monotonic_ns() + self.anchor) / 1e9
+        return real if self.scale == 1 else self.origin + (real - self.origin) * self.scale
+
+    def resync(self):
+        """重新锚定到墙钟, 返回累计漂移 (秒)"""
+        anchor = time.time_ns() - time.monotonic_ns()
+        self.drift  = (anchor - self.anchor) / 1e9
+        self.anchor = anchor
+        return self.drift
+
+    def sleep_until(self, target, stop=None):
+        """睡到 target (epoch 秒), 返回迟到量; stop (Event) 被设置时提前返回"""
+        while True:
+            remaining = (target - self.now()) / self.scale
+            if remaining <= 0: break
+            if remaining <= self.lead:
+                time.sleep(0)  # 最后 lead 以内只让出 CPU
+                continue
+            want = remaining - self.lead
+            t0 = time.monotonic_ns()
+            if stop is not None and stop.wait(want): return 0.0
+            if stop is None: time.sleep(want)
+            # 超调 = 实际睡眠 - 期望睡眠, lead 取其两倍的滑动平均
+            overshoot = (time.monotonic_ns() - t0) / 1e9 - want
+            self.lead = min(0.05, max(0.001, 0.8 * self.lead + 0.4 * overshoot))
+        self.late = self.now() - target
+        return self.late
+
+TIMER = Timer()
 
 # ══════════════════════════════════════════════════
 #  调度 — 竞锁 + 触发 + 日志
@@ -170,140 +812,1271 @@ CRON_ENTRIES, SEC_ENTRIES = parse_dispatch()
 
 BAR = "═" * 50
 
-PAT_ENV = {**os.environ, "GH_TOKEN": os.environ.get("PAT", "")}
+DEFAULT_BRANCH = {}  # 目标仓库默认分支缓存: {repo: branch}
+
+def default_branch(repo):
+    """目标仓库默认分支 (同 `gh workflow run` 不带 --ref 的行为), 每仓库只查一次"""
+    if repo not in DEFAULT_BRANCH:
+        status, data, _ = api("GET", f"/repos/{repo}", token=PAT, critical=True)
+        if status != 200: return "main"  # 查询失败不缓存, 下次再试
+        DEFAULT_BRANCH[repo] = data.get("default_branch") or "main"
+    return DEFAULT_BRANCH[repo]
 
 def trigger_workflow(repo, wf):
     """触发目标 workflow (使用 PAT 跨仓库), 返回 (是否成功, 错误信息)"""
-    r = sp.run(["gh", "workflow", "run", wf, "-R", repo],
-               capture_output=True, text=True, env=PAT_ENV)
-    return r.returncode == 0, r.stderr.strip()
+    status, data, _ = api("POST", f"/repos/{repo}/actions/workflows/{quote(wf, safe='')}/dispatches",
+                          {"ref": default_branch(repo)}, token=PAT, critical=True)
+    if status == 204:
+        return True, ""
+    return False, f"{status} {data.get('message', '') if isinstance(data, dict) else data}"
 
-def scan_round(epoch, last_minute, last_slot, cron_entries, sec_entries, on_fire):
+def scan_round(epoch, last_minute, last_slot, cron_entries, sec_entries, on_fire, index=None):
     """
     纯调度逻辑 (不含 I/O), 返回更新后的 (last_minute, last_slot)
 
     on_fire(idx, show, repo, wf): 当任务需要触发时回调
+    index: 调用方为 cron_entries 建好的 CronIndex (逐分钟调用时只建一次), 缺省逐条匹配
     """
     now = time.gmtime(epoch)
     minute_key = time.strftime('%Y%m%d%H%M', now)
 
-    # cron 任务: 同一分钟内只调度一次
+    # cron 任务: 同一分钟内只调度一次, 有索引时 5 次 AND 得出到期任务
     if minute_key != last_minute:
         last_minute = minute_key
-        for idx, (key, fields, repo, wf, lock_id) in enumerate(cron_entries):
-            if match_cron(fields, now):
-                on_fire(idx, key, repo, wf)
+        due = index.due(now) if index else [idx for idx, entry in enumerate(cron_entries) if entry.match(now)]
+        for idx in due:
+            entry = cron_entries[idx]
+            on_fire(idx, entry.key, entry.repo, entry.wf)
 
     # 秒级任务: epoch // n 作为时间槽, 去重
-    for j, (interval_sec, repo, wf) in enumerate(sec_entries):
-        slot = epoch // interval_sec
+    for j, entry in enumerate(sec_entries):
+        slot = epoch // entry.n
         if last_slot.get(j) == slot:
             continue
         last_slot[j] = slot
-        on_fire(len(cron_entries) + j, f"@{interval_sec}s", repo, wf)
+        on_fire(len(cron_entries) + j, f"@{entry.n}s", entry.repo, entry.wf)
 
     return last_minute, last_slot
 
-def execute_task(time_str, idx, label, show, repo, wf):
-    """竞锁 + 触发 + 日志 (通用)"""
-    won, reason = acquire_lock(*label)
-    elapsed = int(time.time() - start_time)
+def lock_names(entries):
+    """
+    每个任务的锁名: cron 为 sanitized_key + 内容哈希, sec 为 s{N}x + 内容哈希
+    哈希取 (表达式, 仓库, 工作流) 的 crc32, 完全相同的重复行追加 k{序号}
+    """
+    seen, names = defaultdict(int), []
+    for entry in entries:
+        content = f"{entry.show} {entry.repo} {entry.wf}"
+        k, seen[content] = seen[content], seen[content] + 1
+        uid  = f"{zlib.crc32(content.encode()):08x}" + (f"k{k}" if k else "")
+        names.append(f"s{entry.n}x{uid}" if isinstance(entry, SecEntry) else f"{entry.lock_id}{uid}")
+    return names
+
+class Scheduler:
+    """
+    下一触发时间小顶堆: 每轮只弹出到期任务, 主循环可直接睡到 next_due()
+
+    idx 编号与 scan_round 一致: cron 在前, 秒级在后
+    醒来迟了 (上一轮超时等), 错过的槽按任务的 misfire 策略补发, 最多回看 window 秒:
+      skip 只触发当前槽 (同 scan_round) | once 错过多个只补最近一个 | all 逐个补发
+    补发沿用原计划槽的锁标签, 两条链对同一次补发去重
+    fired: 检查点中的 {锁名: 最近触发时刻}, 从其后的槽续接 (含续期空档内错过的槽)
+    堆中存放触发时刻 = 槽起点 + 任务相位 (SPREAD 错峰), 对外返回的仍是槽起点
+    锁名由任务内容决定 (与行号无关), 热更新增删行不影响其他任务的锁, 两条链一致
+    due: 热更新时保留的 {锁名: 堆中触发时刻}, 未变的任务原样续接
+    """
+    def __init__(self, cron_entries, sec_entries, epoch, fired=None, window=MISFIRE_WINDOW, due=None):
+        self.n_cron  = len(cron_entries)
+        self.entries = [*cron_entries, *sec_entries]
+        self.names   = lock_names(self.entries)
+        self.window  = window
+        self.heap    = []
+        self.last    = {}  # {idx: 最近触发的槽起点}
+        for idx, entry in enumerate(self.entries):
+            name = self.names[idx]
+            last = (fired or {}).get(name)
+            if last is not None: self.last[idx] = last
+            if due and name in due:
+                heapq.heappush(self.heap, (due[name], idx))
+            else:
+                self.push(idx, entry.next_fire(epoch - entry.phase if last is None else last + 1))
+
+    def reload(self, cron_entries, sec_entries, epoch):
+        """
+        热更新: 按锁名对比, 未变的任务保留到期时刻与触发记录, 新增的从 epoch 起调度, 删除的出堆
+        返回 (新增, 删除, 保留) 数
+        """
+        due   = {self.names[idx]: at for at, idx in self.heap}
+        fired = {self.names[idx]: at for idx, at in self.last.items()}
+        old   = set(self.names)
+        self.__init__(cron_entries, sec_entries, epoch, fired, self.window, due)
+        kept  = len(old & set(self.names))
+        return len(self.names) - kept, len(old) - kept, kept
+
+    def rewind(self, idxs, since):
+        """
+        把 idxs 拨回触发时刻 >= since 的首个槽重新调度, 下一轮按 misfire 策略补发
+        用于接管失联链 / 旧主链的任务
+        """
+        idxs = set(idxs)
+        if not idxs: return
+        self.heap = [item for item in self.heap if item[1] not in idxs]
+        heapq.heapify(self.heap)
+        for idx in idxs:
+            entry = self.entries[idx]
+            self.push(idx, entry.next_fire(since - entry.phase))
+
+    def push(self, idx, at):
+        """槽 at 入堆, 按其触发时刻排序"""
+        if at is not None:  # 永不匹配的表达式不入堆
+            heapq.heappush(self.heap, (at + self.entries[idx].phase, idx))
+
+    def next_due(self):
+        """最早的到期时刻, 堆空返回 None"""
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, epoch):
+        """弹出 due <= epoch 的任务并重新入堆, 返回按槽时间排序的 [(idx, 槽起点), ...]"""
+        fires = []
+        while self.heap and self.heap[0][0] <= epoch:
+            due, idx = heapq.heappop(self.heap)
+            entry = self.entries[idx]
+            now   = epoch - entry.phase  # 换算到槽时间
+            floor = entry.floor(now) if entry.misfire == "skip" else now - self.window
+            slots, at = [], entry.next_fire(max(due - entry.phase, floor))
+            while at is not None and at <= now:
+                slots.append(at)
+                at = entry.next_fire(at + 1)
+            if entry.misfire != "all": slots = slots[-1:]
+            if slots: self.last[idx] = slots[-1]
+            fires += [(idx, slot) for slot in slots]
+            self.push(idx, at)
+        fires.sort(key=lambda fire: fire[1])
+        return fires
+
+    def name(self, idx):
+        """锁名, 见 lock_names"""
+        return self.names[idx]
+
+    def label(self, idx, at):
+        """锁标签: 锁名 + 时间槽 (cron 为分钟, sec 为 epoch//N)"""
+        if idx < self.n_cron:
+            return self.name(idx), time.strftime('%Y%m%d%H%M', time.gmtime(at))
+        return self.name(idx), str(at // self.entries[idx].n)
+
+# ══════════════════════════════════════════════════
+#  模拟 — 事件驱动快进 (`tick.py simulate`)
+#
+#  直接从一次触发跳到下一次, 不逐秒/逐轮扫描:
+#    时间线: Scheduler 堆, 每次弹出即一次触发
+#    计数:   cron 逐条 next_fire 跳转, 秒级按槽数直接计算
+#  推送新 DISPATCH 前可离线验证一整年的触发情况
+# ══════════════════════════════════════════════════
+
+HORIZON_UNITS = {"h": 3600, "d": 86400, "w": 7 * 86400}  # M / y 按日历月份推进
+
+def add_horizon(start, spec):
+    """start + 时长: 6h / 30d / 2w 按秒, 3M / 1y 按日历月 (月末顺延到目标月最后一天)"""
+    n, unit = int(spec[:-1]), spec[-1]
+    if n <= 0: raise ValueError(spec)
+    if unit in HORIZON_UNITS:
+        return start + n * HORIZON_UNITS[unit]
+    if unit not in "My": raise ValueError(spec)
+    t = time.gmtime(start)
+    months = t.tm_mon - 1 + n * (12 if unit == "y" else 1)
+    year, month = t.tm_year + months // 12, months % 12 + 1
+    day = min(t.tm_mday, calendar.monthrange(year, month)[1])
+    return calendar.timegm((year, month, day, t.tm_hour, t.tm_min, t.tm_sec))
+
+def fire_timeline(cron_entries, sec_entries, start, end):
+    """[start, end) 内的全部触发, 按时间顺序产出 (槽起点, idx)"""
+    sched = Scheduler(cron_entries, sec_entries, start)
+    while sched.next_due() is not None and sched.next_due() < end:
+        for idx, at in sched.pop_due(sched.next_due()):
+            yield at, idx
+
+def count_fires(cron_entries, sec_entries, start, end):
+    """[start, end) 内每个任务的 [次数, 首次, 末次], idx 编号同 Scheduler"""
+    counts = {}
+    for idx, entry in enumerate(cron_entries):
+        count, first, last = 0, None, None
+        at = entry.next_fire(start)
+        while at is not None and at < end:
+            count, last = count + 1, at
+            if first is None: first = at
+            at = entry.next_fire(at + 60)
+        counts[idx] = [count, first, last]
+    for j, entry in enumerate(sec_entries):
+        first = entry.next_fire(start)
+        count = max(0, (end - 1 - first) // entry.n + 1)
+        counts[len(cron_entries) + j] = [count, first if count else None,
+                                         first + (count - 1) * entry.n if count else None]
+    return counts
+
+def run_simulate(argv):
+    """
+    `tick.py simulate` 命令行: 读取 DISPATCH, 输出每任务计数或完整时间线
+    被跳过的行逐一报告到 stderr, 有跳过时返回 1 (推送前校验配置)
+    """
+    parser = argparse.ArgumentParser(prog="tick.py simulate", description="事件驱动快进模拟 DISPATCH")
+    parser.add_argument("--file", help="从文件读取 DISPATCH (- 为标准输入), 缺省取环境变量")
+    parser.add_argument("--start", help="起始时刻 UTC, 如 2026-03-01 或 2026-03-01T08:00, 缺省为当前分钟")
+    parser.add_argument("--for", dest="horizon", default="1w", help="时长: 6h / 30d / 2w / 3M / 1y (默认 1w)")
+    parser.add_argument("--timeline", action="store_true", help="逐次输出触发时间线, 而非每任务计数")
+    parser.add_argument("--limit", type=int, default=0, help="时间线最多输出条数, 0 = 不限")
+    args = parser.parse_args(argv)
+
+    if args.file == "-": text = sys.stdin.read()
+    elif args.file:
+        with open(args.file) as f: text = f.read()
+    else: text = None
+    rejected  = []
+    cron, sec = parse_dispatch(text, rejected)
+    for lineno, line, reason in rejected:
+        print(f"⚠️ 第 {lineno} 行已跳过 ({reason}): {line}", file=sys.stderr)
+    if args.start:
+        fmt = "%Y-%m-%dT%H:%M" if "T" in args.start else "%Y-%m-%d"
+        try:
+            start = calendar.timegm(time.strptime(args.start, fmt))
+        except ValueError:
+            parser.error(f"无效起始时刻: {args.start}")
+    else:
+        start = int(time.time()) // 60 * 60
+    try:
+        end = add_horizon(start, args.horizon)
+    except ValueError:
+        parser.error(f"无效时长: {args.horizon}")
+    entries = [*cron, *sec]
+    stamp = lambda at: time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(at + TZ_OFFSET * 3600))
+    print(f"模拟 {stamp(start)} → {stamp(end)} | {len(cron)} cron + {len(sec)} 秒级"
+          + (f" | 跳过 {len(rejected)} 行" if rejected else ""))
+
+    if args.timeline:
+        for n, (at, idx) in enumerate(fire_timeline(cron, sec, start, end)):
+            if args.limit and n >= args.limit: break
+            entry = entries[idx]
+            print(f"{stamp(at)}  #{idx}  {entry.show}  {entry.repo}  {entry.wf}")
+        return 1 if rejected else 0
+    total = 0
+    for idx, (count, first, last) in count_fires(cron, sec, start, end).items():
+        entry, total = entries[idx], total + count
+        span = f"{stamp(first)} … {stamp(last)}" if count else "从不触发"
+        print(f"#{idx:<4} {count:>9}  {entry.show:<20} {entry.repo} {entry.wf}  {span}")
+    print(f"合计 {total} 次")
+    return 1 if rejected else 0
+
+# ══════════════════════════════════════════════════
+#  并发 — 一轮内的竞锁 + 触发扇出
+#
+#  同一目标仓库的任务串行 (保持 DISPATCH 顺序), 不同仓库并发
+#  整轮最多等待 ROUND_TIMEOUT 秒, 超时的任务留在后台继续
+# ══════════════════════════════════════════════════
+
+POOL = ThreadPoolExecutor(max_workers=CONCURRENCY, thread_name_prefix="fire")
+
+class RepoQueue:
+    """
+    跨轮次保持同仓库顺序: 每个仓库同一时刻最多一组任务在线程池中, 完成后才提交下一组
+    排队等顺序的任务不占工作线程, 卡住的仓库最多拖住一个线程, 其他仓库照常派发
+    """
+
+    def __init__(self):
+        self.pending = {}  # {仓库: deque[(fns, Future)]}, 有键 = 该仓库有一组正在执行
+        self.lock    = threading.Lock()
+
+    def submit(self, pool, repo, fns):
+        """提交一组同仓库任务, 返回全部执行完时完成的 Future"""
+        done = Future()
+        with self.lock:
+            if repo in self.pending:
+                self.pending[repo].append((fns, done))
+                return done
+            self.pending[repo] = deque()
+        pool.submit(self.drain, pool, repo, fns, done)
+        return done
+
+    def drain(self, pool, repo, fns, done):
+        """执行一组任务, 然后把该仓库排队的下一组交给线程池"""
+        try:
+            for fn in fns:
+                fn()
+        except Exception as e:
+            done.set_exception(e)
+        else:
+            done.set_result(None)
+        with self.lock:
+            if not self.pending[repo]:
+                del self.pending[repo]
+                return
+            fns, done = self.pending[repo].popleft()
+        pool.submit(self.drain, pool, repo, fns, done)
+
+REPO_QUEUE = RepoQueue()
+
+def run_round(tasks, pool=None, timeout=None):
+    """
+    tasks: [(repo, fn), ...], 按仓库分组后提交到线程池
+    等待全部完成或超时, 返回未完成的仓库数
+    """
+    groups = {}
+    for repo, fn in tasks:
+        groups.setdefault(repo, []).append(fn)
+    pool = pool or POOL
+    futures = [REPO_QUEUE.submit(pool, repo, fns) for repo, fns in groups.items()]
+    _, pending = wait(futures, ROUND_TIMEOUT if timeout is None else timeout)
+    return len(pending)
+
+def execute_task(time_str, idx, label, show, repo, wf, lock=None, fire=None, attempt=0, merged=()):
+    """
+    竞锁 + 触发 + 日志 (通用); lock 为批量竞锁的 (是否获锁, 原因), 缺省时单独竞锁
+    fire (Fire) 记录锁结果与派发完成时刻; attempt: 第几次重试, 0 = 计划触发
+    可重试的失败 (及目标仓库熔断中) 交给 RETRIES 退避重试
+    merged: 并入本次派发的同目标触发 [(idx, show, Fire)], 共用结果, 不再单独派发
+    """
+    won, reason = lock or LOCKS.acquire([label])[label]
+    if won and LEADER and not LEADER.fence(reason, TIMER.now()): won, reason = False, "fenced"
+    if fire and not lock: fire.lock = TIMER.now()
+    elapsed = int(TIMER.now() - start_time)
     tag = f"{elapsed // 3600}:{elapsed % 3600 // 60:02d} 🕐 {time_str} 🏷️ #{idx} {show}"
+    tag += "".join(f" 🔗 #{i} {s}" for i, s, _ in merged)
+    ok = False
     if won:
-        ok, err = trigger_workflow(repo, wf)
-        status = '✅' if ok else ('❌ ' + err if DEBUG else '❌')
+        ok, err = guarded_trigger(repo, wf)
+        status = '✅' if ok else ('❌ ' + err if DEBUG or err == "circuit-open" else '❌')
         print(f"🎯 {tag} {status}")
+        if not ok and RETRIES.deadline and (err == "circuit-open" or is_retryable(err)):
+            due = RETRIES.add(label, attempt + 1)
+            print(f"🔁 {tag} 第 {RETRIES.items.get(label, attempt + 1)} 次重试 +{max(0, due - TIMER.now()):.0f}s"
+                  if due else f"🗑️ {tag} 超过重试期限, 放弃")
+        elif attempt:
+            RETRIES.done(label, attempt if ok else None)
     else:
         print(f"⏭️ {tag} ❌ {reason}")
+    for fire in [fire, *(f for _, _, f in merged)]:
+        if fire: fire.won, fire.ok, fire.done = won, ok, TIMER.now()
+
+# ══════════════════════════════════════════════════
+#  重试 — 派发失败的退避重试 + 按仓库熔断
+#
+#  可重试: 网络错误 / 5xx / 429 / 403 限流; 404 / 422 (工作流不存在或无 dispatch 触发) 不重试
+#  时刻表: 第 n 次尝试 = 计划时刻 + Σ 退避 (RETRY_BASE 起翻倍, 上限 RETRY_CAP),
+#          抖动取自锁标签哈希, 各链算出同一时刻表; 超过 RETRY_DEADLINE 放弃
+#  两条链都可见: 首次失败在锁后端写重试标记, 另一条链由运维线程列举认领,
+#          每次尝试竞争尝试锁 {name}r{n}-{slot}, 只有一条链执行, 获锁的链崩溃也有人接着重试
+#          成功后占住剩余的尝试锁并删除标记, 迟到的认领不会重复派发
+#  熔断: 同一目标仓库连续 BREAKER_TRIP 次可重试失败后, BREAKER_COOL 秒内不再发请求
+#          (直接排入重试), 到期放行一次试探; 坏掉的目标不会拖住整轮或耗尽配额
+#  注意: 响应丢失 (请求已生效但返回 5xx) 的派发会被重试, 目标可能收到两次
+# ══════════════════════════════════════════════════
+
+RETRY_BASE   = 5   # 首次退避 (秒), 之后每次翻倍
+RETRY_CAP    = 60  # 单次退避上限 (秒)
+BREAKER_TRIP = 3   # 连续失败次数达到后熔断
+BREAKER_COOL = 60  # 熔断时长 (秒)
+
+def is_retryable(err):
+    """trigger_workflow 的错误 ("{status} {message}") 是否值得重试"""
+    head, _, message = err.partition(" ")
+    status = int(head) if head.isdigit() else 0
+    return status in (0, 429) or status >= 500 or (status == 403 and "rate limit" in message.lower())
+
+def retry_due(label, at, attempt):
+    """第 attempt 次尝试的时刻: at + 各次退避之和, 每次退避 × [0.5, 1.5) 的确定性抖动"""
+    delay = 0.0
+    for n in range(1, attempt + 1):
+        jitter = zlib.crc32(f"{label[0]}-{label[1]}#{n}".encode()) % 1000 / 1000
+        delay += min(RETRY_CAP, RETRY_BASE * 2 ** (n - 1)) * (0.5 + jitter)
+    return at + delay
+
+class Breaker:
+    """按目标仓库熔断, 线程安全: 派发线程池共用"""
+
+    def __init__(self, trip=BREAKER_TRIP, cool=BREAKER_COOL):
+        self.trip  = trip
+        self.cool  = cool
+        self.fails = defaultdict(int)  # {仓库: 连续失败次数}
+        self.until = {}                # {仓库: 熔断到期时刻}
+        self.lock  = threading.Lock()
+
+    def allow(self, repo, now):
+        """是否放行; 熔断到期后放行一次试探 (半开), 试探期间其余请求仍拦截"""
+        with self.lock:
+            until = self.until.get(repo)
+            if until is None: return True
+            if now < until: return False
+            self.until[repo] = now + self.cool
+            return True
+
+    def record(self, repo, ok, now):
+        with self.lock:
+            if ok:
+                self.fails.pop(repo, None)
+                self.until.pop(repo, None)
+                return
+            self.fails[repo] += 1
+            if self.fails[repo] >= self.trip: self.until[repo] = now + self.cool
+
+    def open(self, now):
+        with self.lock:
+            return sorted(repo for repo, until in self.until.items() if now < until)
+
+BREAKER = Breaker()
+
+def guarded_trigger(repo, wf):
+    """经熔断器触发: 熔断中不发请求; 成功与可重试的失败计入熔断"""
+    if not BREAKER.allow(repo, TIMER.now()): return False, "circuit-open"
+    ok, err = trigger_workflow(repo, wf)
+    if ok or is_retryable(err): BREAKER.record(repo, ok, TIMER.now())
+    return ok, err
+
+class RetryQueue:
+    """
+    本链待执行的重试: 小顶堆 [(到期时刻, 锁标签, 尝试序号)] + {锁标签: 尝试序号}
+    known: {锁名: (idx, entry)}, 由主循环按当前调度设置 (index), 用于日志与相位
+    wake:  新的重试可能早于主循环的睡眠目标, 加入时打断睡眠
+    """
+
+    def __init__(self, deadline=RETRY_DEADLINE):
+        self.deadline = deadline
+        self.heap     = []
+        self.items    = {}
+        self.closed   = {}  # {锁标签: 期限}: 已成功或放弃, 不再认领
+        self.known    = {}
+        self.wake     = None
+        self.lock     = threading.Lock()
+
+    def index(self, sched):
+        self.known = {name: (idx, entry) for idx, (name, entry) in enumerate(zip(sched.names, sched.entries))}
+
+    def base(self, label):
+        """计划触发时刻 (槽起点 + 相位), 各链相同"""
+        known = self.known.get(label[0])
+        return lock_time(*label) + (known[1].phase if known else 0)
+
+    def attempts(self, label):
+        """期限内的全部尝试序号"""
+        at, n = self.base(label), 1
+        while retry_due(label, at, n) <= at + self.deadline: n += 1
+        return range(1, n)
+
+    def add(self, label, attempt, now=None, mark=True):
+        """
+        安排第 attempt 次之后首个未过时的尝试, 返回其时刻; 期限内已无尝试则放弃 (删除标记) 返回 None
+        迟到补发 (misfire / 接管) 的触发失败时, 时刻表中已过去的尝试直接跳过, 不会连发打到故障目标
+        """
+        if not self.deadline or label[0] not in self.known: return None
+        now = TIMER.now() if now is None else now
+        base = self.base(label)
+        later = [n for n in self.attempts(label) if n >= attempt and retry_due(label, base, n) >= now]
+        if not later:
+            self.done(label)
+            return None
+        if attempt == 1 and mark: LOCKS.mark(label)
+        attempt = later[0]
+        due = retry_due(label, base, attempt)
+        with self.lock:
+            self.items[label] = attempt
+            heapq.heappush(self.heap, (due, label, attempt))
+        if self.wake: self.wake.set()
+        return due
+
+    def done(self, label, attempt=None):
+        """结束重试; attempt 为成功的尝试序号时先占住剩余尝试锁, 防止迟到的认领再派发"""
+        rest = [(f"{label[0]}r{n}", label[1]) for n in self.attempts(label) if attempt and n > attempt]
+        if rest and not LEADER: LOCKS.acquire(rest)
+        with self.lock:
+            self.items.pop(label, None)
+            self.closed[label] = self.base(label) + self.deadline
+        LOCKS.unmark(label)
+
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+
+    def pop_due(self, now):
+        """弹出到期的 [(锁标签, 尝试序号)]"""
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, label, attempt = heapq.heappop(self.heap)
+                if self.items.get(label) == attempt:
+                    del self.items[label]
+                    due.append((label, attempt))
+        return due
+
+    def claim(self, now):
+        """运维线程: 认领其他链留下的重试标记, 过期的直接删除"""
+        with self.lock:
+            self.closed = {label: until for label, until in self.closed.items() if until > now}
+        for label in LOCKS.marked():
+            if label in self.items or label in self.closed: continue
+            if label[0] not in self.known or now > self.base(label) + self.deadline:
+                LOCKS.unmark(label)  # 过期, 或任务已从配置中删除
+                continue
+            if OWNERS and not OWNERS.owns(label[0], now): continue  # 归属链存活, 由它重试
+            self.add(label, 1, now, mark=False)
+
+    def summary(self, now):
+        """📊 行的重试 / 熔断状态, 都为空时返回空串"""
+        parts = [f"retry {len(self.items)}"] if self.items else []
+        opened = BREAKER.open(now)
+        if opened: parts.append(f"熔断 {', '.join(opened)}")
+        return " · ".join(parts)
+
+RETRIES = RetryQueue()
+
+def retry_round(retries, wake):
+    """派发一轮到期重试: 批量竞争尝试锁 → 按仓库并发触发, 返回超时未完成的仓库数"""
+    time_str = time.strftime('%H:%M:%S', time.gmtime(int(wake) + TZ_OFFSET * 3600))
+    retries  = [(label, n) for label, n in retries if label[0] in RETRIES.known]
+    labels   = [(f"{label[0]}r{n}", label[1]) for label, n in retries]
+    locks    = LEADER.locks(labels, wake) if LEADER else LOCKS.acquire(labels)
+    tasks    = []
+    for (label, n), attempt_label in zip(retries, labels):
+        idx, entry = RETRIES.known[label[0]]
+        tasks.append((entry.repo, partial(execute_task, time_str, idx, label, f"{entry.show} 🔁{n}",
+                                          entry.repo, entry.wf, locks[attempt_label], None, n)))
+    return run_round(tasks)
+
+# ══════════════════════════════════════════════════
+#  追踪 — 每次触发的延迟时间线
+#
+#  计划边界 → 唤醒 → SHA 就绪 → 锁结果 → 派发完成
+#  按轮次 / 任务聚合 p50 / p95 / p99 (毫秒, 相对计划边界)
+#  定期写入 $GITHUB_STEP_SUMMARY 表格 + TRACE_FILE JSON lines
+# ══════════════════════════════════════════════════
+
+SUMMARY_INTERVAL = 300  # 写 job summary 的间隔 (秒)
+TRACE_SAMPLES    = 5000 # 每个直方图保留的最近样本数
+
+class Fire:
+    """一次触发的时间线 (epoch 秒)"""
+    __slots__ = ("idx", "show", "boundary", "wake", "sha", "lock", "done", "won", "ok")
+
+    def __init__(self, idx, show, boundary, wake):
+        self.idx, self.show, self.boundary, self.wake = idx, show, boundary, wake
+        self.sha = self.lock = self.done = None
+        self.won = self.ok = False
+
+    def ms(self, stage):
+        """某阶段相对计划边界的延迟 (毫秒), 未到达返回 None"""
+        t = getattr(self, stage)
+        return None if t is None else round((t - self.boundary) * 1000, 1)
+
+def percentiles(values, ps=(50, 95, 99)):
+    """最近秩百分位, 空列表返回 None"""
+    if not values: return [None] * len(ps)
+    ordered = sorted(values)
+    return [ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in ps]
+
+class Tracer:
+    """聚合每次触发的阶段延迟: 每轮最慢一次 + 每个任务 + 全部"""
+    STAGES = ("wake", "sha", "lock", "done")
+
+    def __init__(self, path=TRACE_FILE, summary=SUMMARY_FILE):
+        self.path    = path
+        self.summary = summary
+        self.rounds  = deque(maxlen=TRACE_SAMPLES)   # 每轮最后完成的延迟
+        self.hists   = defaultdict(lambda: {s: deque(maxlen=TRACE_SAMPLES) for s in self.STAGES})
+        self.names   = {}                            # {idx: show}
+        self.count   = defaultdict(int)
+        self.next_summary = 0
+
+    def record(self, fires):
+        """记录一轮的全部触发, 追加 JSON lines"""
+        lines = []
+        for fire in fires:
+            self.names[fire.idx] = fire.show
+            self.count[fire.idx] += 1
+            for stage in self.STAGES:
+                ms = fire.ms(stage)
+                if ms is not None:
+                    self.hists[fire.idx][stage].append(ms)
+                    self.hists["all"][stage].append(ms)
+            lines.append(json.dumps({"chain": GITHUB_WORKFLOW, "idx": fire.idx, "show": fire.show,
+                                     "boundary": fire.boundary, "won": fire.won, "ok": fire.ok,
+                                     **{f"{s}_ms": fire.ms(s) for s in self.STAGES}}))
+        done = [fire.ms("done") for fire in fires if fire.done is not None]
+        if done: self.rounds.append(max(done))
+        if self.path and lines:
+            with open(self.path, "a") as f:
+                f.write("\n".join(lines) + "\n")
+
+    def table(self):
+        """Markdown 表格: 每行 p50/p95/p99 (ms)"""
+        fmt = lambda v: "-" if v is None else f"{v:g}"
+        cell = lambda vals: " / ".join(fmt(v) for v in percentiles(list(vals)))
+        rows = [f"## ⏱️ {GITHUB_WORKFLOW} 触发延迟 (ms, 相对计划边界, p50 / p95 / p99)", "",
+                "| 任务 | 次数 | 唤醒 | SHA | 锁 | 派发完成 |", "|---|---|---|---|---|---|",
+                f"| 每轮最慢 | {len(self.rounds)} | | | | {cell(self.rounds)} |"]
+        for key in ["all", *sorted(self.names)]:
+            h = self.hists[key]
+            name = "全部" if key == "all" else f"#{key} {self.names[key]}"
+            count = sum(self.count.values()) if key == "all" else self.count[key]
+            rows.append(f"| {name} | {count} | " + " | ".join(cell(h[s]) for s in self.STAGES) + " |")
+        return "\n".join(rows) + "\n"
+
+    def flush(self, now, force=False):
+        """每 SUMMARY_INTERVAL 覆盖写一次 job summary (本 step 独占, 不会累积重复表格)"""
+        if not self.summary or (now < self.next_summary and not force): return
+        self.next_summary = now + SUMMARY_INTERVAL
+        with open(self.summary, "w") as f:
+            f.write(self.table())
+
+# ══════════════════════════════════════════════════
+#  轮次 — 一轮派发 (主循环 / 基准测试共用)
+# ══════════════════════════════════════════════════
+
+start_time = time.time()  # 运行起点, 主循环启动时重设; execute_task 日志显示已运行时长
+
+def dispatch_round(sched, fires, wake):
+    """
+    派发一轮到期任务: 批量竞锁 → 按仓库并发触发
+    fires: sched.pop_due() 的结果; wake: 本轮唤醒时刻
+    返回 (Fire 列表, 超时未完成的仓库数)
+    COALESCE: 获锁的触发按 (仓库, 工作流) 合并, 只由第一个派发, 其余记在它名下;
+              各自的锁仍在同一批请求中获取, 另一条链分组不同时也不会重复派发
+    """
+    time_str = time.strftime('%H:%M:%S', time.gmtime(int(wake) + TZ_OFFSET * 3600))
+    trace = [Fire(idx, sched.entries[idx].show, at + sched.entries[idx].phase, wake) for idx, at in fires]
+    if not SHA: refresh_sha()  # SHA 由运维线程定期刷新, 任意有效提交都可作为锁目标
+    sha_ready = TIMER.now()
+    labels = [sched.label(idx, at) for idx, at in fires]
+    locks  = LEADER.locks(labels, sha_ready) if LEADER else LOCKS.acquire(labels)  # 一次请求拿下本轮所有锁
+    locked = TIMER.now()
+    tasks  = []
+    heads  = {}  # {(仓库, 工作流): 并入该目标首个派发的触发}
+    for (idx, at), label, fire in zip(fires, labels, trace):
+        entry = sched.entries[idx]
+        fire.sha, fire.lock = sha_ready, locked
+        merged = []
+        if COALESCE and locks[label][0]:
+            target = (entry.repo, entry.wf)
+            if target in heads:
+                heads[target].append((idx, entry.show, fire))
+                continue
+            heads[target] = merged
+        tasks.append((entry.repo, partial(execute_task, time_str, idx, label, entry.show,
+                                          entry.repo, entry.wf, locks[label], fire, 0, merged)))
+    return trace, run_round(tasks)
+
+# ══════════════════════════════════════════════════
+#  分片 — N 链按哈希分配任务 + 心跳接管
+#
+#  每个任务按 rendezvous 哈希 crc32("{链} {锁名}") 给全部链排序,
+#  排在最前且心跳未过期的链负责竞锁派发, 其余链只推进调度不发请求;
+#  锁仍照常竞争, 接管期间两条链同时派发也不会重复
+#  心跳: 独立线程每 TAKEOVER/3 创建 refs/tags/beat/{链}/{epoch}, 过 TAKEOVER 后删除;
+#        同时列举全部心跳 ref, 每条链只取最新一条. 不随运维节奏或配额拉伸变慢,
+#        否则其他链会误判失联而接管, 竞锁请求反而翻倍
+#  接管: 某链心跳过期时, 它负责的任务顺延给排序中的下一条存活链,
+#        从最后一次心跳起回拨调度, 按各任务 misfire 策略补发 (已派发的槽被锁去重)
+#  退出: 到期续期的链写入 {epoch}-exit 标记并删除自己的心跳, 其他链下次读取心跳即接管,
+#        续期空档由存活链覆盖, 不必等 TAKEOVER
+#  新增一条链只移动约 1/N 的任务, 竞锁请求从每次触发 N 个降到 1 个
+# ══════════════════════════════════════════════════
+
+BEAT_PREFIX = "tags/beat/"  # 心跳 ref 前缀 (refs/ 之后)
+BEAT_KEEP   = 86400         # 崩溃链遗留的心跳超过该秒数由任意链删除
+
+class Owners:
+    """
+    N 链分片的归属判定: beats 由运维线程写入, 主循环只读
+    启动时其他链视为失联 (全量竞锁), 读到心跳后才让出, 不会漏发
+    """
+    __slots__ = ("chains", "me", "stale", "beats", "gone", "ranks", "down")
+
+    def __init__(self, chains, me, stale=TAKEOVER):
+        self.chains = list(chains)
+        self.me     = me
+        self.stale  = stale
+        self.beats  = {}  # {链: 最近心跳 epoch}
+        self.gone   = {}  # {链: 计划退出 epoch}, 晚于最近心跳时立即视为失联
+        self.ranks  = {}  # {锁名: 链排序}
+        self.down   = {chain: None for chain in self.chains if chain != me}  # 已判定失联的链
+
+    def rank(self, name):
+        """锁名对应的链排序, 各链计算结果相同"""
+        order = self.ranks.get(name)
+        if order is None:
+            order = self.ranks[name] = sorted(
+                self.chains, key=lambda chain: zlib.crc32(f"{chain} {name}".encode()), reverse=True)
+        return order
+
+    def alive(self, chain, now):
+        if chain == self.me: return True
+        beat = self.beats.get(chain, float("-inf"))
+        return now - beat <= self.stale and beat > self.gone.get(chain, float("-inf"))
+
+    def owner(self, name, now):
+        """排在最前的存活链"""
+        return next(chain for chain in self.rank(name) if self.alive(chain, now))
+
+    def owns(self, name, now):
+        return self.owner(name, now) == self.me
+
+    def takeovers(self, now):
+        """新失联的链 → {链: 最近心跳}; 恢复心跳的链移出失联集合"""
+        lost = {}
+        for chain in self.chains:
+            if self.alive(chain, now):
+                self.down.pop(chain, None)
+            elif chain not in self.down:
+                self.down[chain] = lost[chain] = max(self.beats.get(chain, 0), self.gone.get(chain, 0)) or None
+        return lost
+
+def heartbeat(owners, now):
+    """写入本链心跳, 读取各链最新心跳, 顺带删除崩溃链遗留的旧心跳"""
+    if SHA:
+        ref = f"refs/{BEAT_PREFIX}{owners.me}/{int(now)}"
+        status, _, _ = api("POST", f"{API}/git/refs", {"ref": ref, "sha": SHA}, critical=True)
+        if status == 201:
+            with OWNED_LOCK:
+                heapq.heappush(OWNED, (int(now) + owners.stale, ref))
+    refs = gh_api(f"{API}/git/matching-refs/{BEAT_PREFIX}")
+    if not isinstance(refs, list): return
+    old = []
+    for r in refs:
+        parts = r["ref"].split("/")  # refs tags beat {链} {epoch}[-exit]
+        if len(parts) != 5: continue
+        epoch, _, mark = parts[4].partition("-")
+        if not epoch.isdigit() or mark not in ("", "exit"): continue
+        chain, at = parts[3], int(epoch)
+        seen = owners.gone if mark else owners.beats
+        if at > seen.get(chain, 0): seen[chain] = at
+        if now - at > BEAT_KEEP: old.append(r["ref"])
+    delete_refs(old)
+
+def release_beats(owners, now):
+    """计划退出: 写入退出标记并删除本链心跳, 其他链下次读取心跳时立即接管, 不必等 TAKEOVER"""
+    if SHA: api("POST", f"{API}/git/refs", {"ref": f"refs/{BEAT_PREFIX}{owners.me}/{int(now)}-exit", "sha": SHA},
+                    critical=True)
+    refs = gh_api(f"{API}/git/matching-refs/{BEAT_PREFIX}{owners.me}/")
+    if isinstance(refs, list): delete_refs([r["ref"] for r in refs if not r["ref"].endswith("-exit")])
+
+class Heartbeat:
+    """心跳线程: 按自身节奏写入 / 读取心跳, 读到的最新心跳最多滞后两个间隔, 小于 TAKEOVER"""
+
+    def __init__(self, owners, interval=None):
+        self.owners   = owners
+        self.interval = interval or owners.stale / 3
+        self.stopped  = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            try: heartbeat(self.owners, TIMER.now())
+            except Exception as e:  # 心跳线程退出 = 本链被其他链接管
+                print(f"⚠️ 心跳异常, 下一轮继续: {type(e).__name__}: {e}")
+            self.stopped.wait(self.interval / TIMER.scale)
+
+    def start(self):
+        threading.Thread(target=self.run, name="heartbeat", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+
+    def release(self, now):
+        """停止心跳并让出本链的任务 (计划退出时调用)"""
+        self.stop()
+        release_beats(self.owners, now)
+
+def take_over(owners, sched, now):
+    """接管新失联链的任务: 从其最后一次心跳起回拨, 返回 {链: 接管任务数}"""
+    taken = {}
+    for chain, since in owners.takeovers(now).items():
+        idxs = [idx for idx, name in enumerate(sched.names) if owners.owns(name, now)
+                and owners.rank(name).index(chain) < owners.rank(name).index(owners.me)]
+        sched.rewind(idxs, int(now - owners.stale if since is None else since))
+        taken[chain] = len(idxs)
+    return taken
+
+OWNERS = Owners(CHAINS, GITHUB_WORKFLOW) if GITHUB_WORKFLOW in CHAINS and not LEASE else None
+
+# ══════════════════════════════════════════════════
+#  租约 — 单主派发, 代替逐任务锁
+#
+#  LEASE > 0 时各链竞争一个可续期的租约 ref (refs/heads/tick-lease):
+#    续期 / 抢占都新建一个以当前租约为父的提交, 提交信息记录
+#    {holder, token, expires, done}, 再以非强制更新 (force: false) 移动 ref;
+#    只有快进才会成功 → CAS: 期间若有人先移动了 ref, 更新返回 422
+#  主链每 LEASE/3 续期, 派发时不再逐任务竞锁, 也不留下待清理的锁 ref
+#  备链每 LEASE/3 读取租约, 过期 (expires + LEASE_SKEW) 后以 token + 1 抢占,
+#  即最迟在一个租约周期内接管, 并从旧主链记录的 done 之后按 misfire 策略补发
+#  隔离 (fencing): 派发前核对本轮的 token 仍是当前 token 且 now < expires - LEASE_SKEW;
+#  续期 CAS 失败立即降级. 旧主链停手与新主链接管之间留有 2 × LEASE_SKEW
+#  代价: 旧主链最后一次续期之后派发的任务, 新主链会再补发一次 (最多 LEASE/3)
+# ══════════════════════════════════════════════════
+
+LEASE_REF  = "heads/tick-lease"  # 租约 ref (refs/ 之后)
+LEASE_SKEW = 2                   # 租约两端的时钟余量 (秒)
+
+class Lease:
+    """
+    租约状态 + 续期线程; 只有 valid() 为真时才可派发
+    me: 持有者标识 (链名#run_id), 同一条链续期前后的两个 run 也互斥
+    takeovers: 抢占成功时放入 (token, 旧主链 done), 由主循环回拨补发
+    """
+
+    def __init__(self, me, ttl=LEASE, wake=None):
+        self.me        = me
+        self.ttl       = ttl
+        self.wake      = wake   # 抢占成功时打断主循环的睡眠
+        self.sha       = None   # 最近看到的租约提交
+        self.tree      = None
+        self.holder    = None
+        self.token     = 0      # 隔离令牌, 每次换主 +1
+        self.expires   = 0
+        self.prev_done = None   # 租约提交中记录的 done
+        self.done      = None   # 本链已派发到的时刻 (主循环写入), 续期时记入租约
+        self.held      = False
+        self.takeovers = queue.SimpleQueue()
+        self.stopped   = threading.Event()
+
+    def valid(self, now):
+        return self.held and now < self.expires - LEASE_SKEW
+
+    def locks(self, labels, now):
+        """代替 acquire_locks: 持有租约则全部获锁, 原因带上 token 供派发前核对, 无任何请求"""
+        result = (True, f"lease-{self.token}") if self.valid(now) else (False, "standby")
+        return {label: result for label in labels}
+
+    def fence(self, reason, now):
+        """派发前隔离检查: 获锁时的 token 仍是当前 token 且租约未到期"""
+        return reason == f"lease-{self.token}" and self.valid(now)
+
+    def read(self):
+        """读取当前租约 (ref 不存在时以 main 提交创建), 失败返回 False"""
+        data = gh_api(f"{API}/git/ref/{LEASE_REF}", critical=True)
+        if data is None and SHA:
+            api("POST", f"{API}/git/refs", {"ref": f"refs/{LEASE_REF}", "sha": SHA}, critical=True)
+            data = gh_api(f"{API}/git/ref/{LEASE_REF}", critical=True)
+        if not isinstance(data, dict): return False
+        sha = data["object"]["sha"]
+        if sha == self.sha: return True
+        commit = gh_api(f"{API}/git/commits/{sha}", critical=True)
+        if not isinstance(commit, dict): return False
+        try:
+            info = json.loads(commit.get("message") or "")
+        except ValueError:
+            info = None
+        info = info if isinstance(info, dict) else {}  # 初始的 main 提交不是租约
+        self.sha, self.tree = sha, commit["tree"]["sha"]
+        self.holder    = info.get("holder")
+        self.token     = int(info.get("token", 0))
+        self.expires   = float(info.get("expires", 0))
+        self.prev_done = info.get("done")
+        return True
+
+    def write(self, token, expires):
+        """CAS: 以 self.sha 为父提交新租约, 非强制更新 ref; 成功返回 True"""
+        if not self.sha: return False
+        message = json.dumps({"holder": self.me, "token": token, "expires": expires, "done": self.done})
+        status, data, _ = api("POST", f"{API}/git/commits",
+                              {"message": message, "tree": self.tree, "parents": [self.sha]}, critical=True)
+        if status != 201 or not isinstance(data, dict): return False
+        status, _, _ = api("PATCH", f"{API}/git/refs/{LEASE_REF}", {"sha": data["sha"], "force": False},
+                           critical=True)
+        if status != 200: return False
+        self.sha, self.holder, self.token, self.expires = data["sha"], self.me, token, expires
+        return True
+
+    def step(self, now):
+        """续期或抢占一次"""
+        was = self.held
+        if self.held and not self.write(self.token, int(now) + self.ttl):
+            self.held = False  # CAS 或网络失败: 先降级, 再按实际租约判断
+        if not self.held and self.read():
+            if self.holder == self.me and now < self.expires - LEASE_SKEW:
+                self.held = True  # 续期已生效但响应丢失, 租约仍属本链
+            elif now > self.expires + LEASE_SKEW:
+                self.done = done = self.prev_done  # 接着旧主链的进度续写
+                if self.write(self.token + 1, int(now) + self.ttl):
+                    self.held = True
+                    self.takeovers.put((self.token, done))
+                    if self.wake: self.wake.set()
+        if was and not self.held:
+            print(f"👑 失去租约 #{self.token}, 转为热备")
+
+    def release(self, now):
+        """退出前把租约改为立即到期, 备链无需等满一个周期"""
+        self.stopped.set()
+        if self.held:
+            self.held = False
+            self.write(self.token, int(now))
+
+    def run(self):
+        while not self.stopped.is_set():
+            try: self.step(TIMER.now())
+            except Exception as e:  # 续期线程退出 = 租约过期被接管
+                print(f"⚠️ 租约异常, 下一轮继续: {type(e).__name__}: {e}")
+            self.stopped.wait(self.ttl / 3 / TIMER.scale)
+
+    def start(self):
+        threading.Thread(target=self.run, name="lease", daemon=True).start()
+        return self
+
+LEADER = None  # 租约模式下的 Lease, 主循环启动时创建
+
+# ══════════════════════════════════════════════════
+#  状态 — 跨 run 的调度检查点
+#
+#  续期后的新 run 从 STATE_FILE 恢复:
+#    触发记录  各任务最近触发的槽, 不重复已触发的槽
+#    待清理锁  上一 run 创建但未过期的锁, 由本 run 到期删除
+#    查询缓存  SHA / 仓库 node id / 默认分支, 首轮无需任何查询请求
+#  每 STATE_INTERVAL 秒及退出时写入 (先写临时文件再替换, 不会留下半截文件)
+# ══════════════════════════════════════════════════
+
+STATE_INTERVAL = 30     # 检查点写入间隔 (秒)
+STATE_MAX_AGE  = 86400  # 更旧的检查点只恢复缓存和锁, 不恢复触发记录
+
+def save_state(path, sched, now):
+    """写入检查点"""
+    with OWNED_LOCK:
+        owned = sorted(OWNED)
+    state = {"saved": int(now), "sha": SHA, "repo_id": REPO_ID, "branches": DEFAULT_BRANCH,
+             "fired": {sched.name(idx): at for idx, at in sched.last.items()}, "owned": owned}
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+def load_state(path, now):
+    """
+    读取检查点, 恢复缓存与待清理锁, 返回 {锁名: 最近触发时刻}
+    文件缺失或损坏时返回 {}, 等同冷启动
+    """
+    global SHA, REPO_ID
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    SHA     = SHA or state.get("sha")
+    REPO_ID = REPO_ID or state.get("repo_id")
+    DEFAULT_BRANCH.update(state.get("branches") or {})
+    with OWNED_LOCK:
+        for expiry, ref in state.get("owned") or []:
+            heapq.heappush(OWNED, (expiry, ref))
+    if now - state.get("saved", 0) > STATE_MAX_AGE:
+        return {}
+    return state.get("fired") or {}
+
+# ══════════════════════════════════════════════════
+#  热更新 — 运行中拉取 DISPATCH_PATH
+#
+#  运维线程每 INTERVAL 用 ETag 条件请求读取仓库内的配置文件,
+#  未变化返回 304 (不计主配额); 内容变化则交给主循环,
+#  由 Scheduler.reload 只增删有变化的任务, 其余任务不受影响
+# ══════════════════════════════════════════════════
+
+RELOAD = queue.SimpleQueue()  # 运维线程 → 主循环: 新的 DISPATCH 文本
+
+def fetch_dispatch():
+    """读取仓库内的 DISPATCH_PATH 文件, 失败返回 None"""
+    data = gh_api(f"{API}/contents/{quote(DISPATCH_PATH)}")
+    if not isinstance(data, dict) or "content" not in data: return None
+    try: return base64.b64decode(data["content"]).decode()
+    except ValueError:  # 非 UTF-8 (UnicodeDecodeError) / 损坏的 base64: 保留当前配置
+        print(f"⚠️ {DISPATCH_PATH} 不是有效的 UTF-8 文本, 忽略")
+        return None
+
+def poll_dispatch(current, wake):
+    """有新内容时放入 RELOAD 并唤醒主循环, 返回当前已知的文本"""
+    text = fetch_dispatch()
+    if text is None or text == current: return current
+    RELOAD.put(text)
+    wake.set()
+    return text
 
 # ══════════════════════════════════════════════════
 #  维护 — 清理 + 守护 + 续期
 # ══════════════════════════════════════════════════
 
+SWEEP_INTERVAL = 3600  # 全量清扫间隔 (秒): 兜底删除崩溃链遗留的锁
+SWEEP_HOURS    = 24    # 全量清扫回看的小时桶数
+SWEPT          = set() # 已清扫过的小时桶
+next_sweep     = 0
+
+LOCK_GC  = os.environ.get("LOCK_GC") or ("git" if os.path.isdir(".git") else "api")  # 锁删除后端
+GC_CHUNK = 500  # 单次 git push 删除的 ref 上限, 避免命令行过长
+
+def push_delete(refs, remote="origin", cwd=None):
+    """
+    git push 一次删除一批 ref, 不消耗 REST 配额
+    先 --atomic; 若因部分 ref 已被对方链删除而整体拒绝, 再非原子重试
+    返回 push 失败 (如无凭据) 需要退回 API 删除的 ref
+    """
+    failed = []
+    for i in range(0, len(refs), GC_CHUNK):
+        chunk = refs[i:i + GC_CHUNK]
+        specs = [f":{ref}" for ref in chunk]
+        for flags in (["--atomic"], []):
+            r = sp.run(["git", "push", "--quiet", "--no-verify", *flags, remote, *specs],
+                       capture_output=True, text=True, cwd=cwd)
+            if r.returncode == 0: break
+        else:
+            # 非原子模式下只剩 "remote ref does not exist" 说明其余都已删除
+            errors = [l for l in r.stderr.splitlines()
+                      if any(k in l for k in ("error", "fatal", "rejected"))
+                      and "does not exist" not in l and "failed to push some refs" not in l]
+            if errors: failed += chunk
+    return failed
+
+def delete_refs(refs):
+    """删除一批 ref: 默认单次 git push (LOCK_GC=git), 否则逐个 REST DELETE"""
+    if refs and LOCK_GC == "git":
+        refs = push_delete(refs)
+    for ref in refs:
+        api("DELETE", f"{API}/git/{ref}")
+
+def pop_expired(now_epoch):
+    """从本地堆弹出本链创建且已过期的锁 ref"""
+    expired = []
+    with OWNED_LOCK:
+        while OWNED and OWNED[0][0] <= now_epoch:
+            expired.append(heapq.heappop(OWNED)[1])
+    return expired
+
 def clean_locks():
-    """删除所有过期的 lock ref"""
-    now_epoch = int(time.time())
-    now_minute = time.strftime('%Y%m%d%H%M', time.gmtime())
-    raw = gh_api(f"{API}/git/refs/tags/lock", "-q", ".[].ref")
-    if not raw or raw.startswith("{"):
-        return  # 无锁或 API 返回错误 JSON (404)
-    for ref in raw.splitlines():
-        lock_tag = ref.rsplit("/", 1)[-1]  # {name}-{slot}
-        if is_expired(lock_tag, now_epoch, now_minute):
-            gh("api", "-X", "DELETE", f"{API}/git/{ref}")
-
-def clean_runs():
-    """删除已完成的 workflow run, 保留当前运行中的"""
-    sp.Popen(
-        f'gh run list -R "{GITHUB_REPOSITORY}" --status completed --limit 100 --json databaseId '
-        f'-q ".[] | select(.databaseId != {GITHUB_RUN_ID}) | .databaseId" 2>/dev/null '
-        f'| xargs -I{{}} gh run delete {{}} -R "{GITHUB_REPOSITORY}" 2>/dev/null',
-        shell=True, stdout=sp.DEVNULL, stderr=sp.DEVNULL)
+    """删除本链创建且已过期的锁: 只看本地堆, 不列举远端"""
+    delete_refs(pop_expired(int(TIMER.now())))
+
+def stale_buckets(now_epoch, hours=SWEEP_HOURS):
+    """回看窗口内所有锁都已过期的小时桶 (桶结束 + 300s + MISFIRE_WINDOW 之前)"""
+    last = (now_epoch - 300 - MISFIRE_WINDOW) // 3600 - 1  # 最后一个完整过期的桶
+    return [time.strftime("%Y%m%d%H", time.gmtime(h * 3600)) for h in range(last - hours + 1, last + 1)]
+
+def is_stale_ref(ref, buckets, now_epoch, now_minute):
+    """锁 ref 是否可删: 桶已整体过期, 或旧平铺格式且 is_expired"""
+    parts = ref.split("/")  # refs tags lock [bucket] {name}-{slot}
+    if len(parts) == 4: return is_expired(parts[3], now_epoch, now_minute)
+    return len(parts) == 5 and parts[3] in buckets
+
+def sweep_locks():
+    """
+    全量清扫, 每 SWEEP_INTERVAL 一次:
+      首次: 列举全部锁, 删除过期的旧平铺锁和过期桶内的锁 (覆盖崩溃链遗留)
+      之后: 只对新过期的小时桶调用 matching-refs, 整桶删除
+    """
+    global next_sweep
+    now_epoch = int(TIMER.now())
+    if now_epoch < next_sweep: return
+    next_sweep = now_epoch + SWEEP_INTERVAL
+    buckets = [b for b in stale_buckets(now_epoch) if b not in SWEPT]
+    if not SWEPT:
+        refs = gh_api(f"{API}/git/matching-refs/tags/lock/")
+        if not isinstance(refs, list): return
+        now_minute = time.strftime('%Y%m%d%H%M', time.gmtime(now_epoch))
+        stale = set(buckets)
+        delete_refs([r["ref"] for r in refs if is_stale_ref(r["ref"], stale, now_epoch, now_minute)])
+    else:
+        for bucket in buckets:
+            refs = gh_api(f"{API}/git/matching-refs/tags/lock/{bucket}/")
+            if not isinstance(refs, list): return  # API 错误, 下次再扫
+            delete_refs([r["ref"] for r in refs])
+    SWEPT.update(buckets)
+
+REAP_INTERVAL = int(os.environ.get("REAP_INTERVAL", "300"))  # run 清理间隔 (秒)
+REAP_PAGES    = 10  # 每次最多翻页数 (每页 100 条)
+REAP_WORKERS  = 4   # 并发删除数
+
+class RunReaper:
+    """
+    后台 run 清理: 单个常驻线程按自身节奏运行, 不会与自己重叠
+    seen 记录已删除/已排队的 run id, 不会重复下发删除
+    """
+    def __init__(self, interval=REAP_INTERVAL, pages=REAP_PAGES, workers=REAP_WORKERS):
+        self.interval = interval
+        self.pages    = pages
+        self.pool     = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="reap")
+        self.seen     = set()
+        self.deleted  = 0
+        self.stopped  = threading.Event()
+
+    def list_completed(self):
+        """分页列出已完成的 run id (新 → 旧), 超过 100 条继续翻页"""
+        ids = []
+        for page in range(1, self.pages + 1):
+            data = gh_api(f"{API}/actions/runs?status=completed&per_page=100&page={page}")
+            runs = (data or {}).get("workflow_runs") or []
+            ids += [run["id"] for run in runs]
+            if len(runs) < 100: break
+        return ids
+
+    def delete(self, run_id):
+        """删除单个 run; 404 视为已被对方链删除, 其他失败移出 seen 以便下次重试"""
+        status = api("DELETE", f"{API}/actions/runs/{run_id}")[0]
+        if status in (204, 404): return True
+        self.seen.discard(run_id)
+        return False
+
+    def reap_once(self):
+        """一次清理: 列出 → 过滤掉自身和已处理的 → 并发删除, 返回删除数"""
+        ids = [i for i in self.list_completed() if i != GITHUB_RUN_ID and i not in self.seen]
+        self.seen.update(ids)
+        done = sum(self.pool.map(self.delete, ids))
+        self.deleted += done
+        return done
+
+    def run(self):
+        while not self.stopped.is_set():
+            stretch = BUDGET.stretch()  # 配额紧张时拉长间隔, 不够则本次跳过
+            try:
+                if stretch != float("inf"): self.reap_once()
+            except Exception as e:
+                print(f"⚠️ run 清理异常, 下一轮继续: {type(e).__name__}: {e}")
+            self.stopped.wait(self.interval * (1 if stretch == float("inf") else stretch))
+
+    def start(self):
+        threading.Thread(target=self.run, name="reaper", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
 
 def check_update():
-    """检测是否有更新的 run_id, 有则退出让位"""
-    if gh("run", "list", "-w", f"{GITHUB_WORKFLOW}.yml", "-s", "in_progress",
-           "--json", "databaseId", "-q", f"any(.[]; .databaseId > {GITHUB_RUN_ID})",
-           "-R", GITHUB_REPOSITORY)[0].strip() == "true":
-        sys.exit(print("🛑 更新版本存在, 退出"))
+    """检测是否有更新的 run_id, 有则返回 True 让位"""
+    data = gh_api(f"{API}/actions/workflows/{GITHUB_WORKFLOW}.yml/runs?status=in_progress")
+    return bool(data) and any(run["id"] > GITHUB_RUN_ID for run in data.get("workflow_runs", []))
 
+def maintain(stop, ready=None, wake=None, dispatch=None):
+    """
+    运维线程: 版本检测 + 配置热更新 + 刷新 SHA + 清理锁, 与派发循环分离, 不会推迟任何边界
+    按 INTERVAL 节奏 (虚拟时钟下同比加快), 配额紧张时按 RateBudget 拉长或跳过; 发现新版本时设置 stop
+    ready: 首轮派发完成后设置, 在此之前不发运维请求 (最多等 INTERVAL), run 清理随后启动
+    wake:  打断主循环的睡眠 (退出 / 配置变化); dispatch: 当前生效的 DISPATCH_PATH 内容
+    """
+    wake = wake or threading.Event()
+    if ready is not None: ready.wait(INTERVAL / TIMER.scale)
+    RunReaper().start()
+    while not stop.is_set():
+        stretch = BUDGET.stretch()
+        try:
+            if stretch != float("inf"):
+                if check_update():
+                    stop.set()
+                    wake.set()
+                    return print("🛑 更新版本存在, 退出")
+                if DISPATCH_PATH: dispatch = poll_dispatch(dispatch, wake)
+                refresh_sha()
+                if RETRY_DEADLINE: RETRIES.claim(TIMER.now())
+                LOCKS.clean()
+            else:
+                LOCKS.clean(quota=False)  # 只做不消耗 REST 配额的删除
+        except Exception as e:  # 意外异常不能让运维线程静默退出 (SHA / 清理 / 版本检测随之停止)
+            print(f"⚠️ 运维异常, 下一轮继续: {type(e).__name__}: {e}")
+        stop.wait(INTERVAL * (1 if stretch == float("inf") else stretch) / TIMER.scale)
 
 def print_banner():
     """启动时打印运行信息和任务列表"""
     print(BAR)
-    print(f"  {GITHUB_WORKFLOW} | id={GITHUB_RUN_ID}")
+    mode = f" | 分片 {CHAIN_NO + 1}/{len(CHAINS)}" if OWNERS else f" | 租约 {LEASE}s" if LEASE else ""
+    print(f"  {GITHUB_WORKFLOW} | id={GITHUB_RUN_ID}{mode}")
     print(BAR)
-    for idx, (key, _, _, _, _) in enumerate(CRON_ENTRIES):
-        print(f"  #{idx}  {key}")
-    for idx, (interval_sec, _, _) in enumerate(SEC_ENTRIES):
-        print(f"  #{len(CRON_ENTRIES) + idx}  @{interval_sec}s")
+    for idx, entry in enumerate(CRON_ENTRIES):
+        print(f"  #{idx}  {entry.key}")
+    for idx, entry in enumerate(SEC_ENTRIES):
+        print(f"  #{len(CRON_ENTRIES) + idx}  @{entry.n}s")
     if CRON_ENTRIES or SEC_ENTRIES:
         print(BAR)
+    for lineno, line, reason in REJECTED:
+        print(f"⚠️ 第 {lineno} 行已跳过 ({reason}): {line}")
 
 # ══════════════════════════════════════════════════
 #  主循环
 #
-#  每 30 秒:
-#    1. 运维: 版本检测 + 互守护 + 清理锁/run
-#    2. sleep 对齐到 30 秒边界
-#    3a. cron 任务: 每分钟调度一次
-#    3b. 秒级任务: 按 @Ns 间隔调度
+#  事件驱动:
+#    1. 单调时钟睡到下一个到期任务的边界
+#    2. 弹出到期任务: cron 按分钟, 秒级按 @Ns 槽
+#    3. 批量竞锁 + 并发触发, 记录唤醒迟到量
+#  运维 (maintain) 与 run 清理 (RunReaper) 在后台线程, 首轮派发后才开始
+#  STATE_FILE 检查点: 续期后的新 run 接着上一 run 的触发记录与缓存
+#  CHAINS 分片: 各链调度全部任务, 只派发本链负责的, 失联链的任务按心跳接管
+#  LEASE 租约: 各链调度全部任务, 只有持有租约的主链派发, 且不竞锁
 # ══════════════════════════════════════════════════
 
-if __name__ == "__main__":
+if __name__ == "__main__" and sys.argv[1:2] == ["simulate"]:
+    sys.exit(run_simulate(sys.argv[2:]))
+
+elif __name__ == "__main__":
 
-    print_banner()
+    timer      = TIMER
+    tracer     = Tracer()
+    start_time = timer.now()
+    end_time   = start_time + DURATION
+    fired      = load_state(STATE_FILE, start_time) if STATE_FILE else {}
+    dispatch   = fetch_dispatch() if DISPATCH_PATH else None  # 仓库内配置优先于 Secret
+    if dispatch is not None:
+        REJECTED = []
+        CRON_ENTRIES, SEC_ENTRIES = parse_dispatch(dispatch, REJECTED)
+    print_banner()                  # 列出实际调度的配置 (DISPATCH_PATH 优先)
+    sched      = Scheduler(CRON_ENTRIES, SEC_ENTRIES, int(start_time), fired)
+    RETRIES.index(sched)
+    stop       = threading.Event()  # 运维线程发现新版本时设置
+    ready      = threading.Event()  # 首轮派发完成, 运维线程开始工作
+    woken      = threading.Event()  # 打断睡眠: 退出或配置热更新
+    next_save  = start_time + STATE_INTERVAL
+    if not SHA: refresh_sha()       # 检查点已有 SHA 时首轮零查询
+    beat = Heartbeat(OWNERS).start() if OWNERS else None  # 首次读到其他链心跳之前全量竞锁
+    if LEASE:  LEADER = Lease(f"{GITHUB_WORKFLOW}#{GITHUB_RUN_ID}", wake=woken).start()
+    RETRIES.wake = woken
+    threading.Thread(target=maintain, args=(stop, ready, woken, dispatch), name="maint", daemon=True).start()
 
-    last_minute    = None
-    last_slot = {}  # 秒级任务去重: {j: last_slot_value}
+    while not stop.is_set() and timer.now() < end_time:
 
-    end_time   = time.time() + DURATION
-    global start_time
-    start_time = time.time()
+        # ⓪ 租约模式: 刚抢到租约时从旧主链的 done 之后回拨补发
+        while LEADER and not LEADER.takeovers.empty():
+            token, done = LEADER.takeovers.get()
+            if done is not None: sched.rewind(range(len(sched.entries)), done + 1)
+            print(f"👑 获得租约 #{token}" + ("" if done is None else f", 补发 {int(timer.now()) - done}s 内的槽"))
 
-    while time.time() < end_time:
+        # ① 睡到下一个到期边界, 稀疏调度可跳过绝大多数唤醒
+        due  = min((t for t in (sched.next_due(), RETRIES.next_due()) if t is not None), default=None)
+        late = timer.sleep_until(end_time if due is None else min(due, end_time), woken)
+        if woken.is_set():
+            woken.clear()
+            text = None
+            while not RELOAD.empty(): text = RELOAD.get()  # 只应用最新一版
+            if text is not None:
+                REJECTED = []
+                CRON_ENTRIES, SEC_ENTRIES = parse_dispatch(text, REJECTED)
+                added, removed, kept = sched.reload(CRON_ENTRIES, SEC_ENTRIES, int(timer.now()))
+                RETRIES.index(sched)
+                print(f"🔄 DISPATCH 热更新: +{added} -{removed} ={kept}")
+                print_banner()
+            continue
+        wake = timer.now()
 
-        # ① 运维: 版本检测 + 清理
-        check_update()
-        clean_locks()
-        clean_runs()
+        # ② 到期的重试先走 (有独立的尝试锁), 不与计划触发混在一轮
+        retries = RETRIES.pop_due(wake)
+        if retries and retry_round(retries, wake):
+            print(f"⚠️ 重试超过 {ROUND_TIMEOUT:g}s 未完成, 转入后台继续")
 
-        # ② 对齐 10 秒边界
-        time.sleep(max(0.1, INTERVAL - time.time() % INTERVAL))
-        epoch      = int(time.time())
-        now        = time.gmtime(epoch)
-        time_str   = time.strftime('%H:%M:%S', time.gmtime(epoch + TZ_OFFSET * 3600))
-        minute_key = time.strftime('%Y%m%d%H%M', now)  # cron 匹配始终用 UTC
-        refresh_sha()  # 每轮刷新一次 SHA, 供所有 acquire_lock() 复用
+        # ③ 调度: 只处理到期任务; N 链分片时先接管失联链, 再只保留本链负责的触发
+        if OWNERS:
+            for chain, count in take_over(OWNERS, sched, wake).items():
+                print(f"🤝 {chain} 心跳过期, 接管 {count} 个任务")
+        fires = sched.pop_due(int(wake))
+        if OWNERS: fires = [(idx, at) for idx, at in fires if OWNERS.owns(sched.name(idx), wake)]
+        if LEADER and not LEADER.valid(wake): fires = []  # 热备: 只推进调度
+        if fires:
+            trace, overrun = dispatch_round(sched, fires, wake)
+            if LEADER: LEADER.done = int(wake)
+            if overrun:
+                print(f"⚠️ {overrun} 个仓库的任务超过 {ROUND_TIMEOUT:g}s 未完成, 转入后台继续")
+            drift = timer.resync()
+            health = RETRIES.summary(timer.now())
+            print(f"📊 ⏱️ +{late * 1000:.0f}ms drift {drift * 1000:+.1f}ms | {BUDGET.summary()} | {ETAG.stats()}"
+                  + (f" | {health}" if health else ""))
+            tracer.record(trace)
+            tracer.flush(timer.now())
+        else:
+            timer.resync()  # 热备 / 本链无到期任务: 不派发, 时钟锚定与检查点照常
+        ready.set()
+        if STATE_FILE and timer.now() >= next_save:
+            save_state(STATE_FILE, sched, timer.now())
+            next_save = timer.now() + STATE_INTERVAL
 
-        # ③ 调度 (统一使用 scan_round, 与测试共享同一份逻辑)
-        def on_fire(idx, show, repo, wf):
-            # 计算锁标签: cron 用 sanitized_key+idx, sec 用 s{N}x{J}
-            if idx < len(CRON_ENTRIES):
-                label = (f"{CRON_ENTRIES[idx][4]}{idx}", minute_key)
-            else:
-                j = idx - len(CRON_ENTRIES)
-                label = (f"s{SEC_ENTRIES[j][0]}x{j}", str(epoch // SEC_ENTRIES[j][0]))
-            execute_task(time_str, idx, label, show, repo, wf)
-        last_minute, last_slot = scan_round(
-            epoch, last_minute, last_slot, CRON_ENTRIES, SEC_ENTRIES, on_fire)
+    tracer.flush(timer.now(), force=True)
+    if STATE_FILE: save_state(STATE_FILE, sched, timer.now())
+    if LEADER: LEADER.release(timer.now())
+    if beat: beat.release(timer.now())